@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from utils.api_handlers import (
+    EmissionAPI, RawResponse, parse_bulk_body, parse_json, query_flag, wants_event_stream
+)
+from utils.auth import API_USERS_FILE, get_api_key_cache
+from utils.storage import get_store
+
+# Production serving mode for the emission API: the same routes as
+# api_server.py on an ASGI server (uvicorn). The event loop only parses and
+# serializes; storage and model work runs in a bounded thread pool.
+API_THREADS = int(os.environ.get("API_THREADS", 16))
+
+api = EmissionAPI(get_store(), get_api_key_cache(API_USERS_FILE))
+_executor = None
+
+
+async def run_blocking(fn, *args):
+    """Run a blocking handler in the bounded worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args))
+
+
+def _respond(result):
+    payload, status = result
+    if isinstance(payload, RawResponse):
+        return Response(payload.body, status_code=status, headers=payload.headers, media_type="application/json")
+    return JSONResponse(payload, status_code=status)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api-worker")
+    try:
+        yield
+    finally:
+        # Requests have drained by now; let in-flight storage writes finish
+        _executor.shutdown(wait=True)
+        api.batcher.close()
+
+
+# --------------------------------
+# Routes
+# --------------------------------
+async def update_emissions(request):
+    req = parse_json(await request.body())
+    return _respond(await run_blocking(api.update_emissions, req))
+
+
+async def update_emissions_bulk(request):
+    mimetype = request.headers.get("content-type", "").split(";")[0].strip()
+    credentials, updates = parse_bulk_body(mimetype, await request.body(), request.query_params)
+    atomic = query_flag(request.query_params, "atomic")
+    return _respond(await run_blocking(api.update_emissions_bulk, credentials, updates, atomic))
+
+
+async def get_emissions(request):
+    if_none_match = request.headers.get("if-none-match")
+    return _respond(await run_blocking(api.get_emissions, dict(request.query_params), if_none_match))
+
+
+async def changes(request):
+    # Key verification may re-read the key file, so it runs in the pool
+    query, error = await run_blocking(api.changes_query, dict(request.query_params), request.headers.get("last-event-id"))
+    if error:
+        return _respond(error)
+    if wants_event_stream(request.query_params, request.headers.get("accept")):
+        return StreamingResponse(
+            api.stream_changes_async(query), media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    # Long-poll on the event loop rather than holding a pool thread
+    result = await run_blocking(api.feed.read, query["since"], query["epoch"], query["limit"])
+    if query["timeout"] and not result["reset"] and not result["changes"]:
+        await api.feed.wait_async(query["since"], query["timeout"])
+        result = await run_blocking(api.feed.read, query["since"], query["epoch"], query["limit"])
+    return JSONResponse(result)
+
+
+async def forecast_portfolio(request):
+    req = parse_json(await request.body())
+    return _respond(await run_blocking(api.forecast_portfolio, req))
+
+
+async def predict(request):
+    req = parse_json(await request.body())
+    futures, error = await run_blocking(api.submit_predict, req)
+    if error:
+        return _respond(error)
+    # Await the batcher directly so waiting rows do not hold pool threads
+    try:
+        values = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+    except Exception as e:
+        return _respond(api.prediction_error(e))
+    return _respond(api.prediction_payload(req, values))
+
+
+async def forecast(request):
+    req = parse_json(await request.body())
+    return _respond(await run_blocking(api.forecast, req))
+
+
+async def metrics(request):
+    payload, status = await run_blocking(api.metrics, dict(request.query_params))
+    if status == 200:
+        payload["worker_threads"] = API_THREADS
+    return JSONResponse(payload, status_code=status)
+
+
+app = Starlette(
+    routes=[
+        Route("/update_emissions", update_emissions, methods=["POST"]),
+        Route("/update_emissions_bulk", update_emissions_bulk, methods=["POST"]),
+        Route("/get_emissions", get_emissions, methods=["GET"]),
+        Route("/changes", changes, methods=["GET"]),
+        Route("/forecast_portfolio", forecast_portfolio, methods=["POST"]),
+        Route("/predict", predict, methods=["POST"]),
+        Route("/forecast", forecast, methods=["POST"]),
+        Route("/metrics", metrics, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+# --------------------------------
+# Server Entry Point
+# --------------------------------
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the emission API with uvicorn (ASGI).")
+    parser.add_argument("--host", default=os.environ.get("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("API_PORT", 5001)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("API_WORKERS", 1)),
+                        help="Server processes (each has its own thread pool)")
+    parser.add_argument("--threads", type=int, default=API_THREADS,
+                        help="Blocking-work threads per process")
+    parser.add_argument("--keep-alive", type=int, default=5, help="Idle keep-alive timeout in seconds")
+    parser.add_argument("--graceful-timeout", type=int, default=30,
+                        help="Seconds to let in-flight requests finish on shutdown")
+    args = parser.parse_args()
+
+    workers = args.workers
+    if workers > 1 and os.environ.get("EMISSION_STORE_BACKEND", "sqlite") == "json":
+        # JSONStore only serializes writers within one process, and its /changes feed lives in memory
+        print("⚠️ The json storage backend is single-process; starting 1 worker.")
+        workers = 1
+    # Worker processes import this module afresh and read the pool size from the environment
+    os.environ["API_THREADS"] = str(args.threads)
+
+    uvicorn.run(
+        "api_asgi:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        timeout_keep_alive=args.keep_alive,
+        timeout_graceful_shutdown=args.graceful_timeout,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 from statsmodels.stats.outliers_influence import variance_inflation_factor
 
+from utils.dataset import DATA_FILE, load_dataset
+from utils.streaming_stats import StreamingStats, compute_stats, fits_in_memory
+
 # Optional: Use logging instead of print for production-ready code
 import logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -11,9 +14,12 @@ logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 # -------------------- Data Loading --------------------
 
-def load_data(filepath: str) -> pd.DataFrame:
-    """Load CSV data and print an overview."""
-    data = pd.read_csv(filepath)
+def load_data(filepath: str = DATA_FILE, **kwargs) -> pd.DataFrame:
+    """Load the dataset (typed Parquet copy of the CSV) and print an overview.
+
+    Keyword arguments (columns, countries, years, ...) go to `load_dataset`.
+    """
+    data = load_dataset(filepath, **kwargs)
     logging.info(f"✅ Data loaded successfully: {data.shape}")
     logging.info(f"\n🔍 Columns and types:\n{data.dtypes}")
     logging.info(f"\n🔍 First 5 rows:\n{data.head()}")
@@ -21,6 +27,12 @@ def load_data(filepath: str) -> pd.DataFrame:
     return data
 
 
+def add_energy_total(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the derived total energy use column `en_ttl`."""
+    df['en_ttl'] = df['en_per_gdp'] * df['gdp'] / 1000
+    return df
+
+
 # -------------------- Visualization --------------------
 
 def plot_trends_over_time(df: pd.DataFrame, col: str, title: str, ylabel: str):
@@ -48,10 +60,11 @@ def plot_scatter(df: pd.DataFrame, x_col: str, y_col: str, title: str, xlabel: s
     plt.show()
 
 
-def plot_correlation_heatmap(df: pd.DataFrame, feature_cols: list):
-    """Plot correlation heatmap for selected features."""
+def plot_correlation_heatmap(df, feature_cols: list):
+    """Plot correlation heatmap for selected features of a DataFrame or StreamingStats."""
+    corr = df.corr().loc[feature_cols, feature_cols] if isinstance(df, StreamingStats) else df[feature_cols].corr()
     plt.figure(figsize=(20, 15))
-    sns.heatmap(df[feature_cols].corr(), annot=True, fmt=".2f", cmap='coolwarm', center=0)
+    sns.heatmap(corr, annot=True, fmt=".2f", cmap='coolwarm', center=0)
     plt.title('📊 Feature Correlation Heatmap', fontsize=18)
     plt.tight_layout()
     plt.show()
@@ -59,7 +72,9 @@ def plot_correlation_heatmap(df: pd.DataFrame, feature_cols: list):
 
 def plot_country_time_series(df: pd.DataFrame, countries: list, y_col: str, title: str, ylabel: str):
     """Line plot of a metric over time for multiple countries."""
-    df_filtered = df[df['country'].isin(countries)]
+    df_filtered = df[df['country'].isin(countries)].copy()
+    if isinstance(df_filtered['country'].dtype, pd.CategoricalDtype):
+        df_filtered['country'] = df_filtered['country'].cat.remove_unused_categories()
     plt.figure(figsize=(12, 6))
     sns.lineplot(data=df_filtered, x='year', y=y_col, hue='country', marker='o')
     plt.title(title)
@@ -73,7 +88,9 @@ def plot_country_time_series(df: pd.DataFrame, countries: list, y_col: str, titl
 
 def plot_pairwise_features(df: pd.DataFrame, countries: list, features: list):
     """Pairplot of selected features for selected countries."""
-    df_filtered = df[df['country'].isin(countries)]
+    df_filtered = df[df['country'].isin(countries)].copy()
+    if isinstance(df_filtered['country'].dtype, pd.CategoricalDtype):
+        df_filtered['country'] = df_filtered['country'].cat.remove_unused_categories()
     sns.pairplot(df_filtered[features + ['country']], hue='country', height=2.5)
     plt.show()
 
@@ -101,26 +118,43 @@ def plot_4d_scatter(df: pd.DataFrame):
 
 # -------------------- VIF Calculation --------------------
 
-def calculate_vif(df: pd.DataFrame, feature_cols: list):
-    """Calculate VIF for the selected features."""
-    X = df[feature_cols].dropna()
-    vif_data = pd.DataFrame({'Feature': feature_cols})
-    vif_data['VIF'] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
+def calculate_vif(df, feature_cols: list):
+    """Calculate VIF for the selected features of a DataFrame or StreamingStats."""
+    if isinstance(df, StreamingStats):
+        vif_data = df.vif(feature_cols)
+    else:
+        X = df[feature_cols].dropna()
+        vif_data = pd.DataFrame({'Feature': feature_cols})
+        vif_data['VIF'] = [variance_inflation_factor(X.values, i) for i in range(X.shape[1])]
     logging.info(f"\n🔎 Variance Inflation Factors:\n{vif_data}\n")
     return vif_data
 
 
 # -------------------- Main Function --------------------
 
-def main():
-    # File path
-    file_path = 'data_cleaned.csv'
+def main(file_path: str = DATA_FILE):
+    correlation_features = ['cereal_yield', 'fdi_perc_gdp', 'gni_per_cap', 'en_per_gdp', 'en_per_cap', 'en_ttl',
+                            'co2_ttl', 'co2_per_cap', 'co2_per_gdp', 'pop_urb_aggl_perc', 'prot_area_perc',
+                            'gdp', 'pop_growth_perc', 'pop', 'urb_pop_growth_perc']
+    vif_features = ['cereal_yield', 'fdi_perc_gdp', 'gni_per_cap', 'en_per_cap', 'co2_per_cap',
+                    'pop_urb_aggl_perc', 'prot_area_perc', 'gdp', 'pop_growth_perc', 'urb_pop_growth_perc']
+
+    if not fits_in_memory(file_path):
+        # Larger than memory: summary, correlations and VIF from one chunked pass across all cores
+        stats = compute_stats(file_path, columns=sorted(set(correlation_features + vif_features)),
+                              transform=add_energy_total, n_jobs=-1)
+        logging.info(f"✅ Streamed {stats.rows} rows from {file_path}")
+        logging.info(f"\n🔍 Summary statistics (approximate quantiles):\n{stats.describe().T}")
+        plot_correlation_heatmap(stats, correlation_features)
+        calculate_vif(stats, vif_features)
+        logging.info("ℹ️ Row-level plots are skipped for files larger than memory.")
+        return
 
     # Load data
     df = load_data(file_path)
 
     # Add derived column
-    df['en_ttl'] = df['en_per_gdp'] * df['gdp'] / 1000
+    df = add_energy_total(df)
 
     # Plot CO₂ emissions trends
     plot_trends_over_time(df, 'co2_per_cap', '🌍 Global Average CO₂ Emissions per Capita Over Time', 'CO₂ per Capita (metric tons)')
@@ -129,9 +163,6 @@ def main():
     plot_scatter(df, 'pop', 'co2_ttl', 'Total CO₂ Emissions vs Population', 'Population', 'Total CO₂ emissions (KtCO₂)')
 
     # Correlation heatmap
-    correlation_features = ['cereal_yield', 'fdi_perc_gdp', 'gni_per_cap', 'en_per_gdp', 'en_per_cap', 'en_ttl',
-                            'co2_ttl', 'co2_per_cap', 'co2_per_gdp', 'pop_urb_aggl_perc', 'prot_area_perc',
-                            'gdp', 'pop_growth_perc', 'pop', 'urb_pop_growth_perc']
     plot_correlation_heatmap(df, correlation_features)
 
     # Country comparison: CO₂ emissions per capita over time
@@ -147,8 +178,6 @@ def main():
     plot_4d_scatter(df)
 
     # Calculate VIF
-    vif_features = ['cereal_yield', 'fdi_perc_gdp', 'gni_per_cap', 'en_per_cap', 'co2_per_cap',
-                    'pop_urb_aggl_perc', 'prot_area_perc', 'gdp', 'pop_growth_perc', 'urb_pop_growth_perc']
     calculate_vif(df, vif_features)
 
 
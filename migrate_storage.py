@@ -0,0 +1,24 @@
+import argparse
+
+from utils.storage import API_LOG_FILE, DATA_FILE, DB_FILE, migrate_json_to_sqlite
+
+# -------------------------------
+# Import the legacy JSON files into the SQLite store
+# -------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Migrate api_server.py JSON storage to SQLite.")
+    parser.add_argument("--data-file", default=DATA_FILE, help="Emission data JSON (company -> sources)")
+    parser.add_argument("--log-file", default=API_LOG_FILE, help="API update log (JSON array or JSON-lines audit log)")
+    parser.add_argument("--db", default=DB_FILE, help="Target SQLite database")
+    args = parser.parse_args()
+
+    imported = migrate_json_to_sqlite(args.data_file, args.log_file, args.db)
+    if imported is None:
+        print(f"ℹ️ {args.db} has already been migrated; nothing imported")
+        return
+    companies, entries = imported
+    print(f"✅ Imported {companies} companies and {entries} log entries into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,326 @@
-# model_prediction.py
-import pandas as pd
-import numpy as np
+# model_building.py
+import argparse
+import copy
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from inspect import signature
+
 import joblib
+from joblib import parallel_config
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from sklearn.model_selection import train_test_split, KFold, RandomizedSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, KFold, HalvingRandomSearchCV
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.feature_selection import RFECV
 from sklearn.metrics import r2_score, mean_squared_error
 
+from utils.dataset import DATA_FILE, load_dataset
+from utils.model_registry import save_model_artifact
+
 RANDOM_STATE = 42
+MODEL_FILE = 'co2_forecast_model.pkl'
 
-# -------------------- Load & Preprocess Data --------------------
-data = pd.read_csv('data_cleaned.csv')
-data = data[data['country'] != 'ARE']  # Remove outlier
+# Fold splits and RFECV results, keyed by a hash of the training data
+TRAINING_CACHE_DIR = os.environ.get("TRAINING_CACHE_DIR", ".training_cache")
 
 # Define features & label
 FEATURE_COLS = ['cereal_yield', 'fdi_perc_gdp', 'gni_per_cap', 'en_per_cap',
                 'pop_urb_aggl_perc', 'prot_area_perc', 'pop_growth_perc', 'urb_pop_growth_perc']
 LABEL_COL = 'co2_per_cap'
 
-X = data[FEATURE_COLS].values
-y = data[LABEL_COL].values
-
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
-
-# -------------------- Feature Selection --------------------
-rf = RandomForestRegressor(random_state=RANDOM_STATE)
-selector = RFECV(estimator=rf, cv=KFold(n_splits=4, shuffle=True, random_state=RANDOM_STATE), scoring='r2', n_jobs=-1)
-selector.fit(X_train, y_train)
-
-# Keep only selected features
-selected_features = [f for f, keep in zip(FEATURE_COLS, selector.support_) if keep]
-print(f"🔥 Selected features: {selected_features}")
-
-# Transform train/test data
-X_train_sel = selector.transform(X_train)
-X_test_sel = selector.transform(X_test)
-
-# -------------------- Random Forest Hyperparameter Tuning --------------------
-param_grid = {
-    'n_estimators': np.linspace(200, 2000, 10, dtype=int).tolist(),
+# Tree count is the successive-halving resource, so it is not searched directly
+PARAM_DISTRIBUTIONS = {
     'max_features': ['sqrt', 'log2', None],
     'max_depth': [*np.linspace(10, 110, 11, dtype=int), None],
     'min_samples_split': [2, 5, 10],
     'min_samples_leaf': [1, 2, 4]
 }
+MIN_TREES = 50
+MAX_TREES = 2000
+HALVING_FACTOR = 3
+SEARCH_FOLDS = 5
+SELECTION_FOLDS = 4
+SELECTION_TREES = 100
 
-rf_model = RandomizedSearchCV(
-    RandomForestRegressor(random_state=RANDOM_STATE),
-    param_distributions=param_grid,
-    n_iter=20,
-    cv=KFold(n_splits=5, shuffle=True, random_state=RANDOM_STATE),
-    scoring='r2',
-    n_jobs=-1,
-    random_state=RANDOM_STATE,
-    refit=True
-)
-
-rf_model.fit(X_train_sel, y_train)
-print("✅ Best parameters:", rf_model.best_params_)
-best_rf = rf_model.best_estimator_
-
-# -------------------- Save Model & Features --------------------
-save_dict = {
-    'model': best_rf,
-    'selected_features': selected_features
-}
-joblib.dump(save_dict, 'co2_forecast_model.pkl')
-print("\n✅ Model and selected features saved to 'co2_forecast_model.pkl'.")
 
-# -------------------- Evaluate --------------------
-y_pred = best_rf.predict(X_test_sel)
-print(f"\n📊 Test R2: {r2_score(y_test, y_pred):.3f}")
-print(f"📊 RMSE: {np.sqrt(mean_squared_error(y_test, y_pred)):.3f}")
+# -------------------- Warm-Started Forests --------------------
+
+_warm_forests = {}
+_warm_lock = threading.Lock()
+
+
+def _fingerprint(*arrays):
+    digest = hashlib.sha256()
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        digest.update(str((a.shape, a.dtype.str)).encode())
+        digest.update(a.tobytes())
+    return digest.hexdigest()
+
+
+class WarmStartForestRegressor(RandomForestRegressor):
+    """RandomForestRegressor that grows a forest it already fitted instead of refitting.
+
+    Fits are remembered per (hyperparameters except n_estimators, training
+    data). When successive halving promotes a candidate to more trees on the
+    same fold, only the extra trees are built via `warm_start`. With an
+    integer random_state the result is identical to a fit from scratch.
+    Fits share the cache within a process, so run the search with the
+    threading backend for the most reuse.
+    """
+
+    def _params_key(self):
+        params = self.get_params()
+        for name in ('n_estimators', 'n_jobs', 'warm_start', 'verbose'):
+            params.pop(name)
+        return repr(sorted(params.items()))
+
+    def _warm_key(self, X, y):
+        return self._params_key(), _fingerprint(X, y)
+
+    def fit(self, X, y, sample_weight=None):
+        if sample_weight is not None or not isinstance(self.random_state, (int, np.integer)):
+            return super().fit(X, y, sample_weight)
+        key = self._warm_key(X, y)
+        with _warm_lock:
+            cached = _warm_forests.get(key)
+        warm_start = self.warm_start
+        if cached is not None and len(cached.estimators_) <= self.n_estimators:
+            grown = copy.copy(cached)
+            grown.estimators_ = list(cached.estimators_)
+            grown.set_params(n_estimators=self.n_estimators, n_jobs=self.n_jobs, warm_start=True)
+            if len(grown.estimators_) < self.n_estimators:
+                RandomForestRegressor.fit(grown, X, y)
+            self.__dict__.update(grown.__dict__)
+            self.warm_start = warm_start
+        else:
+            super().fit(X, y)
+        with _warm_lock:
+            current = _warm_forests.get(key)
+            if current is None or len(current.estimators_) < len(self.estimators_):
+                _warm_forests[key] = self
+        return self
+
+
+def clear_warm_start_cache():
+    with _warm_lock:
+        _warm_forests.clear()
+
+
+def evict_warm_start_cache(keep):
+    """Drop cached forests whose hyperparameter key is not in `keep`."""
+    with _warm_lock:
+        for key in [key for key in _warm_forests if key[0] not in keep]:
+            del _warm_forests[key]
+
+
+class WarmStartHalvingSearchCV(HalvingRandomSearchCV):
+    """HalvingRandomSearchCV that frees the cached forests of eliminated candidates.
+
+    Before each round, forests of candidates that were not promoted are
+    evicted, so only the survivors' fold forests stay in memory.
+    """
+
+    def _run_search(self, evaluate_candidates, **kwargs):
+        def evaluate_round(candidate_params, *args, **round_kwargs):
+            evict_warm_start_cache({clone(self.estimator).set_params(**params)._params_key()
+                                    for params in candidate_params})
+            return evaluate_candidates(candidate_params, *args, **round_kwargs)
+        return super()._run_search(evaluate_round, **kwargs)
+
+    # BaseSearchCV passes optional arguments (e.g. callback_ctx) only when the signature declares them
+    _run_search.__signature__ = signature(HalvingRandomSearchCV._run_search)
+
+
+# -------------------- Cached Stages --------------------
+
+def _cached(cache_dir, name, key, compute):
+    """Result of `compute()`, stored under `cache_dir` by name and key; (value, hit)."""
+    if cache_dir is None:
+        return compute(), False
+    path = os.path.join(cache_dir, f"{name}-{key[:24]}.joblib")
+    if os.path.exists(path):
+        return joblib.load(path), True
+    value = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(value, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return value, False
+
+
+def _stage_key(data_key, *settings):
+    return hashlib.sha256(repr((data_key, settings)).encode()).hexdigest()
+
+
+@contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+
+
+def load_training_data(path=DATA_FILE):
+    """(X, y) for the model columns; the ARE outlier is filtered in the Parquet reader."""
+    data = load_dataset(path, columns=FEATURE_COLS + [LABEL_COL], exclude_countries=['ARE'])
+    return data[FEATURE_COLS].to_numpy(dtype=np.float64), data[LABEL_COL].to_numpy(dtype=np.float64)
+
+
+def select_features(X, y, folds, n_trees=SELECTION_TREES):
+    """RFECV over the given folds; returns the support mask and per-size CV scores."""
+    selector = RFECV(estimator=RandomForestRegressor(n_estimators=n_trees, random_state=RANDOM_STATE, n_jobs=1),
+                     cv=folds, scoring='r2')
+    selector.fit(X, y)
+    return {'support': selector.support_, 'scores': selector.cv_results_['mean_test_score']}
+
+
+# -------------------- Training Pipeline --------------------
+
+def build_model(data_path=DATA_FILE, output=MODEL_FILE, n_jobs=-1, backend="threading",
+                cache_dir=TRAINING_CACHE_DIR, min_trees=MIN_TREES, max_trees=MAX_TREES,
+                factor=HALVING_FACTOR, selection_trees=SELECTION_TREES, plot=False, verbose=True):
+    """Select features, tune and fit the CO₂ per capita forest, and save it to `output`.
+
+    RFECV and the hyperparameter search run on `n_jobs` workers of the
+    joblib `backend` ("threading" shares warm-started forests between all
+    candidates; "loky" is a process pool). The search is successive halving
+    over the tree count, from `min_trees` up to `max_trees` by `factor`, and
+    warm starts each promoted candidate. The train/test split, CV folds and
+    RFECV result are cached in `cache_dir` (None disables it) by a hash of
+    the data and settings. Returns the model, selected features, best
+    parameters, test scores, cache hits and wall time per stage.
+    """
+    timings, hits = {}, {}
+    with _stage(timings, 'load'):
+        X, y = load_training_data(data_path)
+        data_key = _fingerprint(X, y) + repr((FEATURE_COLS, LABEL_COL))
+
+    with _stage(timings, 'split'):
+        def make_splits():
+            train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=0.2, random_state=RANDOM_STATE)
+            def kfold(n_splits):
+                return [(train, test) for train, test in
+                        KFold(n_splits=n_splits, shuffle=True, random_state=RANDOM_STATE).split(train_idx)]
+            return {'train': train_idx, 'test': test_idx,
+                    'selection': kfold(SELECTION_FOLDS), 'search': kfold(SEARCH_FOLDS)}
+        splits, hits['split'] = _cached(cache_dir, 'splits', _stage_key(data_key, RANDOM_STATE, SELECTION_FOLDS, SEARCH_FOLDS), make_splits)
+        X_train, X_test = X[splits['train']], X[splits['test']]
+        y_train, y_test = y[splits['train']], y[splits['test']]
+
+    with _stage(timings, 'feature_selection'), parallel_config(backend=backend, n_jobs=n_jobs):
+        selection, hits['feature_selection'] = _cached(
+            cache_dir, 'rfecv', _stage_key(data_key, RANDOM_STATE, SELECTION_FOLDS, selection_trees),
+            lambda: select_features(X_train, y_train, splits['selection'], selection_trees))
+        support = selection['support']
+        selected_features = [f for f, keep in zip(FEATURE_COLS, support) if keep]
+        X_train_sel, X_test_sel = X_train[:, support], X_test[:, support]
+    if verbose:
+        print(f"🔥 Selected features: {selected_features}")
+
+    with _stage(timings, 'search'), parallel_config(backend=backend, n_jobs=n_jobs):
+        search = WarmStartHalvingSearchCV(
+            WarmStartForestRegressor(random_state=RANDOM_STATE, n_jobs=1),
+            param_distributions=PARAM_DISTRIBUTIONS,
+            n_candidates='exhaust',
+            resource='n_estimators',
+            min_resources=min_trees,
+            max_resources=max_trees,
+            factor=factor,
+            cv=splits['search'],
+            scoring='r2',
+            random_state=RANDOM_STATE,
+            refit=False,
+        )
+        try:
+            search.fit(X_train_sel, y_train)
+        finally:
+            clear_warm_start_cache()
+    if verbose:
+        print("✅ Best parameters:", search.best_params_)
+
+    with _stage(timings, 'refit'):
+        # A plain forest, so the saved artifact does not depend on this module
+        best_rf = RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=n_jobs, **search.best_params_)
+        best_rf.fit(X_train_sel, y_train)
+        best_rf.set_params(n_jobs=None)
+
+    with _stage(timings, 'save'):
+        mmap_path = save_model_artifact({'model': best_rf, 'selected_features': selected_features}, output)
+    if verbose:
+        print(f"\n✅ Model and selected features saved to '{output}'.")
+        print(f"✅ Memory-mapped copy saved to '{mmap_path}'.")
+
+    with _stage(timings, 'evaluate'):
+        y_pred = best_rf.predict(X_test_sel)
+        test_r2 = r2_score(y_test, y_pred)
+        rmse = float(np.sqrt(mean_squared_error(y_test, y_pred)))
+    if verbose:
+        print(f"\n📊 Test R2: {test_r2:.3f}")
+        print(f"📊 RMSE: {rmse:.3f}")
+        print("\n⏱️ Wall time per stage:")
+        for name, seconds in timings.items():
+            print(f"  {name:<18} {seconds:8.2f}s{' (cached)' if hits.get(name) else ''}")
+
+    if plot:
+        plot_predictions(y_test, y_pred)
+
+    return {
+        'model': best_rf,
+        'selected_features': selected_features,
+        'best_params': search.best_params_,
+        'n_candidates': search.n_candidates_,
+        'test_r2': test_r2,
+        'rmse': rmse,
+        'timings': timings,
+        'cache_hits': hits,
+        'mmap_path': mmap_path,
+    }
+
 
 # -------------------- Plot --------------------
-plt.figure(figsize=(8, 6))
-sns.regplot(x=y_pred, y=y_test, scatter_kws={'alpha': 0.6})
-plt.xlabel('Predicted CO₂ per Capita')
-plt.ylabel('Actual CO₂ per Capita')
-plt.title(f'Prediction vs Actual | R = {np.corrcoef(y_pred, y_test)[0, 1]:.2f}')
-plt.grid(True)
-plt.tight_layout()
-plt.show()
+
+def plot_predictions(y_test, y_pred):
+    plt.figure(figsize=(8, 6))
+    sns.regplot(x=y_pred, y=y_test, scatter_kws={'alpha': 0.6})
+    plt.xlabel('Predicted CO₂ per Capita')
+    plt.ylabel('Actual CO₂ per Capita')
+    plt.title(f'Prediction vs Actual | R = {np.corrcoef(y_pred, y_test)[0, 1]:.2f}')
+    plt.grid(True)
+    plt.tight_layout()
+    plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and save the CO₂ per capita forecast model.")
+    parser.add_argument("--data", default=DATA_FILE, help="Training CSV")
+    parser.add_argument("--output", default=MODEL_FILE, help="Model artifact path")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Workers for RFECV and the search (-1: all cores)")
+    parser.add_argument("--backend", default="threading", choices=["threading", "loky"],
+                        help="threading shares warm-started forests; loky uses a process pool")
+    parser.add_argument("--cache-dir", default=TRAINING_CACHE_DIR, help="Cache for splits and RFECV ('' to disable)")
+    parser.add_argument("--min-trees", type=int, default=MIN_TREES)
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES)
+    parser.add_argument("--no-plot", action="store_true", help="Skip the prediction vs actual plot")
+    args = parser.parse_args()
+    build_model(args.data, args.output, n_jobs=args.n_jobs, backend=args.backend, cache_dir=args.cache_dir or None,
+                min_trees=args.min_trees, max_trees=args.max_trees, plot=not args.no_plot)
+
+
+if __name__ == "__main__":
+    main()
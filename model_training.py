@@ -3,8 +3,7 @@ import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
-import joblib
-import os
+from utils.model_registry import save_model_artifact
 
 # -------------------------------
 # Create Sample Dataset (replace with your real data)
@@ -52,10 +51,10 @@ def train_and_save_model():
     print(f"R² Score: {r2_score(y_test, y_pred):.4f}")
     print(f"RMSE: {np.sqrt(mean_squared_error(y_test, y_pred)):.2f}")
 
-    # Save the model
-    os.makedirs("models", exist_ok=True)
-    joblib.dump(model, "models/emission_model.pkl")
+    # Save the model (pickle + memory-mappable companion)
+    mmap_path = save_model_artifact(model, "models/emission_model.pkl")
     print("\n✅ Model saved at: models/emission_model.pkl")
+    print(f"✅ Memory-mapped model saved at: {mmap_path}")
 
 # -------------------------------
 # Run the script
@@ -1,10 +1,11 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import json
-import os
 import secrets
 from utils.utils import fetch_external_emission_data
+from utils.storage import get_store
+from utils.auth import save_api_key
+from utils.emission_sources import set_emission_sources
 
 API_USERS_FILE = "api_users.json"
 
@@ -120,14 +121,7 @@ if st.session_state["logged_in_user"] is None:
                 st.session_state["users"][new_username] = {"password": new_password, "role": role, "api_key": api_key}
                 # Save API key to shared file
                 try:
-                    if os.path.exists(API_USERS_FILE):
-                        with open(API_USERS_FILE, "r") as f:
-                            api_users = json.load(f)
-                    else:
-                        api_users = {}
-                    api_users[new_username] = api_key
-                    with open(API_USERS_FILE, "w") as f:
-                        json.dump(api_users, f, indent=2)
+                    save_api_key(new_username, api_key, API_USERS_FILE)
                 except Exception as e:
                     st.warning(f"Could not save API key to file: {e}")
                 st.success(f"User {new_username} registered as {role}. Please log in.")
@@ -201,23 +195,13 @@ if selected_company:
     # --- Display Current Data ---
     st.header("Current Emission Sources")
     if company_data["emission_sources"]:
-        df = pd.DataFrame(company_data["emission_sources"])
-        if "emission" not in df.columns:
+        sources = set_emission_sources(company_data["emission_sources"])
+        if "emission" not in sources.frame.columns:
             st.warning("No 'emission' column found in emission sources. Please check your data input.")
-            total_emissions = 0
-        else:
-            total_emissions = df["emission"].sum()
         # Fix: get benchmarks for the current sector
         sector = company_data["info"].get("sector", "Other")
         benchmarks = get_sector_benchmarks(sector)
-        issues = []
-        for idx, row in df.iterrows():
-            if row["emission"] < 0:
-                issues.append(f"Negative value for {row['type']}.")
-            if row["emission"] > 2 * benchmarks["average"]:
-                issues.append(f"Unusually high value for {row['type']} (> {2*benchmarks['average']} tons CO₂e).")
-        if total_emissions > 2 * benchmarks["average"]:
-            issues.append(f"Total emissions are much higher than sector average ({benchmarks['average']} tons CO₂e).")
+        issues = sources.issues(benchmarks)
         if issues:
             st.warning("Data validation issues detected:")
             for issue in issues:
@@ -238,18 +222,13 @@ if selected_company:
     # --- Sync with API ---
     st.header("Sync with API")
     if st.button("Sync with API"):
-        api_file = "api_emission_data.json"
-        if os.path.exists(api_file):
-            with open(api_file, "r") as f:
-                api_data = json.load(f)
-            if selected_company in api_data:
-                company_data["emission_sources"] = api_data[selected_company]
-                st.success(f"Emission sources updated from API for {selected_company}.")
-                st.session_state["last_update"] = datetime.datetime.now().date()
-            else:
-                st.info(f"No API data found for {selected_company}.")
+        api_sources = get_store().get_company(selected_company)
+        if api_sources is not None:
+            company_data["emission_sources"] = api_sources
+            st.success(f"Emission sources updated from API for {selected_company}.")
+            st.session_state["last_update"] = datetime.datetime.now().date()
         else:
-            st.info("API data file not found.")
+            st.info(f"No API data found for {selected_company}.")
 
     # --- Import from External Source ---
     st.header("Import from External Source")
@@ -268,4 +247,4 @@ if selected_company:
     # Save back to session state
     st.session_state["companies"][selected_company] = company_data
     st.session_state["company_info"] = company_data["info"]
-    st.session_state["emission_sources"] = company_data["emission_sources"] 
\ No newline at end of file
+    set_emission_sources(company_data["emission_sources"]) 
\ No newline at end of file
@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
-from utils.utils import load_model, forecast_emissions
+from utils.utils import load_model
+from utils.forecasting import forecast_portfolio
+from utils.emission_sources import get_emission_sources, set_emission_sources, sum_emissions
 import plotly.graph_objs as go
 
 st.title("📚 Scenario Library")
@@ -11,13 +13,13 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 # Remove scenario_library session state check; always initialize below
 company_name = company_info["name"]
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page before using the scenario library.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page before using the scenario library.")
     st.stop()
 
@@ -32,7 +34,7 @@ if company_name not in st.session_state["scenario_library"]:
 # --- Save New Scenario ---
 st.header("Save Current Scenario")
 scenario_name = st.text_input("Scenario Name")
-adjusted_sources = st.session_state.get("emission_sources", [])
+adjusted_sources = sources.records
 if st.button("Save Scenario") and scenario_name:
     st.session_state["scenario_library"][company_name][scenario_name] = adjusted_sources.copy()
     st.success(f"Scenario '{scenario_name}' saved.")
@@ -43,7 +45,7 @@ scenarios = list(st.session_state["scenario_library"][company_name].keys())
 if scenarios:
     selected = st.selectbox("Select a scenario to load or compare", scenarios)
     if st.button("Load Scenario"):
-        st.session_state["emission_sources"] = st.session_state["scenario_library"][company_name][selected].copy()
+        set_emission_sources(st.session_state["scenario_library"][company_name][selected].copy())
         st.success(f"Scenario '{selected}' loaded. Go to Dashboard or Scenario Simulation to view results.")
     if st.button("Delete Scenario"):
         del st.session_state["scenario_library"][company_name][selected]
@@ -57,10 +59,13 @@ if scenarios:
         years = 10
         # --- Plotly Interactive Scenario Comparison ---
         plotly_fig = go.Figure()
-        for sc in compare_list:
-            sources = st.session_state["scenario_library"][company_name][sc]
-            total_emission = sum([src["emission"] for src in sources])
-            forecast_df = forecast_emissions(model, total_emission, years)
+        # One batched forecast for every selected scenario
+        portfolio = [
+            {"entity": sc, "emissions": sum_emissions(st.session_state["scenario_library"][company_name][sc])}
+            for sc in compare_list
+        ]
+        forecasts = forecast_portfolio(portfolio, years, model=model)
+        for sc, forecast_df in forecasts.groupby("Entity", sort=False):
             plotly_fig.add_trace(go.Scatter(x=forecast_df['Year'], y=forecast_df['Emission'], mode='lines+markers', name=sc))
         plotly_fig.update_layout(title=f"Interactive Scenario Comparison for {company_name}", xaxis_title="Year", yaxis_title="CO₂ Emissions (tons)")
         st.plotly_chart(plotly_fig, use_container_width=True)
@@ -1,7 +1,8 @@
 import streamlit as st
-import json
 import secrets
-import os
+from utils.utils import forecast_cache_stats
+from utils.storage import get_store
+from utils.auth import save_api_key
 
 st.title("🔑 Admin Dashboard")
 
@@ -31,14 +32,7 @@ for uname in usernames:
             users[uname]["api_key"] = new_key
             # Update api_users.json
             try:
-                if os.path.exists(API_USERS_FILE):
-                    with open(API_USERS_FILE, "r") as f:
-                        api_users = json.load(f)
-                else:
-                    api_users = {}
-                api_users[uname] = new_key
-                with open(API_USERS_FILE, "w") as f:
-                    json.dump(api_users, f, indent=2)
+                save_api_key(uname, new_key, API_USERS_FILE)
             except Exception as e:
                 st.warning(f"Could not update API key file: {e}")
             st.success(f"API key for {uname} reset.")
@@ -66,23 +60,32 @@ if deactivated:
 else:
     st.info("No deactivated users.")
 
+st.header("Forecast Cache")
+cache_stats = forecast_cache_stats()
+col1, col2, col3 = st.columns(3)
+col1.metric("Cached forecasts", f"{cache_stats['size']}/{cache_stats['maxsize']}")
+col2.metric("Hits / Misses", f"{cache_stats['hits']} / {cache_stats['misses']}")
+col3.metric("Hit rate", f"{cache_stats['hit_rate']:.0%}")
+
 st.header("API Update Log")
-API_LOG_FILE = "api_log.json"
-log_data = []
-if os.path.exists(API_LOG_FILE):
-    with open(API_LOG_FILE, "r") as f:
-        log_data = json.load(f)
+LOG_PAGE_SIZE = 50
+store = get_store()
+companies = store.log_companies()
+if companies:
     usernames = [u for u in users.keys()]
-    companies = list({entry['company'] for entry in log_data})
     selected_user = st.selectbox("Filter by user", ["All"] + usernames)
     selected_company = st.selectbox("Filter by company", ["All"] + companies)
-    filtered = log_data
-    if selected_user != "All":
-        filtered = [entry for entry in filtered if entry['username'] == selected_user]
-    if selected_company != "All":
-        filtered = [entry for entry in filtered if entry['company'] == selected_company]
-    st.write(f"Showing {len(filtered)} log entries:")
-    for entry in filtered:
+    log_filter = {
+        "username": None if selected_user == "All" else selected_user,
+        "company": None if selected_company == "All" else selected_company
+    }
+    # Filtering runs on the log index; only the visible page is read
+    total = store.count_log(**log_filter)
+    pages = max(1, (total + LOG_PAGE_SIZE - 1) // LOG_PAGE_SIZE)
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+    entries = store.query_log(**log_filter, offset=(page - 1) * LOG_PAGE_SIZE, limit=LOG_PAGE_SIZE)
+    st.write(f"Showing {len(entries)} of {total} log entries (page {page}/{pages}):")
+    for entry in entries:
         st.json(entry)
 else:
-    st.info("No API log data found.") 
\ No newline at end of file
+    st.info("No API log data found.")
@@ -1,8 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objs as go
 import matplotlib.pyplot as plt
-from utils.utils import load_model, forecast_emissions
+from utils.utils import load_model, add_fan_chart, matching_bands
+from utils.forecasting import forecast_portfolio
+from utils.emission_sources import get_emission_sources, sum_emissions
 
 st.set_page_config(layout="wide")
 st.title("📊 Interactive Dashboard")
@@ -12,27 +13,25 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 forecast_df = st.session_state.get("forecast_df")
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page to use this dashboard.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page to use this dashboard.")
     st.stop()
 if forecast_df is None or not hasattr(forecast_df, 'head'):
     st.warning("Please generate a forecast to use this dashboard.")
     st.stop()
-df = pd.DataFrame(emission_sources)
-has_emission_type = "emission" in df.columns and "type" in df.columns
-if not has_emission_type:
+if not sources.has_emission_type:
     st.warning("No 'emission' or 'type' column found in emission sources. Please check your data input.")
     st.stop()
 
 # --- Key Metrics ---
 col1, col2, col3 = st.columns(3)
 with col1:
-    st.metric("Total Emissions (tons CO₂e)", f"{df['emission'].sum():,.0f}")
+    st.metric("Total Emissions (tons CO₂e)", f"{sources.total:,.0f}")
 with col2:
     if forecast_df is not None and len(forecast_df) > 1:
         avg_change = (forecast_df["Emission"].values[1:] - forecast_df["Emission"].values[:-1]).mean()
@@ -59,6 +58,9 @@ st.divider()
 st.subheader("Forecasted Emissions (Interactive)")
 if forecast_df is not None:
     plotly_fig = go.Figure()
+    bands = matching_bands(forecast_df)
+    if bands is not None:
+        add_fan_chart(plotly_fig, bands)
     plotly_fig.add_trace(go.Scatter(x=forecast_df['Year'], y=forecast_df['Emission'], mode='lines+markers', name='Forecast'))
     plotly_fig.update_layout(title=f"Emission Forecast for {company_info['name']}", xaxis_title="Year", yaxis_title="CO₂ Emissions (tons)")
     st.plotly_chart(plotly_fig, use_container_width=True)
@@ -67,11 +69,12 @@ else:
 
 # --- Interactive Emission Breakdown ---
 st.subheader("Current Emissions by Source (Interactive)")
-plotly_pie = go.Figure(data=[go.Pie(labels=df["type"], values=df["emission"], hole=0.3)])
+by_type = sources.by_type
+plotly_pie = go.Figure(data=[go.Pie(labels=by_type.index.astype(str), values=by_type.values, hole=0.3)])
 plotly_pie.update_layout(title="Emission Breakdown by Source")
 st.plotly_chart(plotly_pie, use_container_width=True)
 
-plotly_bar = go.Figure(data=[go.Bar(x=df["type"], y=df["emission"])] )
+plotly_bar = go.Figure(data=[go.Bar(x=by_type.index.astype(str), y=by_type.values)] )
 plotly_bar.update_layout(title="Emission Bar Chart", xaxis_title="Source Type", yaxis_title="Annual Emissions (tons CO₂e)")
 st.plotly_chart(plotly_bar, use_container_width=True)
 
@@ -85,25 +88,25 @@ if "scenario_library" in st.session_state and company_info["name"] in st.session
             model = load_model()
             years = 10
             plotly_fig = go.Figure()
-            for sc in compare_list:
-                sources = st.session_state["scenario_library"][company_info["name"]][sc]
-                total_emission = sum([src["emission"] for src in sources])
-                forecast_df = forecast_emissions(model, total_emission, years)
-                plotly_fig.add_trace(go.Scatter(x=forecast_df['Year'], y=forecast_df['Emission'], mode='lines+markers', name=sc))
+            # One batched forecast for every selected scenario
+            portfolio = [
+                {"entity": sc, "emissions": sum_emissions(st.session_state["scenario_library"][company_info["name"]][sc])}
+                for sc in compare_list
+            ]
+            forecasts = forecast_portfolio(portfolio, years, model=model)
+            for sc, scenario_forecast in forecasts.groupby("Entity", sort=False):
+                plotly_fig.add_trace(go.Scatter(x=scenario_forecast['Year'], y=scenario_forecast['Emission'], mode='lines+markers', name=sc))
             plotly_fig.update_layout(title=f"Scenario Comparison for {company_info['name']}", xaxis_title="Year", yaxis_title="CO₂ Emissions (tons)")
             st.plotly_chart(plotly_fig, use_container_width=True)
 
 # --- Map Visualization (if location data present) ---
-has_location = any('location' in src for src in emission_sources)
-if has_location:
+if sources.has_location:
     import folium
     from streamlit_folium import st_folium
     st.subheader("Map of Emission Sources")
     m = folium.Map(location=[20, 78], zoom_start=4)
     from folium.plugins import MarkerCluster
     marker_cluster = MarkerCluster().add_to(m)
-    for src in emission_sources:
-        if 'location' in src:
-            lat, lon = src['location']
-            folium.CircleMarker(location=[lat, lon], radius=8, popup=f"{src['type']}: {src['emission']} tons", color='blue', fill=True).add_to(marker_cluster)
+    for (lat, lon), source, emission_val in sources.locations:
+        folium.CircleMarker(location=[lat, lon], radius=8, popup=f"{source}: {emission_val} tons", color='blue', fill=True).add_to(marker_cluster)
     st_folium(m, width=900, height=500) 
\ No newline at end of file
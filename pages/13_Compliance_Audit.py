@@ -3,6 +3,7 @@ import json
 import os
 from fpdf import FPDF
 import pandas as pd
+from utils.emission_sources import get_emission_sources
 
 st.title("📑 Regulatory Compliance & Audit Tools")
 
@@ -11,14 +12,12 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 
-if not company_info or not emission_sources:
+if not company_info or not sources.valid:
     st.warning("Please fill out your company profile and add emission sources on the 'Company Profile' page.")
     st.stop()
 
-df = pd.DataFrame(emission_sources)
-
 # --- Generate Compliance Report ---
 st.header("Generate Compliance Report")
 report_type = st.selectbox("Select standard", ["GHG Protocol", "ISO 14064"])
@@ -34,15 +33,15 @@ if st.button("Download Compliance Report (PDF)"):
     pdf.set_font("Arial", 'B', 12)
     pdf.cell(0, 10, "Emission Sources:", ln=True)
     pdf.set_font("Arial", size=10)
-    for idx, row in df.iterrows():
-        pdf.cell(0, 8, f"- {row['type']}: {row['emission']} tons CO₂e", ln=True)
+    for source, emission_val in zip(sources.types, sources.emissions):
+        pdf.cell(0, 8, f"- {source}: {emission_val} tons CO₂e", ln=True)
     pdf.ln(5)
     pdf.output("compliance_report.pdf")
     with open("compliance_report.pdf", "rb") as f:
         st.download_button("Download PDF", data=f, file_name="compliance_report.pdf", mime="application/pdf")
     os.remove("compliance_report.pdf")
 if st.button("Download Compliance Report (CSV)"):
-    st.download_button("Download CSV", data=df.to_csv(index=False).encode('utf-8'), file_name="compliance_report.csv", mime="text/csv")
+    st.download_button("Download CSV", data=sources.csv(), file_name="compliance_report.csv", mime="text/csv")
 
 # --- Audit Document Upload/View ---
 st.header("Audit Document Upload & View")
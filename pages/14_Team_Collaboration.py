@@ -1,6 +1,7 @@
 import streamlit as st
 import json
 import os
+from utils.emission_sources import get_emission_sources
 
 st.title("🤝 Team Collaboration & Task Assignment")
 
@@ -9,12 +10,11 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
-company_info = st.session_state.get("company_info")
+sources = get_emission_sources()
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page to use this page.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page to use this page.")
     st.stop()
 
@@ -1,7 +1,7 @@
 import streamlit as st
-from utils.utils import load_model, forecast_emissions
+from utils.utils import load_model, forecast_emissions, forecast_emission_intervals, matching_bands, plot_fan_chart
+from utils.emission_sources import get_emission_sources
 import matplotlib.pyplot as plt
-import pandas as pd
 
 st.title("📈 Forecast CO₂ Emissions")
 
@@ -16,22 +16,21 @@ except Exception as e:
     st.stop()
 
 def get_total_emissions():
-    sources = st.session_state.get("emission_sources", [])
-    if not sources or not isinstance(sources, list) or not all(isinstance(x, dict) for x in sources):
+    sources = get_emission_sources()
+    if not sources.valid:
         return 0
-    df = pd.DataFrame(sources)
-    if "emission" not in df.columns:
+    if "emission" not in sources.frame.columns:
         st.warning("No 'emission' column found in emission sources. Please check your data input.")
         return 0
-    return df["emission"].sum()
+    return sources.total
 
 # Check for company info and emission sources
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page before forecasting.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page before forecasting.")
     st.stop()
 
@@ -45,6 +44,9 @@ except Exception as e:
     st.stop()
 
 years = st.slider("Forecast for next N years:", min_value=1, max_value=30, value=20)
+show_bands = st.checkbox("Show uncertainty bands", value=True,
+                         help="Spread of the forest's trees combined with Monte Carlo samples of input growth.")
+n_samples = st.select_slider("Growth scenarios sampled", options=[100, 200, 500, 1000], value=200, disabled=not show_bands)
 total_emissions = get_total_emissions()
 st.write(f"Starting with total annual emissions: **{total_emissions} tons CO₂e**")
 
@@ -52,6 +54,7 @@ if st.button("Generate Forecast"):
     try:
         forecast_df = forecast_emissions(model, total_emissions, years)
         st.session_state["forecast_df"] = forecast_df  # Save for dashboard
+        st.session_state["forecast_bands"] = forecast_emission_intervals(model, total_emissions, years, n_samples) if show_bands else None
     except Exception as e:
         st.error(f"Error generating forecast: {e}")
         forecast_df = None
@@ -65,11 +68,19 @@ if st.button("Generate Forecast"):
             st.write("### Forecast Graph")
             fig, ax = plt.subplots()
             if 'Year' in forecast_df.columns and 'Emission' in forecast_df.columns:
-                ax.plot(forecast_df['Year'], forecast_df['Emission'], marker='o')
+                bands = matching_bands(forecast_df)
+                if bands is not None:
+                    plot_fan_chart(ax, bands)
+                ax.plot(forecast_df['Year'], forecast_df['Emission'], marker='o', label="Forecast")
+                if bands is not None:
+                    ax.legend()
                 ax.set_xlabel("Year")
                 ax.set_ylabel("CO₂ Emissions (tons)")
                 ax.set_title(f"Emission Forecast for {name}")
                 st.pyplot(fig, use_container_width=True)
+                if bands is not None:
+                    with st.expander("Prediction intervals"):
+                        st.dataframe(bands, use_container_width=True)
             else:
                 st.warning("Forecast data missing 'Year' or 'Emission' columns.")
         except Exception as e:
@@ -6,7 +6,11 @@ import tempfile
 import os
 import datetime
 import plotly.graph_objs as go
-from utils.utils import load_model, forecast_emissions, ai_anomaly_detection
+from utils.utils import load_model, forecast_emissions, add_fan_chart, matching_bands
+from utils.emission_sources import get_emission_sources
+from utils.reduction_planning import (
+    DEFAULT_COST_PER_TON, FALLBACK_COST_PER_TON, abatement_frontier, cost_curve, optimize_budget
+)
 
 st.title("📊 Emission Dashboard")
 
@@ -16,11 +20,11 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
 
 # Check for company info and emission sources
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page to view the dashboard.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page to view the dashboard.")
     st.stop()
 
@@ -67,37 +71,35 @@ if st.session_state["notifications"]:
 
 st.info("This dashboard is optimized for mobile and desktop. For best experience on mobile, use landscape mode.")
 
-try:
-    df = pd.DataFrame(emission_sources)
-    has_emission_type = "emission" in df.columns and "type" in df.columns
-except Exception as e:
-    st.error(f"Error processing emission sources: {e}")
-    has_emission_type = False
-    df = pd.DataFrame()
+df = sources.frame
+has_emission_type = sources.has_emission_type
 
 if not has_emission_type:
     st.warning("No 'emission' or 'type' column found in emission sources. Please check your data input.")
 # --- Current Emissions by Source ---
 if has_emission_type:
     try:
+        # Charts show per-type totals so they stay readable with many sources
+        by_type = sources.by_type
+        labels = by_type.index.astype(str)
         fig1, ax1 = plt.subplots()
-        ax1.pie(df["emission"], labels=df["type"], autopct="%1.1f%%", startangle=90)
+        ax1.pie(by_type.values, labels=labels, autopct="%1.1f%%", startangle=90)
         ax1.axis('equal')
         st.pyplot(fig1, use_container_width=True)
 
         fig2, ax2 = plt.subplots()
-        ax2.bar(df["type"], df["emission"])
+        ax2.bar(labels, by_type.values)
         ax2.set_xlabel("Source Type")
         ax2.set_ylabel("Annual Emissions (tons CO₂e)")
         ax2.set_title("Emissions by Source")
         st.pyplot(fig2, use_container_width=True)
 
         # --- Plotly Interactive Pie Chart ---
-        plotly_pie = go.Figure(data=[go.Pie(labels=df["type"], values=df["emission"], hole=0.3)])
+        plotly_pie = go.Figure(data=[go.Pie(labels=labels, values=by_type.values, hole=0.3)])
         plotly_pie.update_layout(title="Interactive Emission Breakdown by Source")
         st.plotly_chart(plotly_pie, use_container_width=True)
         # --- Plotly Interactive Bar Chart ---
-        plotly_bar = go.Figure(data=[go.Bar(x=df["type"], y=df["emission"])] )
+        plotly_bar = go.Figure(data=[go.Bar(x=labels, y=by_type.values)] )
         plotly_bar.update_layout(title="Interactive Emission Bar Chart", xaxis_title="Source Type", yaxis_title="Annual Emissions (tons CO₂e)")
         st.plotly_chart(plotly_bar, use_container_width=True)
     except Exception as e:
@@ -107,12 +109,8 @@ if has_emission_type:
     st.write("### Recommendations & Best Practices")
     recommendations = []
     try:
-        for idx, row in df.sort_values("emission", ascending=False).iterrows():
-            source = row.get("type")
-            emission_val = row.get("emission")
-            if source is None:
-                continue
-            if emission_val is None or emission_val <= 0:
+        for source, emission_val in sources.by_type.items():
+            if emission_val <= 0:
                 rec = f"No emissions recorded for {source}. Add emission data to see savings estimates."
                 recommendations.append(rec)
                 continue
@@ -147,6 +145,9 @@ if forecast_df is not None and hasattr(forecast_df, 'head'):
             st.pyplot(fig3, use_container_width=True)
             # --- Plotly Interactive Chart ---
             plotly_fig = go.Figure()
+            bands = matching_bands(forecast_df)
+            if bands is not None:
+                add_fan_chart(plotly_fig, bands)
             plotly_fig.add_trace(go.Scatter(x=forecast_df['Year'], y=forecast_df['Emission'], mode='lines+markers', name='Forecast'))
             plotly_fig.update_layout(title=f"Interactive Emission Forecast for {company_name}", xaxis_title="Year", yaxis_title="CO₂ Emissions (tons)")
             st.plotly_chart(plotly_fig, use_container_width=True)
@@ -189,7 +190,7 @@ st.write("### Export Data")
 import io
 if has_emission_type and st.button("Export Emission Sources as CSV"):
     try:
-        csv = df.to_csv(index=False).encode('utf-8')
+        csv = sources.csv()
         st.download_button("Download Emission Sources CSV", data=csv, file_name="emission_sources.csv", mime="text/csv")
     except Exception as e:
         st.error(f"Error exporting emission sources: {e}")
@@ -215,8 +216,8 @@ def generate_pdf_report(company_info, df, forecast_df, recommendations, fig_path
     pdf.cell(0, 10, "Emission Sources:", ln=True)
     pdf.set_font("Arial", size=10)
     if has_emission_type:
-        for idx, row in df.iterrows():
-            pdf.cell(0, 8, f"- {row['type']}: {row['emission']} tons CO₂e", ln=True)
+        for source, emission_val in zip(sources.types, sources.emissions):
+            pdf.cell(0, 8, f"- {source}: {emission_val} tons CO₂e", ln=True)
     pdf.ln(5)
     if forecast_df is not None:
         pdf.set_font("Arial", 'B', 12)
@@ -269,17 +270,7 @@ def get_sector_benchmarks(sector):
 sector = company_info["sector"]
 benchmarks = get_sector_benchmarks(sector)
 if has_emission_type:
-    total_emissions = df["emission"].sum()
-    issues = []
-    for idx, row in df.iterrows():
-        if "emission" not in row or "type" not in row:
-            continue
-        if row["emission"] < 0:
-            issues.append(f"Negative value for {row['type']}.")
-        if row["emission"] > 2 * benchmarks["average"]:
-            issues.append(f"Unusually high value for {row['type']} (>{2*benchmarks['average']} tons CO₂e).")
-    if total_emissions > 2 * benchmarks["average"]:
-        issues.append(f"Total emissions are much higher than sector average ({benchmarks['average']} tons CO₂e).")
+    issues = sources.issues(benchmarks)
     if issues:
         st.warning("Data validation issues detected:")
         for issue in issues:
@@ -288,7 +279,7 @@ if has_emission_type:
 # --- AI-powered Data Validation ---
 st.header("AI-powered Data Validation & Anomaly Detection")
 if has_emission_type:
-    anomalies = ai_anomaly_detection(df)
+    anomalies = sources.anomalies()
     if anomalies:
         st.warning(f"ML model flagged {len(anomalies)} emission source(s) as anomalies:")
         for idx in anomalies:
@@ -342,47 +333,37 @@ else:
 # --- Interactive ML Recommendations ---
 st.header("Interactive Emission Reduction Planner")
 model = load_model()
+# Inputs are per source type, so the planner scales with types rather than rows
+source_types = list(sources.by_type.index.astype(object)) if has_emission_type else []
+type_emissions = sources.by_type
 # Custom cost per ton inputs
 if "custom_costs" not in st.session_state:
     st.session_state["custom_costs"] = {}
 COST_PER_TON = {}
-for idx, row in df.iterrows():
-    source = row.get("type")
-    emission_val = row.get("emission")
-    if source is None or emission_val is None:
-        continue
-    default_cost = {"Electricity": 50, "Transport": 100, "Supply Chain": 75, "Other": 60}.get(source, 60)
-    st.session_state["custom_costs"][f"{source}_{idx}"] = st.number_input(
+for source in source_types:
+    default_cost = DEFAULT_COST_PER_TON.get(source, FALLBACK_COST_PER_TON)
+    st.session_state["custom_costs"][source] = st.number_input(
         f"Cost per ton for {source} ($)",
         min_value=1,
-        value=st.session_state["custom_costs"].get(f"{source}_{idx}", default_cost),
+        value=st.session_state["custom_costs"].get(source, default_cost),
         step=1,
-        key=f"cost_{source}_{idx}"
+        key=f"cost_{source}"
     )
-    COST_PER_TON[source] = st.session_state["custom_costs"][f"{source}_{idx}"]
+    COST_PER_TON[source] = st.session_state["custom_costs"][source]
 
 # --- Min/Max Reduction Constraints ---
 st.subheader("Set Min/Max Reduction Constraints")
 if "reduction_constraints" not in st.session_state:
     st.session_state["reduction_constraints"] = {}
 constraints = {}
-for idx, row in df.iterrows():
-    source = row.get("type")
-    emission_val = row.get("emission")
-    if source is None or emission_val is None:
-        continue
-    min_val = st.number_input(f"Min reduction for {source} (%)", min_value=0, max_value=100, value=0, step=1, key=f"min_{source}_{idx}")
-    max_val = st.number_input(f"Max reduction for {source} (%)", min_value=min_val, max_value=100, value=100, step=1, key=f"max_{source}_{idx}")
+for source in source_types:
+    min_val = st.number_input(f"Min reduction for {source} (%)", min_value=0, max_value=100, value=0, step=1, key=f"min_{source}")
+    max_val = st.number_input(f"Max reduction for {source} (%)", min_value=min_val, max_value=100, value=100, step=1, key=f"max_{source}")
     constraints[source] = (min_val, max_val)
 
 reduction_options = {}
 costs = {}
-for idx, row in df.iterrows():
-    source = row.get("type")
-    emission_val = row.get("emission")
-    if source is None or emission_val is None:
-        continue
-    current = emission_val
+for source in source_types:
     min_val, max_val = constraints[source]
     reduction_options[source] = st.slider(
         f"Reduce {source} emissions by (%)",
@@ -390,39 +371,33 @@ for idx, row in df.iterrows():
         max_value=max_val,
         value=min_val,
         step=1,
-        key=f"slider_{source}_{idx}"
+        key=f"slider_{source}"
     )
-    tons_reduced = current * reduction_options[source] / 100
-    cost = tons_reduced * COST_PER_TON.get(source, 60)
+    tons_reduced = type_emissions[source] * reduction_options[source] / 100
+    cost = tons_reduced * COST_PER_TON[source]
     costs[source] = cost
     st.caption(f"Estimated cost: ${cost:,.0f} for {tons_reduced:.1f} tons CO₂e reduced")
 
+# Per-source arrays for the planning engine
+if source_types:
+    type_series = df["type"].astype(object)
+    source_costs = type_series.map(COST_PER_TON).fillna(FALLBACK_COST_PER_TON).to_numpy(dtype=float)
+    source_min = type_series.map({s: c[0] for s, c in constraints.items()}).fillna(0).to_numpy(dtype=float)
+    source_max = type_series.map({s: c[1] for s, c in constraints.items()}).fillna(0).to_numpy(dtype=float)
+
 # --- Cost vs. Reduction Curve Visualization ---
 st.subheader("Cost vs. CO₂e Reduction Curve")
-import numpy as np
 import plotly.graph_objs as go
-curve_points = []
-for pct in range(0, 101, 5):
-    total_cost = 0
-    total_reduced = 0
-    for idx, row in df.iterrows():
-        source = row.get("type")
-        emission_val = row.get("emission")
-        if source is None or emission_val is None:
-            continue
-        cost = COST_PER_TON.get(source, 60)
-        min_val, max_val = constraints[source]
-        # Use pct only if within constraints
-        use_pct = min(max(pct, min_val), max_val)
-        tons_reduced = emission_val * use_pct / 100
-        total_cost += tons_reduced * cost
-        total_reduced += tons_reduced
-    curve_points.append((total_cost, total_reduced))
-curve_points = np.array(curve_points)
-curve_fig = go.Figure()
-curve_fig.add_trace(go.Scatter(x=curve_points[:,0], y=curve_points[:,1], mode='lines+markers', name='Cost vs. CO₂e Reduced'))
-curve_fig.update_layout(title="Cost vs. CO₂e Reduction Curve", xaxis_title="Total Cost ($)", yaxis_title="Total CO₂e Reduced (tons)")
-st.plotly_chart(curve_fig, use_container_width=True)
+if source_types:
+    resolution = st.select_slider("Curve resolution (% step)", options=[0.1, 0.5, 1, 5], value=1)
+    _, curve_cost, curve_reduced = cost_curve(sources.emissions, source_costs, source_min, source_max,
+                                              steps=int(round(100 / resolution)) + 1)
+    frontier_cost, frontier_reduced = abatement_frontier(sources.emissions, source_costs, source_min, source_max)
+    curve_fig = go.Figure()
+    curve_fig.add_trace(go.Scatter(x=curve_cost, y=curve_reduced, mode='lines', name='Same % cut on every source'))
+    curve_fig.add_trace(go.Scatter(x=frontier_cost, y=frontier_reduced, mode='lines+markers', name='Least-cost (cheapest first)'))
+    curve_fig.update_layout(title="Cost vs. CO₂e Reduction Curve", xaxis_title="Total Cost ($)", yaxis_title="Total CO₂e Reduced (tons)")
+    st.plotly_chart(curve_fig, use_container_width=True)
 
 # --- Save/Load Reduction Plans ---
 if "reduction_plans" not in st.session_state:
@@ -448,14 +423,8 @@ st.markdown(f"**Total estimated cost for this plan: ${total_cost:,.0f}**")
 if "emission" not in df.columns:
     st.warning("No 'emission' column found in emission sources. Please check your data input.")
 else:
-    new_emissions = df["emission"].copy()
-    for idx, row in df.iterrows():
-        pct = reduction_options.get(row.get("type"), 0)
-        emission_val = row.get("emission")
-        if emission_val is None:
-            continue
-        new_emissions[idx] = emission_val * (1 - pct/100)
-    total_new = new_emissions.sum()
+    pct = df["type"].astype(object).map(reduction_options).fillna(0) if "type" in df.columns else 0
+    total_new = (df["emission"] * (1 - pct / 100)).sum()
     forecast_new = forecast_emissions(model, total_new, len(forecast_df) if forecast_df is not None else 10)
     st.subheader("Combined Impact of Selected Reductions")
     import plotly.graph_objs as go
@@ -472,39 +441,19 @@ if "emission" not in df.columns:
     st.warning("No 'emission' column found in emission sources. Please check your data input.")
 else:
     budget = st.number_input("Enter your budget ($)", min_value=0, value=1000, step=100)
-    if st.button("Suggest Optimal Plan for Budget"):
-        # Sort sources by cost per ton (ascending)
-        sources_sorted = sorted([(row.get("type"), row.get("emission"), COST_PER_TON.get(row.get("type"), 60)) for idx, row in df.iterrows()], key=lambda x: x[2])
-        remaining_budget = budget
-        optimal_reduction = {src: 0 for src, _, _ in sources_sorted}
-        total_tons_reduced = 0
-        for src, tons, cost_per_ton in sources_sorted:
-            if src is None or tons is None or cost_per_ton is None:
-                continue
-            max_tons = tons * constraints[src][1] / 100 if src in constraints else tons
-            if max_tons is None or not isinstance(max_tons, (int, float)) or not isinstance(cost_per_ton, (int, float)) or cost_per_ton is None or cost_per_ton <= 0:
-                continue
-            affordable_tons = min(max_tons, remaining_budget / cost_per_ton)
-            pct = int((affordable_tons / tons) * 100) if tons > 0 else 0
-            optimal_reduction[src] = pct
-            spent = affordable_tons * cost_per_ton
-            total_tons_reduced += affordable_tons
-            remaining_budget -= spent
-            if remaining_budget <= 0:
-                break
+    if st.button("Suggest Optimal Plan for Budget") and source_types:
+        plan = optimize_budget(sources.emissions, source_costs, budget, source_min, source_max)
+        if not plan["feasible"]:
+            st.warning(f"The minimum reductions alone cost ${plan['total_cost']:,.0f}, more than the budget.")
+        # Per type: share of the type's emissions cut by the plan
+        type_tons = pd.Series(plan["tons"]).groupby(type_series.to_numpy()).sum()
+        optimal_reduction = (type_tons / type_emissions * 100).fillna(0)
         st.write("**Recommended Reductions (%):**")
-        for src in optimal_reduction:
-            st.write(f"{src}: {optimal_reduction[src]}%")
-        st.write(f"**Total tons CO₂e reduced:** {total_tons_reduced:.1f}")
+        for src in source_types:
+            st.write(f"{src}: {optimal_reduction[src]:.1f}%")
+        st.write(f"**Total tons CO₂e reduced:** {plan['total_reduced']:.1f} (cost ${plan['total_cost']:,.0f})")
         # Show forecast impact
-        new_emissions = df["emission"].copy()
-        for idx, row in df.iterrows():
-            pct = optimal_reduction.get(row.get("type"), 0)
-            emission_val = row.get("emission")
-            if emission_val is None:
-                continue
-            new_emissions[idx] = emission_val * (1 - pct/100)
-        total_new = new_emissions.sum()
+        total_new = sources.total - plan["total_reduced"]
         forecast_new = forecast_emissions(model, total_new, len(forecast_df) if forecast_df is not None else 10)
         st.subheader("Forecast Impact of Optimal Plan")
         import plotly.graph_objs as go
@@ -520,7 +469,7 @@ st.header("Purchase Carbon Offsets (Prototype)")
 if "emission" not in df.columns:
     st.warning("No 'emission' column found in emission sources. Please check your data input.")
 else:
-    current_emissions = df["emission"].sum()
+    current_emissions = sources.total
     st.write(f"Your current annual emissions: **{current_emissions:,.1f} tons CO₂e**")
     offset_price = 10  # $10 per ton (mock price)
     tons_to_offset = st.number_input("Tons to offset", min_value=0.0, max_value=float(current_emissions), value=0.0, step=1.0)
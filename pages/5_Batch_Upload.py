@@ -1,6 +1,32 @@
 import streamlit as st
-import pandas as pd
-from utils.utils import load_model, batch_predict
+import glob
+import os
+import tempfile
+import time
+from utils.utils import load_model
+from utils.batch_prediction import stream_batch_predict
+
+# Result files of sessions that ended without another run are removed after this long
+RESULT_PREFIX = "batch_predictions_"
+RESULT_MAX_AGE_SECONDS = 24 * 3600
+# st.download_button sends the file as one in-memory blob; larger results stay on disk
+DOWNLOAD_MAX_BYTES = int(os.environ.get("BATCH_DOWNLOAD_MAX_BYTES", 200 << 20))
+
+
+def read_result(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def remove_stale_results():
+    cutoff = time.time() - RESULT_MAX_AGE_SECONDS
+    for path in glob.glob(os.path.join(tempfile.gettempdir(), RESULT_PREFIX + "*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
 
 st.title("📤 Batch Upload for CO₂ Emissions Prediction")
 
@@ -22,29 +48,53 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 if uploaded_file is not None:
-    try:
-        df = pd.read_csv(uploaded_file)
-    except Exception as e:
-        st.error(f"Error reading uploaded CSV: {e}")
-        df = None
-
-    if df is not None:
-        st.write("### Uploaded Data")
-        st.dataframe(df)
+    output_format = st.selectbox("Download format", ["CSV", "Parquet"])
+    if st.button("Run Batch Prediction"):
+        fmt = output_format.lower()
+        progress_text = st.empty()
+        previous = st.session_state.pop("batch_result", None)
+        if previous and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+        remove_stale_results()
+
+        def show_progress(stats):
+            progress_text.write(f"Processed {stats['rows']:,} rows ({stats['rows_per_sec']:,.0f} rows/sec)")
+
+        tmp_path = None
         try:
             model = load_model()
-            results = batch_predict(model, df)
-            st.write("### Batch Predictions")
-            st.dataframe(results)
-            # Download CSV
-            csv = results.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="\U0001F4E5 Download Results as CSV",
-                data=csv,
-                file_name="batch_predictions.csv",
-                mime='text/csv'
-            )
+            # Results are streamed chunk by chunk to a temp file, never held in memory as a whole
+            with tempfile.NamedTemporaryFile(delete=False, prefix=RESULT_PREFIX, suffix=f".{fmt}") as tmpfile:
+                tmp_path = tmpfile.name
+                stats = stream_batch_predict(model, uploaded_file, tmpfile, fmt=fmt, progress_callback=show_progress)
+            st.session_state["batch_result"] = {"path": tmp_path, "fmt": fmt, "stats": stats}
         except Exception as e:
+            # A failed run leaves a partial file that nothing else would remove
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
             st.error(f"Error during batch prediction: {e}")
+
+    batch_result = st.session_state.get("batch_result")
+    if batch_result and os.path.exists(batch_result["path"]):
+        stats = batch_result["stats"]
+        st.write("### Batch Predictions")
+        st.write(f"{stats['rows']:,} rows predicted in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec)")
+        if stats["preview"] is not None:
+            st.caption(f"Showing the first {len(stats['preview'])} rows.")
+            st.dataframe(stats["preview"])
+        mime = "text/csv" if batch_result["fmt"] == "csv" else "application/octet-stream"
+        size = os.path.getsize(batch_result["path"])
+        if size <= DOWNLOAD_MAX_BYTES:
+            # Read only when the button is clicked, not on every rerun
+            st.download_button(
+                label="\U0001F4E5 Download Results",
+                data=lambda: read_result(batch_result["path"]),
+                file_name=f"batch_predictions.{batch_result['fmt']}",
+                mime=mime
+            )
+        else:
+            st.warning(f"The results ({size / 2**20:,.0f} MB) are too large to download through the browser. "
+                       f"They were written on the server to `{batch_result['path']}` and are kept for "
+                       f"{RESULT_MAX_AGE_SECONDS // 3600} hours.")
 else:
     st.info("Upload a CSV file to get started.")
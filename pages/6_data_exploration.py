@@ -4,14 +4,22 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 
 from utils.utils import load_model
+from utils.eda import PAIRPLOT_ROWS, get_explorer
 
 # Advanced visualization libraries
-from sklearn.cluster import KMeans
 from statsmodels.tsa.seasonal import seasonal_decompose
 
+# Rows shown in the dataset preview table
+PREVIEW_ROWS = 1_000
+
 # ---------- Load Data ----------
 def load_data(file_path):
-    return pd.read_csv(file_path)
+    # Shared per dataset version: statistics and fits survive reruns and sessions
+    return get_explorer(file_path)
+
+def _sample_caption(sample, n_rows):
+    if len(sample) < n_rows:
+        st.caption(f"Drawn from a {len(sample):,}-row sample of the {n_rows:,} rows.")
 
 # ---------- Main ----------
 def main():
@@ -24,22 +32,31 @@ def main():
     file_path = "data/data_cleaned.csv"
 
     try:
-        df = load_data(file_path)
-        if df is None or df.empty:
+        explorer = load_data(file_path)
+        # None when the file is too large to load; everything below then comes from one streaming pass
+        df = explorer.df
+        n_rows = explorer.n_rows
+        if n_rows == 0:
             st.warning("Loaded data is empty. Please check your data file.")
             return
+        sample = explorer.sample()
 
         st.write("### 📂 Loaded Dataset")
-        st.dataframe(df)
+        st.dataframe(explorer.preview(PREVIEW_ROWS))
+        if n_rows > PREVIEW_ROWS:
+            st.caption(f"Showing the first {PREVIEW_ROWS:,} of {n_rows:,} rows.")
+        if df is None:
+            st.info("This file is larger than memory: statistics are computed in one streaming pass "
+                    "(quantiles are approximate) and plots use a random sample.")
 
         # ---------- Summary ----------
         st.write("### 📝 Dataset Summary")
-        st.write(df.describe())
+        st.write(explorer.describe())
 
         # ---------- Correlation Heatmap ----------
         st.write("### 🔥 Correlation Heatmap")
         try:
-            corr = df.corr(numeric_only=True)
+            corr = explorer.corr()
             fig, ax = plt.subplots(figsize=(8, 5))
             sns.heatmap(corr, annot=True, cmap="coolwarm", ax=ax)
             st.pyplot(fig)
@@ -48,7 +65,7 @@ def main():
 
         # ---------- Emissions Trend ----------
         st.write("### 📈 Emissions Over Years")
-        if 'Year' in df.columns and 'Emissions' in df.columns:
+        if df is not None and 'Year' in df.columns and 'Emissions' in df.columns:
             try:
                 st.line_chart(df.set_index('Year')['Emissions'])
             except Exception as e:
@@ -56,14 +73,18 @@ def main():
 
         # ---------- Feature Distribution ----------
         st.write("### 📊 Feature Distribution")
-        num_cols = df.select_dtypes(include='number').columns
+        num_cols = explorer.numeric_columns
         if len(num_cols) == 0:
             st.warning("No numeric columns found for feature distribution.")
         else:
             selected_feature = st.selectbox("Feature to plot", num_cols)
             try:
                 fig, ax = plt.subplots()
-                sns.histplot(df[selected_feature], kde=True, ax=ax)
+                # Exact histogram over every row; the density curve comes from the sample
+                density, edges = explorer.histogram(selected_feature)
+                ax.stairs(density, edges, fill=True, alpha=0.5)
+                sns.kdeplot(sample[selected_feature], ax=ax)
+                ax.set_ylabel("Density")
                 ax.set_title(f"Distribution of {selected_feature}")
                 st.pyplot(fig)
             except Exception as e:
@@ -76,9 +97,10 @@ def main():
             y_feature = st.selectbox("Y-axis Feature", num_cols, key="y_feature")
             try:
                 fig, ax = plt.subplots()
-                sns.scatterplot(data=df, x=x_feature, y=y_feature, ax=ax)
+                sns.scatterplot(data=sample, x=x_feature, y=y_feature, ax=ax)
                 ax.set_title(f"{x_feature} vs {y_feature}")
                 st.pyplot(fig)
+                _sample_caption(sample, n_rows)
             except Exception as e:
                 st.error(f"Error plotting scatter plot: {e}")
         else:
@@ -91,9 +113,11 @@ def main():
             y_reg = st.selectbox("Y-axis (regression)", num_cols, key="reg_y")
             try:
                 fig, ax = plt.subplots()
-                sns.regplot(data=df, x=x_reg, y=y_reg, ax=ax)
+                sns.regplot(data=sample, x=x_reg, y=y_reg, ax=ax)
                 ax.set_title(f"Regression: {x_reg} vs {y_reg}")
                 st.pyplot(fig)
+                slope, intercept, r = explorer.regression(x_reg, y_reg)
+                st.caption(f"Fit over all {n_rows:,} rows: {y_reg} = {slope:.4g} × {x_reg} + {intercept:.4g} (r = {r:.3f})")
             except Exception as e:
                 st.error(f"Error plotting regression: {e}")
         else:
@@ -103,14 +127,16 @@ def main():
         st.write("### 🔎 Pair Plot")
         if len(num_cols) >= 2 and st.button("Generate Pair Plot"):
             try:
-                fig = sns.pairplot(df[num_cols])
+                pair_sample = explorer.sample(PAIRPLOT_ROWS)
+                fig = sns.pairplot(pair_sample[num_cols])
                 st.pyplot(fig)
+                _sample_caption(pair_sample, n_rows)
             except Exception as e:
                 st.error(f"Error generating pair plot: {e}")
 
         # ---------- Time Series Decomposition ----------
         st.write("### ⏳ Time Series Decomposition")
-        if 'Year' in df.columns and 'Emissions' in df.columns:
+        if df is not None and 'Year' in df.columns and 'Emissions' in df.columns:
             try:
                 ts = df.set_index('Year')['Emissions']
                 result = seasonal_decompose(ts, model='additive', period=1)
@@ -126,7 +152,9 @@ def main():
         try:
             model = load_model()
             importances = model.feature_importances_
-            feature_names = df.select_dtypes(include='number').drop('Emissions', axis=1, errors='ignore').columns
+            feature_names = getattr(model, "feature_names_in_", None)
+            if feature_names is None:
+                feature_names = [c for c in explorer.numeric_columns if c != 'Emissions']
             importance_df = pd.DataFrame({
                 'Feature': feature_names,
                 'Importance': importances
@@ -143,18 +171,29 @@ def main():
         st.write("### 🔍 KMeans Clustering")
         if len(num_cols) >= 2:
             try:
-                clustering_features = df.select_dtypes(include='number').drop('Emissions', axis=1, errors='ignore')
-                kmeans = KMeans(n_clusters=st.slider("Number of Clusters", 2, 10, 3), random_state=42)
-                df['Cluster'] = kmeans.fit_predict(clustering_features)
+                clustering_features = [c for c in num_cols if c != 'Emissions']
+                n_clusters = st.slider("Number of Clusters", 2, 10, 3)
+                # Fitted once per (k, feature set); moving the slider back reuses the fit
+                labels = explorer.kmeans(n_clusters, clustering_features)
+                if df is not None:
+                    df = df.assign(Cluster=labels)
+                    plot_rows = df.loc[sample.index]
+                else:
+                    plot_rows = sample.assign(Cluster=labels)
                 fig, ax = plt.subplots()
-                sns.scatterplot(data=df, x=clustering_features.columns[0], y=clustering_features.columns[1], hue='Cluster', palette="tab10", ax=ax)
+                sns.scatterplot(data=plot_rows, x=clustering_features[0], y=clustering_features[1], hue='Cluster', palette="tab10", ax=ax)
                 ax.set_title("KMeans Clustering")
                 st.pyplot(fig)
+                _sample_caption(plot_rows, n_rows)
             except Exception as e:
                 st.error(f"Error during clustering: {e}")
         else:
             st.warning("Not enough numeric columns for clustering.")
 
+        if df is None:
+            st.info("Cleaning and export need the data in memory and are not available for this file.")
+            return
+
         # ---------- Cleaning Pipeline ----------
         st.write("### 🧹 Basic Data Cleaning")
         if st.checkbox("Drop missing values"):
@@ -172,8 +211,9 @@ def main():
 
         # ---------- CSV Export ----------
         st.write("### 📥 Export Current Data as CSV")
-        csv_data = df.to_csv(index=False).encode('utf-8')
-        st.download_button("Download CSV", csv_data, file_name="explored_data.csv", mime="text/csv")
+        # Encoded only when the button is clicked, not on every rerun
+        st.download_button("Download CSV", lambda: df.to_csv(index=False).encode('utf-8'),
+                           file_name="explored_data.csv", mime="text/csv")
 
     except FileNotFoundError:
         st.error(f"❌ File not found: {file_path}")
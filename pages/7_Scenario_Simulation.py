@@ -1,7 +1,7 @@
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
 from utils.utils import load_model, forecast_emissions
+from utils.emission_sources import get_emission_sources
 
 st.title("🔄 Scenario Simulation")
 
@@ -10,7 +10,7 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 # Robust initialization for scenario_data
 if "scenario_data" not in st.session_state or not isinstance(st.session_state["scenario_data"], dict):
     st.session_state["scenario_data"] = {"original_forecast": None}
@@ -18,7 +18,7 @@ scenario_data = st.session_state["scenario_data"]
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page before using scenario simulation.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page before using scenario simulation.")
     st.stop()
 if not scenario_data or not isinstance(scenario_data, dict):
@@ -26,16 +26,17 @@ if not scenario_data or not isinstance(scenario_data, dict):
     st.stop()
 
 st.write(f"Scenario simulation for **{company_info['name']}**")
-df = pd.DataFrame(emission_sources)
+# Copy: the adjusted column must not leak into the shared model
+df = sources.frame.copy()
 
 st.write("### Adjust Emission Sources")
 adjusted_emissions = []
-for idx, row in df.iterrows():
+for source, emission_val in zip(sources.types, sources.emissions):
     new_value = st.slider(
-        f"{row['type']} (current: {row['emission']} tons CO₂e)",
+        f"{source} (current: {emission_val} tons CO₂e)",
         min_value=0.0,
-        max_value=float(row['emission']),
-        value=float(row['emission']),
+        max_value=float(emission_val),
+        value=float(emission_val),
         step=0.01
     )
     adjusted_emissions.append(new_value)
@@ -108,15 +109,7 @@ def get_sector_benchmarks(sector):
 if company_info and not df.empty:
     sector = company_info["sector"]
     benchmarks = get_sector_benchmarks(sector)
-    total_emissions = df["adjusted_emission"].sum()
-    issues = []
-    for idx, row in df.iterrows():
-        if row["adjusted_emission"] < 0:
-            issues.append(f"Negative value for {row['type']}.")
-        if row["adjusted_emission"] > 2 * benchmarks["average"]:
-            issues.append(f"Unusually high value for {row['type']} (>{2*benchmarks['average']} tons CO₂e).")
-    if total_emissions > 2 * benchmarks["average"]:
-        issues.append(f"Total emissions are much higher than sector average ({benchmarks['average']} tons CO₂e).")
+    issues = sources.issues(benchmarks, emissions=df["adjusted_emission"])
     if issues:
         st.warning("Data validation issues detected:")
         for issue in issues:
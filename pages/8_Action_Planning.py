@@ -1,7 +1,12 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
-from utils.utils import load_model, forecast_emissions
+from utils.emission_sources import get_emission_sources
+from utils.action_plan import (
+    cheapest_plan, load_scenario_targets, parse_action_plan, plan_frame, plan_summary, plan_years, target_pathway
+)
+from utils.reduction_planning import DEFAULT_COST_PER_TON, FALLBACK_COST_PER_TON
 
 st.title("🗓️ Year-by-Year Action Planning")
 
@@ -10,7 +15,7 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 # Robust initialization for action_plan
 if "action_plan" not in st.session_state or not isinstance(st.session_state["action_plan"], dict):
     st.session_state["action_plan"] = {}
@@ -20,7 +25,7 @@ original_forecast = st.session_state.get("forecast_df")
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page before using action planning.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page before using action planning.")
     st.stop()
 # Only stop if action_plan is not a dict (allow empty dict)
@@ -29,35 +34,73 @@ if not isinstance(action_plan, dict):
     st.stop()
 
 st.write(f"Action planning for **{company_info['name']}**")
-df = pd.DataFrame(emission_sources)
+by_type = sources.by_type
+source_types = list(by_type.index.astype(str))
+base = by_type.to_numpy()
+custom_costs = st.session_state.get("custom_costs", {})
+cost_per_ton = np.array([custom_costs.get(s, DEFAULT_COST_PER_TON.get(s, FALLBACK_COST_PER_TON)) for s in source_types], dtype=float)
 
 years = st.slider("Plan for how many years?", min_value=1, max_value=30, value=10)
 
+# The plan is one sources x years table; keep it across reruns and resize it with the slider
+table = action_plan.get("table")
+if table is None or list(table.index) != source_types or table.shape[1] != years:
+    resized = plan_frame(np.zeros((len(source_types), years)), source_types, years)
+    if table is not None:
+        resized.update(table.reindex(index=resized.index, columns=resized.columns))
+    action_plan["table"] = resized
+    action_plan["revision"] = action_plan.get("revision", 0) + 1
+
+# --- Upload Action Plan ---
+st.write("### Upload Action Plan (CSV)")
+st.caption("Columns: year, description, target (e.g. '5% reduction'), optionally source. Actions keep their cut in later years.")
+uploaded = st.file_uploader("Choose an action plan CSV", type=["csv"])
+if uploaded is not None and st.button("Apply Uploaded Plan"):
+    try:
+        action_plan["table"] = plan_frame(parse_action_plan(pd.read_csv(uploaded), source_types, years), source_types, years)
+        action_plan["revision"] += 1
+        st.success("Action plan loaded from file.")
+    except Exception as e:
+        st.error(f"Could not read action plan: {e}")
+
+# --- Cheapest Plan for a Target ---
+st.write("### Cheapest Plan for a Target Pathway")
+try:
+    scenario_targets = load_scenario_targets()
+except Exception:
+    scenario_targets = {}
+scenario = st.selectbox("Target scenario", ["Custom"] + list(scenario_targets))
+default_pct, default_year = scenario_targets.get(scenario, (30.0, None))
+col1, col2 = st.columns(2)
+with col1:
+    target_pct = st.number_input("Target reduction (%)", min_value=0.0, max_value=100.0, value=float(default_pct), step=1.0)
+with col2:
+    last_year = int(plan_years(years)[-1])
+    target_year = st.number_input("Reach target by", min_value=int(plan_years(years)[0]), max_value=last_year,
+                                  value=min(default_year or last_year, last_year), step=1)
+if st.button("Solve Cheapest Plan"):
+    required = target_pathway(target_pct, target_year, years)
+    matrix, feasible = cheapest_plan(base, cost_per_ton, required)
+    action_plan["table"] = plan_frame(matrix, source_types, years)
+    action_plan["revision"] += 1
+    if not feasible.all():
+        st.warning("The target cannot be met in some years even with every source fully cut.")
+    st.success(f"Cheapest plan for a {target_pct:.0f}% cut by {int(target_year)} applied; edit it below if needed.")
+
 # --- Action Planning Table ---
-st.write("### Specify Planned Reductions (%) for Each Source and Year")
-reduction_plan = {}
-for idx, row in df.iterrows():
-    source = row['type']
-    reduction_plan[source] = []
-    for year in range(years):
-        col = st.number_input(f"{source} - Year {year+1} reduction (%)", min_value=0.0, max_value=100.0, value=0.0, step=1.0, key=f"{source}_{year}")
-        reduction_plan[source].append(col)
+st.write("### Planned Reductions (%) for Each Source and Year")
+edited = st.data_editor(
+    action_plan["table"],
+    use_container_width=True,
+    column_config={c: st.column_config.NumberColumn(c, min_value=0.0, max_value=100.0, step=1.0, format="%.1f")
+                   for c in action_plan["table"].columns},
+    # A new key per replaced table, so stale cell edits are not replayed onto it
+    key=f"action_plan_editor_{action_plan['revision']}"
+)
+action_plan["table"] = edited
 
 # --- Calculate Action Plan Emissions ---
-base_emissions = {row['type']: row['emission'] for _, row in df.iterrows()}
-action_emissions = []
-for year in range(years):
-    total = 0
-    for source in base_emissions:
-        reduction = reduction_plan[source][year]
-        reduced = base_emissions[source] * (1 - reduction/100)
-        total += reduced
-    action_emissions.append(total)
-
-# --- Forecast with Action Plan ---
-model = load_model()
-action_forecast = forecast_emissions(model, action_emissions[0], years)
-action_forecast['Emission'] = action_emissions  # override with planned values
+action_forecast = plan_summary(base, edited.to_numpy(), cost_per_ton)
 
 # --- Plot Comparison ---
 st.write("### Forecast Comparison: Baseline vs. Action Plan")
@@ -71,5 +114,7 @@ ax.set_title(f"Emission Forecast Comparison for {company_info['name']}")
 ax.legend()
 st.pyplot(fig, use_container_width=True)
 
+st.write(f"**Cumulative reduction:** {action_forecast['Cumulative Reduced'].iloc[-1]:,.1f} tons CO₂e "
+         f"for **${action_forecast['Cumulative Cost'].iloc[-1]:,.0f}**")
 st.write("### Action Plan Data")
-st.dataframe(action_forecast, use_container_width=True) 
\ No newline at end of file
+st.dataframe(action_forecast, use_container_width=True)
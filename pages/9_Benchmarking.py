@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
+from utils.emission_sources import get_emission_sources
 
 def get_sector_benchmarks(sector):
     # Example hardcoded benchmarks (tons CO2e/year)
@@ -20,19 +21,19 @@ if "logged_in_user" not in st.session_state or st.session_state["logged_in_user"
     st.stop()
 
 company_info = st.session_state.get("company_info")
-emission_sources = st.session_state.get("emission_sources", [])
+sources = get_emission_sources()
 
 if not company_info or not isinstance(company_info, dict):
     st.warning("Please fill out your company profile on the 'Company Profile' page before benchmarking.")
     st.stop()
-if not emission_sources or not isinstance(emission_sources, list) or not all(isinstance(x, dict) for x in emission_sources):
+if not sources.valid:
     st.warning("Please add valid emission sources on the 'Company Profile' page before benchmarking.")
     st.stop()
 
 sector = company_info["sector"]
 benchmarks = get_sector_benchmarks(sector)
 
-total_emissions = sum([src["emission"] for src in emission_sources])
+total_emissions = sources.total
 
 st.write(f"**Your sector:** {sector}")
 st.write(f"**Your total annual emissions:** {total_emissions:.1f} tons CO₂e")
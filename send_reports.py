@@ -1,61 +1,60 @@
-import os
+import argparse
 import json
-from fpdf import FPDF
-import smtplib
-from email.message import EmailMessage
+import os
+from utils.storage import get_store
+from utils.report_pipeline import REPORT_MANIFEST_FILE, SMTPPool, load_manifest, run_report_pipeline, save_manifest
 
-# --- Config ---
-SMTP_SERVER = 'smtp.gmail.com'
-SMTP_PORT = 587
-EMAIL_USER = 'your_email@gmail.com'  # Replace with your email
-EMAIL_PASS = 'your_app_password'      # Use an app password, not your main password
+# --- Config (environment overrides the demo defaults) ---
+SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+EMAIL_USER = os.environ.get('EMAIL_USER', 'your_email@gmail.com')  # Replace with your email
+EMAIL_PASS = os.environ.get('EMAIL_PASS', 'your_app_password')      # Use an app password, not your main password
 
 # --- Load user emails and company data (mock/demo) ---
 USERS_FILE = 'user_emails.json'  # {"username": {"email": ..., "company": ...}}
-COMPANIES_FILE = 'api_emission_data.json'  # {"company": [emission_sources]}
 
-with open(USERS_FILE, 'r') as f:
-    users = json.load(f)
-with open(COMPANIES_FILE, 'r') as f:
-    companies = json.load(f)
+def main():
+    parser = argparse.ArgumentParser(description="Render and email CO2 emission reports to every user.")
+    parser.add_argument("--users-file", default=USERS_FILE)
+    parser.add_argument("--smtp-host", default=SMTP_SERVER)
+    parser.add_argument("--smtp-port", type=int, default=SMTP_PORT)
+    parser.add_argument("--no-tls", action="store_true", help="Skip STARTTLS (local test servers)")
+    parser.add_argument("--no-login", action="store_true", help="Skip SMTP authentication (local test servers)")
+    parser.add_argument("--connections", type=int, default=4, help="Persistent SMTP connections")
+    parser.add_argument("--render-workers", type=int, default=None, help="PDF render processes (default: all cores)")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per message on transient SMTP errors")
+    parser.add_argument("--manifest", default=REPORT_MANIFEST_FILE, help="Record of the report content last sent to each user")
+    parser.add_argument("--force", action="store_true", help="Send every report, even if unchanged since the last run")
+    args = parser.parse_args()
 
-def generate_pdf_report(company, emission_sources):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=14)
-    pdf.cell(0, 10, f"CO₂ Emission Report: {company}", ln=True, align='C')
-    pdf.ln(5)
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 10, "Emission Sources:", ln=True)
-    pdf.set_font("Arial", size=10)
-    for src in emission_sources:
-        pdf.cell(0, 8, f"- {src['type']}: {src['emission']} tons CO₂e", ln=True)
-    pdf.ln(5)
-    return pdf
+    # Local stand-in, e.g.: python -m aiosmtpd -n -l localhost:1025
+    #   python send_reports.py --smtp-host localhost --smtp-port 1025 --no-tls --no-login
+    with open(args.users_file, 'r') as f:
+        users = json.load(f)
+    companies = get_store().all_companies()  # {"company": [emission_sources]}
 
-def send_email(to_email, subject, body, attachment_path):
-    msg = EmailMessage()
-    msg['Subject'] = subject
-    msg['From'] = EMAIL_USER
-    msg['To'] = to_email
-    msg.set_content(body)
-    with open(attachment_path, 'rb') as f:
-        msg.add_attachment(f.read(), maintype='application', subtype='pdf', filename=os.path.basename(attachment_path))
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASS)
-        server.send_message(msg)
+    pool = SMTPPool(
+        args.smtp_host, args.smtp_port,
+        username=None if args.no_login else EMAIL_USER,
+        password=EMAIL_PASS,
+        starttls=not args.no_tls,
+        retries=args.retries
+    )
+    # Only changed companies (or new recipients) are rendered and sent; --force resends
+    # everything but still merges into the manifest, keeping history for other recipients
+    manifest = load_manifest(args.manifest)
+    try:
+        stats = run_report_pipeline(users, companies, pool, EMAIL_USER, render_workers=args.render_workers,
+                                    connections=args.connections, manifest=manifest, force=args.force)
+    finally:
+        save_manifest(manifest, args.manifest)
+    timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stats["timings"].items())
+    print(f"✅ Sent {stats['sent']}/{stats['reports']} reports in {stats['total_seconds']:.2f}s ({timings})")
+    print(f"   {stats['renders']} PDFs rendered, {stats['skipped_unchanged']} unchanged reports skipped")
+    print(f"   {stats['renders_per_sec']:.1f} renders/s, {stats['emails_per_sec']:.1f} emails/s, "
+          f"{stats['smtp_connections']} SMTP connections, {stats['smtp_retries']} retries")
+    if stats["failed"]:
+        print(f"❌ {len(stats['failed'])} deliveries failed")
 
-# --- Main: Generate and send reports ---
-for username, info in users.items():
-    email = info['email']
-    company = info['company']
-    emission_sources = companies.get(company, [])
-    if not emission_sources:
-        continue
-    pdf = generate_pdf_report(company, emission_sources)
-    pdf_path = f"report_{company}.pdf"
-    pdf.output(pdf_path)
-    send_email(email, f"CO₂ Emission Report for {company}", f"Attached is your latest CO₂ emission report for {company}.", pdf_path)
-    print(f"Sent report to {email} for {company}")
-    os.remove(pdf_path) 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
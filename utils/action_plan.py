@@ -0,0 +1,140 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from utils.forecasting import START_YEAR
+
+SCENARIO_FILE = "scenario_sample.csv"
+ACTION_PLAN_FILE = "action_plan_sample.csv"
+
+_PERCENT = re.compile(r"(-?\d+(?:\.\d+)?)\s*%?")
+_BY_YEAR = re.compile(r"\bby\s+(\d{4})\b", re.IGNORECASE)
+
+
+# --------------------------------
+# Plan Matrix
+# --------------------------------
+def plan_years(years, start_year=START_YEAR):
+    return np.arange(start_year, start_year + years)
+
+
+def plan_frame(matrix, source_types, years, start_year=START_YEAR):
+    """Sources x years reductions (%) as an editable DataFrame."""
+    return pd.DataFrame(np.asarray(matrix, dtype=float), index=pd.Index(source_types, name="Source"),
+                        columns=[str(y) for y in plan_years(years, start_year)])
+
+
+def plan_summary(base, plan_pct, cost_per_ton, start_year=START_YEAR):
+    """Yearly totals for a sources x years plan of % cuts from `base` emissions.
+
+    Returns a frame with Year, Emission, Reduced, Cumulative Reduced, Cost
+    and Cumulative Cost, where cost is tons abated times cost per ton.
+    """
+    base = np.nan_to_num(np.asarray(base, dtype=float), nan=0.0)
+    plan_pct = np.clip(np.nan_to_num(np.asarray(plan_pct, dtype=float), nan=0.0), 0.0, 100.0)
+    reduced = base[:, None] * plan_pct / 100
+    cost = (reduced * np.asarray(cost_per_ton, dtype=float)[:, None]).sum(axis=0)
+    reduced_total = reduced.sum(axis=0)
+    return pd.DataFrame({
+        "Year": plan_years(plan_pct.shape[1], start_year),
+        "Emission": base.sum() - reduced_total,
+        "Reduced": reduced_total,
+        "Cumulative Reduced": reduced_total.cumsum(),
+        "Cost": cost,
+        "Cumulative Cost": cost.cumsum(),
+    })
+
+
+# --------------------------------
+# Target Pathways
+# --------------------------------
+def load_scenario_targets(path=SCENARIO_FILE):
+    """Scenarios from a scenario_sample.csv-style file as {name: (pct, target_year or None)}."""
+    targets = {}
+    for row in pd.read_csv(path, skipinitialspace=True).itertuples(index=False):
+        match = _BY_YEAR.search(str(row.description))
+        targets[str(row.name).strip()] = (float(row.parameter), int(match.group(1)) if match else None)
+    return targets
+
+
+def target_pathway(target_pct, target_year, years, start_year=START_YEAR):
+    """Required % cut per year: a straight line from 0 to `target_pct` in `target_year`, then held.
+
+    A target year at or before the first plan year applies the full cut
+    from the start; None means the last plan year.
+    """
+    plan = plan_years(years, start_year)
+    if target_year is None:
+        target_year = plan[-1]
+    if target_year <= start_year:
+        return np.full(years, float(target_pct))
+    return np.clip((plan - start_year + 1) / (target_year - start_year + 1), 0.0, 1.0) * target_pct
+
+
+def cheapest_plan(base, cost_per_ton, required_pct, min_pct=0, max_pct=100):
+    """Least-cost sources x years plan whose total cut meets `required_pct` each year.
+
+    Cost is linear in tons, so each year is a fractional knapsack: mandatory
+    minimum cuts first, then headroom cheapest-first until the required tons
+    are met. All years are solved at once by broadcasting over the sorted
+    cumulative capacity. Returns (plan_pct, feasible) with a per-year
+    feasibility mask; short years get every source at its maximum.
+    """
+    base = np.nan_to_num(np.asarray(base, dtype=float), nan=0.0).clip(min=0.0)
+    costs = np.broadcast_to(np.asarray(cost_per_ton, dtype=float), base.shape)
+    lo = np.broadcast_to(np.asarray(min_pct, dtype=float), base.shape).clip(0.0, 100.0)
+    hi = np.maximum(np.broadcast_to(np.asarray(max_pct, dtype=float), base.shape).clip(0.0, 100.0), lo)
+    required = base.sum() * np.asarray(required_pct, dtype=float) / 100
+
+    order = np.argsort(costs, kind="stable")
+    headroom = (base * (hi - lo) / 100)[order]
+    before = np.concatenate([[0.0], headroom.cumsum()[:-1]])
+    still_needed = np.clip(required - (base * lo / 100).sum(), 0.0, None)
+    # (years, sources) tons taken from each source's headroom
+    taken = np.clip(still_needed[:, None] - before[None, :], 0.0, headroom[None, :])
+    extra = np.empty((base.size, required.size))
+    extra[order] = taken.T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        extra_pct = np.where(base[:, None] > 0, extra / base[:, None] * 100, 0.0)
+    feasible = still_needed <= headroom.sum() * (1 + 1e-12)
+    return lo[:, None] + extra_pct, feasible
+
+
+# --------------------------------
+# Plan Upload
+# --------------------------------
+def _parse_percent(value):
+    match = _PERCENT.search(str(value))
+    return float(match.group(1)) if match else 0.0
+
+
+def parse_action_plan(actions, source_types, years, start_year=START_YEAR):
+    """Sources x years matrix from an action_plan_sample.csv-style table.
+
+    Each row is an action (`year`, `description`, `target` such as "5%
+    reduction") that takes effect in its year and keeps its cut afterwards,
+    so a year's reduction is the sum of all earlier actions, capped at 100%.
+    An optional `source`/`type` column limits an action to one source type;
+    otherwise it applies to every source.
+    """
+    actions = actions.rename(columns=lambda c: str(c).strip().lower())
+    if "year" not in actions.columns or "target" not in actions.columns:
+        raise ValueError("Action plan needs 'year' and 'target' columns.")
+    source_col = next((c for c in ("source", "type") if c in actions.columns), None)
+    plan = plan_years(years, start_year)
+    index = {str(s): i for i, s in enumerate(source_types)}
+    effect = np.zeros((len(source_types), years))
+    year_idx = np.searchsorted(plan, pd.to_numeric(actions["year"], errors="coerce").to_numpy())
+    pct = actions["target"].map(_parse_percent).to_numpy(dtype=float)
+    for row, (y, p) in enumerate(zip(year_idx, pct)):
+        if y >= years:
+            continue
+        if source_col and pd.notna(actions[source_col].iloc[row]):
+            target = index.get(str(actions[source_col].iloc[row]).strip())
+            if target is None:
+                continue
+            effect[target, y] += p
+        else:
+            effect[:, y] += p
+    return np.clip(effect.cumsum(axis=1), 0.0, 100.0)
@@ -0,0 +1,439 @@
+import asyncio
+import hashlib
+import json
+
+from utils.change_feed import change_feed_for
+from utils.forecast_cache import ForecastCache
+from utils.forecasting import START_YEAR, forecast_portfolio, model_features
+from utils.micro_batch import MicroBatcher
+from utils.utils import forecast_emissions, load_model, manual_predict_batch
+from utils.validation import validate_emission_batch, validate_emission_sources
+
+# Upper bound on updates accepted in one bulk request
+BULK_MAX_ITEMS = 50_000
+# Upper bound on rows accepted in one /predict request
+PREDICT_MAX_ROWS = 10_000
+# Upper bound on entities accepted in one /forecast_portfolio request
+PORTFOLIO_MAX_ENTITIES = 1_000
+# Upper bound on base_emissions series accepted in one /forecast request
+FORECAST_MAX_SERIES = 1_000
+# Longest /changes long-poll, and the idle interval between SSE keep-alives
+CHANGES_MAX_WAIT = 60
+SSE_HEARTBEAT = 15
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl")
+
+
+def parse_json(raw):
+    """Decoded JSON body, or None when it is empty or malformed."""
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class RawResponse:
+    """Pre-serialized JSON body plus response headers, returned instead of a payload dict."""
+
+    def __init__(self, body, headers):
+        self.body = body
+        self.headers = headers
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check using the weak comparison RFC 9110 requires for it."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def sse_event(event, data, event_id=None):
+    """One server-sent-events frame."""
+    frame = f"id: {event_id}\n" if event_id is not None else ""
+    return frame + f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def wants_event_stream(args, accept):
+    return query_flag(args, "stream") or "text/event-stream" in (accept or "")
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def query_flag(args, name):
+    return str(args.get(name, "")).lower() in ("1", "true", "yes")
+
+
+def parse_bulk_body(mimetype, raw, args):
+    """Updates from an NDJSON body or a JSON array / {"updates": [...]} body.
+
+    Returns (credentials, updates); NDJSON lines that fail to parse are kept
+    as error strings so they are reported per item.
+    """
+    credentials = {"username": args.get("username"), "api_key": args.get("api_key")}
+    if isinstance(raw, bytes):
+        raw = raw.decode("utf-8")
+    if mimetype in NDJSON_MIMETYPES:
+        updates = []
+        for line in raw.splitlines():
+            if line.strip():
+                try:
+                    updates.append(json.loads(line))
+                except ValueError as e:
+                    updates.append(f"Invalid JSON: {e}")
+        return credentials, updates
+    body = parse_json(raw)
+    if isinstance(body, dict):
+        credentials = {k: body.get(k) or credentials[k] for k in credentials}
+        body = body.get("updates")
+    return credentials, body
+
+
+# --------------------------------
+# Framework-neutral API Handlers
+# --------------------------------
+class EmissionAPI:
+    """Request logic shared by the Flask server and the ASGI app.
+
+    Every handler takes already-decoded request data and returns a
+    (payload, status) pair; the web layer only parses and serializes.
+    Handlers block on storage and model work, so async servers must run them
+    in a worker pool.
+    """
+
+    def __init__(self, store, api_keys, batch_wait=0.005, max_batch=256, body_cache_size=4096):
+        self.store = store
+        self.api_keys = api_keys
+        # Serialized /get_emissions bodies keyed by (company, store version);
+        # an update bumps the version, so stale bodies are never served
+        self.body_cache = ForecastCache(maxsize=body_cache_size, ttl=float("inf"))
+        self.not_modified = 0
+        # Updates for /changes subscribers; read from the store's log when it is shared between processes
+        self.feed = change_feed_for(store)
+        # Concurrent /predict rows share one model.predict call
+        self.batcher = MicroBatcher(
+            lambda rows: manual_predict_batch(load_model(), rows), max_batch=max_batch, max_wait=batch_wait
+        )
+
+    def _authenticate(self, req):
+        if not req:
+            return {"error": "Missing JSON body"}, 400
+        if not req.get("username") or not req.get("api_key"):
+            return {"error": "Missing username or api_key"}, 400
+        if not self.api_keys.verify(req["username"], req["api_key"]):
+            return {"error": "Invalid API key for user"}, 403
+        return None
+
+    def update_emissions(self, req):
+        if not req:
+            return {"error": "Missing JSON body"}, 400
+        username = req.get("username")
+        api_key = req.get("api_key")
+        company = req.get("company")
+        emission_sources = req.get("emission_sources")
+        if not username or not api_key or not company or not emission_sources:
+            return {"error": "Missing username, api_key, company, or emission_sources"}, 400
+        if not self.api_keys.verify(username, api_key):
+            return {"error": "Invalid API key for user"}, 403
+        # Data validation
+        valid, err = validate_emission_sources(emission_sources)
+        if not valid:
+            return {"error": f"Invalid emission_sources: {err}"}, 400
+        # Upsert and log entry are committed together
+        self.store.update(username, company, emission_sources)
+        self.feed.publish(username, company, emission_sources)
+        return {"status": "success", "company": company, "emission_sources": emission_sources}, 200
+
+    def update_emissions_bulk(self, credentials, updates, atomic=False):
+        username, api_key = credentials["username"], credentials["api_key"]
+        if not username or not api_key:
+            return {"error": "Missing username or api_key"}, 400
+        if not self.api_keys.verify(username, api_key):
+            return {"error": "Invalid API key for user"}, 403
+        if not isinstance(updates, list) or not updates:
+            return {"error": 'Body must be NDJSON, a JSON array or {"updates": [...]} with at least one update'}, 400
+        if len(updates) > BULK_MAX_ITEMS:
+            return {"error": f"At most {BULK_MAX_ITEMS} updates per request"}, 413
+        # Item-level checks first, then one validation pass over every source list
+        errors = []
+        for item in updates:
+            if isinstance(item, str):
+                errors.append(item)
+            elif not isinstance(item, dict):
+                errors.append("Update is not an object.")
+            elif not item.get("company") or not item.get("emission_sources"):
+                errors.append("Missing company or emission_sources.")
+            else:
+                errors.append(None)
+        ok = [i for i, err in enumerate(errors) if err is None]
+        for i, err in zip(ok, validate_emission_batch([updates[i]["emission_sources"] for i in ok])):
+            if err is not None:
+                errors[i] = f"Invalid emission_sources: {err}"
+        accepted = [i for i, err in enumerate(errors) if err is None]
+        if accepted and not (atomic and len(accepted) < len(updates)):
+            # All valid updates and their log entries are committed together
+            self.store.update_many(username, [(updates[i]["company"], updates[i]["emission_sources"]) for i in accepted])
+            for i in accepted:
+                self.feed.publish(username, updates[i]["company"], updates[i]["emission_sources"])
+        else:
+            accepted = []
+        committed = set(accepted)
+        results = []
+        for i, (item, err) in enumerate(zip(updates, errors)):
+            result = {"index": i, "company": item.get("company") if isinstance(item, dict) else None}
+            if i in committed:
+                result["status"] = "ok"
+            else:
+                result["status"] = "error"
+                result["error"] = err or "Not committed: batch contains invalid updates (atomic=true)."
+            results.append(result)
+        status = "success" if len(committed) == len(updates) else ("partial" if committed else "failed")
+        return {
+            "status": status,
+            "accepted": len(committed),
+            "rejected": len(updates) - len(committed),
+            "results": results
+        }, (200 if committed else 400)
+
+    def get_emissions(self, args, if_none_match=None):
+        """Company sources as a cached body with a strong ETag; 304 when the client copy is current."""
+        username = args.get("username")
+        api_key = args.get("api_key")
+        company = args.get("company")
+        if not username or not api_key or not company:
+            return {"error": "Missing username, api_key, or company"}, 400
+        if not self.api_keys.verify(username, api_key):
+            return {"error": "Invalid API key for user"}, 403
+        version = self.store.company_version(company)
+        key = None if version is None else json.dumps([company, version])
+        cached = None if key is None else self.body_cache.get(key)
+        if cached is None:
+            emission_sources = self.store.get_company(company)
+            if emission_sources is None:
+                return {"error": "Company not found"}, 404
+            body = json.dumps({"company": company, "emission_sources": emission_sources}, separators=(",", ":")).encode("utf-8")
+            cached = (body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+            if key is not None:
+                self.body_cache.set(key, cached)
+        body, etag = cached
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return RawResponse(b"", headers), 304
+        return RawResponse(body, headers), 200
+
+    def changes_query(self, args, last_event_id=None):
+        """Authenticate and parse a /changes request -> (query, None) or (None, error).
+
+        The position comes from `since`/`epoch` or an SSE Last-Event-ID of the
+        form "<epoch>:<seq>".
+        """
+        username = args.get("username")
+        api_key = args.get("api_key")
+        if not username or not api_key:
+            return None, ({"error": "Missing username or api_key"}, 400)
+        if not self.api_keys.verify(username, api_key):
+            return None, ({"error": "Invalid API key for user"}, 403)
+        epoch, since = args.get("epoch"), args.get("since", 0)
+        if last_event_id and "since" not in args:
+            epoch, _, since = last_event_id.rpartition(":")
+        try:
+            query = {
+                "since": int(since),
+                "epoch": epoch or None,
+                "timeout": min(max(float(args.get("timeout", 0)), 0.0), CHANGES_MAX_WAIT),
+                "limit": min(max(int(args.get("limit", 1000)), 1), 10_000),
+            }
+        except ValueError:
+            return None, ({"error": "since and limit must be integers and timeout a number"}, 400)
+        return query, None
+
+    def changes(self, args, last_event_id=None):
+        """Changes after `since`; long-polls up to `timeout` seconds when there are none."""
+        query, error = self.changes_query(args, last_event_id)
+        if error:
+            return error
+        result = self.feed.read(query["since"], query["epoch"], query["limit"])
+        if query["timeout"] and not result["reset"] and not result["changes"]:
+            self.feed.wait(query["since"], query["timeout"])
+            result = self.feed.read(query["since"], query["epoch"], query["limit"])
+        return result, 200
+
+    def _feed_frames(self, state):
+        """SSE frames for everything after state["since"]; advances `state`."""
+        result = self.feed.read(state["since"], state["epoch"], state["limit"])
+        epoch = result["epoch"]
+        frames = []
+        if result["reset"]:
+            frames.append(sse_event("reset", {"epoch": epoch, "last_seq": result["last_seq"]}, f"{epoch}:{result['last_seq']}"))
+            state["since"] = result["last_seq"]
+        for change in result["changes"]:
+            frames.append(sse_event("change", change, f"{epoch}:{change['seq']}"))
+            state["since"] = change["seq"]
+        state["epoch"] = epoch
+        return "".join(frames)
+
+    def stream_changes(self, query):
+        """Server-sent events for a thread-per-connection server."""
+        state = dict(query)
+        yield "retry: 3000\n\n"
+        while True:
+            frames = self._feed_frames(state)
+            if frames:
+                yield frames
+                continue
+            if not self.feed.wait(state["since"], SSE_HEARTBEAT):
+                yield ": keep-alive\n\n"
+
+    async def stream_changes_async(self, query):
+        """Server-sent events for an asyncio server; idle streams hold no thread."""
+        state = dict(query)
+        yield "retry: 3000\n\n"
+        loop = asyncio.get_running_loop()
+        while True:
+            frames = await loop.run_in_executor(None, self._feed_frames, state)
+            if frames:
+                yield frames
+                continue
+            if not await self.feed.wait_async(state["since"], SSE_HEARTBEAT):
+                yield ": keep-alive\n\n"
+
+    def forecast_portfolio(self, req):
+        if not req:
+            return {"error": "Missing JSON body"}, 400
+        username = req.get("username")
+        api_key = req.get("api_key")
+        entities = req.get("entities")
+        years = req.get("years", 10)
+        if not username or not api_key or not entities:
+            return {"error": "Missing username, api_key, or entities"}, 400
+        if not self.api_keys.verify(username, api_key):
+            return {"error": "Invalid API key for user"}, 403
+        start_year = req.get("start_year", START_YEAR)
+        if not isinstance(entities, list) or not _is_int(years) or not 1 <= years <= 100:
+            return {"error": "entities must be a list and years an integer between 1 and 100"}, 400
+        if not _is_int(start_year):
+            return {"error": "start_year must be an integer"}, 400
+        if len(entities) > PORTFOLIO_MAX_ENTITIES:
+            return {"error": f"At most {PORTFOLIO_MAX_ENTITIES} entities per request"}, 413
+        # Entities may reference a stored company instead of giving a total
+        resolved = []
+        for idx, entity in enumerate(entities):
+            if not isinstance(entity, dict):
+                return {"error": f"Entity at index {idx} is not a dict."}, 400
+            entity = dict(entity)
+            if "emissions" not in entity and "company" in entity:
+                emission_sources = self.store.get_company(entity["company"])
+                if emission_sources is None:
+                    return {"error": f"Company not found: {entity['company']}"}, 404
+                entity.setdefault("entity", entity["company"])
+                entity["emissions"] = sum(src["emission"] for src in emission_sources)
+            if not isinstance(entity.get("emissions"), (int, float)):
+                return {"error": f"Missing or non-numeric emissions for entity at index {idx}."}, 400
+            resolved.append(entity)
+        try:
+            # In-process: request handlers run on worker threads, which must not start process pools
+            forecast = forecast_portfolio(resolved, years, start_year=start_year, n_jobs=1)
+        except (ValueError, TypeError) as e:
+            return {"error": str(e)}, 400
+        return {"years": years, "forecast": forecast.to_dict("records")}, 200
+
+    def submit_predict(self, req):
+        """Validate a /predict body and queue its rows on the micro-batcher.
+
+        The body carries one `features` dict or a `rows` list of them. Returns
+        (futures, None), or (None, (payload, status)) when the request is
+        rejected.
+        """
+        error = self._authenticate(req)
+        if error:
+            return None, error
+        rows = req.get("rows", [req.get("features")] if "features" in req else None)
+        if not isinstance(rows, list) or not rows:
+            return None, ({"error": "Provide a features object or a non-empty rows list"}, 400)
+        if len(rows) > PREDICT_MAX_ROWS:
+            return None, ({"error": f"At most {PREDICT_MAX_ROWS} rows per request"}, 413)
+        features = model_features(load_model())
+        inputs = []
+        for idx, row in enumerate(rows):
+            if not isinstance(row, dict):
+                return None, ({"error": f"Row at index {idx} is not a dict."}, 400)
+            missing = [f for f in features if f not in row]
+            if missing:
+                return None, ({"error": f"Row at index {idx} is missing features: {missing}"}, 400)
+            if not all(isinstance(row[f], (int, float)) for f in features):
+                return None, ({"error": f"Row at index {idx} has non-numeric feature values."}, 400)
+            inputs.append({f: float(row[f]) for f in features})
+        return [self.batcher.submit(row) for row in inputs], None
+
+    def prediction_payload(self, req, values):
+        values = [float(v) for v in values]
+        if "rows" in req:
+            return {"predictions": values}, 200
+        return {"prediction": values[0]}, 200
+
+    @staticmethod
+    def prediction_error(exc):
+        """Response for an exception raised by the batcher or model."""
+        if isinstance(exc, (ValueError, TypeError)):
+            return {"error": f"Prediction failed: {exc}"}, 400
+        return {"error": "Prediction failed: internal error"}, 500
+
+    def predict(self, req):
+        futures, error = self.submit_predict(req)
+        if error:
+            return error
+        try:
+            values = [future.result() for future in futures]
+        except Exception as e:
+            return self.prediction_error(e)
+        return self.prediction_payload(req, values)
+
+    def forecast(self, req):
+        error = self._authenticate(req)
+        if error:
+            return error
+        base_emissions = req.get("base_emissions")
+        years = req.get("years", 10)
+        start_year = req.get("start_year", START_YEAR)
+        valid_base = isinstance(base_emissions, (int, float, str)) or (
+            isinstance(base_emissions, list) and base_emissions
+            and all(isinstance(v, (int, float)) for v in base_emissions)
+        )
+        if not valid_base:
+            return {"error": "base_emissions must be a number, a list of numbers or a country code"}, 400
+        if isinstance(base_emissions, list) and len(base_emissions) > FORECAST_MAX_SERIES:
+            return {"error": f"At most {FORECAST_MAX_SERIES} base_emissions values per request"}, 400
+        if not _is_int(years) or not 1 <= years <= 100:
+            return {"error": "years must be an integer between 1 and 100"}, 400
+        if not _is_int(start_year):
+            return {"error": "start_year must be an integer"}, 400
+        try:
+            forecast = forecast_emissions(
+                load_model(), base_emissions, years,
+                start_year=start_year,
+                base_features=req.get("base_features"),
+                growth_rates=req.get("growth_rates")
+            )
+        except (TypeError, ValueError) as e:
+            return {"error": str(e)}, 400
+        return {"years": years, "forecast": forecast.to_dict("records")}, 200
+
+    def metrics(self, args):
+        """Cache and batcher counters; they describe other users' traffic, so a valid key is required."""
+        username = args.get("username")
+        api_key = args.get("api_key")
+        if not username or not api_key:
+            return {"error": "Missing username or api_key"}, 400
+        if not self.api_keys.verify(username, api_key):
+            return {"error": "Invalid API key for user"}, 403
+        return {
+            "api_key_cache": self.api_keys.metrics(),
+            "micro_batcher": self.batcher.stats(),
+            "response_cache": dict(self.body_cache.stats(), not_modified=self.not_modified),
+            "change_feed": self.feed.stats(),
+        }, 200
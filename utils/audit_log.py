@@ -0,0 +1,229 @@
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+AUDIT_LOG_FILE = "api_log.jsonl"
+INDEX_SUFFIX = ".idx"
+
+
+class _FileLock:
+    """Thread lock plus an advisory flock on `path` where the OS supports it."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+        return False
+
+
+class _SegmentIndex:
+    """Columnar view of one segment's sidecar index."""
+
+    def __init__(self):
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.timestamps = np.empty(0, dtype=object)
+        self.usernames = np.empty(0, dtype=object)
+        self.companies = np.empty(0, dtype=object)
+        self.read_to = 0
+        self.inode = None
+
+    def extend(self, rows):
+        if not rows:
+            return
+        offsets, timestamps, usernames, companies = zip(*rows)
+        self.offsets = np.concatenate([self.offsets, np.asarray(offsets, dtype=np.int64)])
+        self.timestamps = np.concatenate([self.timestamps, np.asarray(timestamps, dtype=object)])
+        self.usernames = np.concatenate([self.usernames, np.asarray(usernames, dtype=object)])
+        self.companies = np.concatenate([self.companies, np.asarray(companies, dtype=object)])
+
+    def mask(self, username=None, company=None, since=None, until=None):
+        keep = np.ones(len(self.offsets), dtype=bool)
+        if username is not None:
+            keep &= self.usernames == username
+        if company is not None:
+            keep &= self.companies == company
+        if since is not None:
+            keep &= self.timestamps >= since
+        if until is not None:
+            keep &= self.timestamps < until
+        return keep
+
+
+# --------------------------------
+# Append-only JSON-lines Audit Log
+# --------------------------------
+class AuditLog:
+    """Append-only JSON-lines log with rotation and a sidecar index.
+
+    Each entry is one line in the active segment (`path`); a sidecar
+    `<segment>.idx` records its byte offset, timestamp, username and company.
+    Queries filter the small index columns and only seek to and parse the
+    matching entries. The active segment is rotated when it exceeds
+    `max_bytes` or its first entry is older than `max_age` seconds; rotated
+    segments are gzip-compressed when `compress` is set.
+    """
+
+    def __init__(self, path=AUDIT_LOG_FILE, max_bytes=64 * 1024 * 1024, max_age=None, compress=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compress = compress
+        self._lock = _FileLock(path + ".lock")
+        self._indexes = {}
+
+    # ---- segments ----
+    def _segment_pattern(self):
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.*{ext}*"
+
+    def segments(self):
+        """Rotated segments oldest first, then the active segment."""
+        rotated = sorted(
+            p for p in glob.glob(self._segment_pattern())
+            if not p.endswith((INDEX_SUFFIX, ".lock", ".tmp")) and p != self.path
+        )
+        return rotated + ([self.path] if os.path.exists(self.path) else [])
+
+    def _index_path(self, segment):
+        if segment.endswith(".gz"):
+            segment = segment[:-3]
+        return segment + INDEX_SUFFIX
+
+    def _should_rotate(self):
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return False
+        if size >= self.max_bytes:
+            return True
+        if self.max_age is not None and size > 0:
+            timestamps = self._index(self.path).timestamps
+            if len(timestamps):
+                started = datetime.fromisoformat(timestamps[0])
+                return (datetime.utcnow() - started).total_seconds() >= self.max_age
+        return False
+
+    def _rotate(self):
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        rotated = f"{root}.{stamp}{ext}"
+        os.replace(self._index_path(self.path), self._index_path(rotated))
+        os.replace(self.path, rotated)
+        self._indexes.pop(self.path, None)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(rotated + ".gz.tmp", rotated + ".gz")
+            os.remove(rotated)
+
+    # ---- writing ----
+    def append(self, entry):
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Append several entries with one lock acquisition and one write per file."""
+        if not entries:
+            return
+        lines = [(json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8") for entry in entries]
+        with self._lock:
+            if self._should_rotate():
+                self._rotate()
+            with open(self.path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(b"".join(lines))
+            offsets = offset + np.cumsum([0] + [len(line) for line in lines[:-1]])
+            index_lines = [
+                json.dumps([int(start), entry.get("timestamp"), entry.get("username"), entry.get("company")]) + "\n"
+                for start, entry in zip(offsets, entries)
+            ]
+            with open(self._index_path(self.path), "a", encoding="utf-8") as f:
+                f.write("".join(index_lines))
+
+    # ---- reading ----
+    def _index(self, segment):
+        index_path = self._index_path(segment)
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return _SegmentIndex()
+        index = self._indexes.get(segment)
+        if index is None or index.inode != stat.st_ino or stat.st_size < index.read_to:
+            # First read, or another process rotated the active segment
+            index = self._indexes[segment] = _SegmentIndex()
+            index.inode = stat.st_ino
+        if stat.st_size == index.read_to:
+            return index
+        # Only parse index lines appended since the last query
+        with open(index_path, "rb") as f:
+            f.seek(index.read_to)
+            rows = []
+            while True:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                rows.append(tuple(json.loads(line)))
+                index.read_to = f.tell()
+        index.extend(rows)
+        return index
+
+    def _read_entries(self, segment, offsets):
+        opener = gzip.open if segment.endswith(".gz") else open
+        entries = []
+        with opener(segment, "rb") as f:
+            for offset in offsets:
+                f.seek(int(offset))
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    def count(self, username=None, company=None, since=None, until=None):
+        return int(sum(self._index(s).mask(username, company, since, until).sum() for s in self.segments()))
+
+    def query(self, username=None, company=None, since=None, until=None, offset=0, limit=None):
+        """Matching entries in append order, skipping `offset` and returning at most `limit`."""
+        results = []
+        skip = offset
+        for segment in self.segments():
+            index = self._index(segment)
+            offsets = index.offsets[index.mask(username, company, since, until)]
+            if skip >= len(offsets):
+                skip -= len(offsets)
+                continue
+            offsets = offsets[skip:]
+            skip = 0
+            if limit is not None:
+                offsets = offsets[:limit - len(results)]
+            results.extend(self._read_entries(segment, offsets))
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def companies(self):
+        values = set()
+        for segment in self.segments():
+            values.update(self._index(segment).companies.tolist())
+        return sorted(v for v in values if v is not None)
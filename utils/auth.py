@@ -0,0 +1,120 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+
+from utils.storage import _atomic_write_json, _read_json
+
+API_USERS_FILE = "api_users.json"
+
+# Compared against when the username is unknown, so timing does not leak it
+_DUMMY_HASH = hashlib.sha256(b"unknown-user").digest()
+
+
+def hash_api_key(api_key):
+    """SHA-256 of a key; only strings are keys (12345 must not match "12345")."""
+    if not isinstance(api_key, str):
+        raise TypeError(f"API key must be a string, not {type(api_key).__name__}")
+    return hashlib.sha256(api_key.encode("utf-8")).digest()
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+
+# --------------------------------
+# API Key Cache
+# --------------------------------
+class ApiKeyCache:
+    """In-memory map of username -> SHA-256(api_key) backed by api_users.json.
+
+    The file is only re-parsed when its mtime, inode or size changes (or after
+    `invalidate()`); plaintext keys are never kept in memory and comparisons
+    are constant-time. `hits` counts checks served from memory, `misses`
+    checks that had to reload the file first.
+    """
+
+    def __init__(self, path=API_USERS_FILE):
+        self.path = path
+        self._hashes = {}
+        self._signature = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.failures = 0
+
+    def _refresh(self):
+        signature = _file_signature(self.path)
+        if self._loaded and signature == self._signature:
+            return True
+        with self._lock:
+            signature = _file_signature(self.path)
+            if self._loaded and signature == self._signature:
+                return True
+            users = {}
+            if signature is not None:
+                with open(self.path, "r") as f:
+                    users = json.load(f)
+            self._hashes = {username: hash_api_key(key) for username, key in users.items() if isinstance(key, str)}
+            self._signature = signature
+            self._loaded = True
+            self.reloads += 1
+            return False
+
+    def verify(self, username, api_key):
+        if self._refresh():
+            self.hits += 1
+        else:
+            self.misses += 1
+        expected = self._hashes.get(username, _DUMMY_HASH)
+        supplied = hash_api_key(api_key) if isinstance(api_key, str) else None
+        valid = supplied is not None and hmac.compare_digest(expected, supplied) and username in self._hashes
+        if not valid:
+            self.failures += 1
+        return valid
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._hashes),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_caches = {}
+
+
+def get_api_key_cache(path=API_USERS_FILE):
+    if path not in _caches:
+        _caches[path] = ApiKeyCache(path)
+    return _caches[path]
+
+
+def save_api_key(username, api_key, path=API_USERS_FILE):
+    """Register or reset a user's API key and invalidate the in-process cache.
+
+    The file is replaced atomically, which also changes its inode, so caches
+    in other processes (e.g. api_server.py) pick up the change on their next
+    check.
+    """
+    if not isinstance(api_key, str):
+        raise TypeError(f"API key must be a string, not {type(api_key).__name__}")
+    users = _read_json(path, {})
+    users[username] = api_key
+    _atomic_write_json(path, users)
+    get_api_key_cache(path).invalidate()
@@ -0,0 +1,132 @@
+import time
+
+import pandas as pd
+from joblib import parallel_config
+
+PREDICTION_COLUMN = "Predicted Emissions"
+DEFAULT_CHUNKSIZE = 100_000
+PREVIEW_ROWS = 100
+
+
+# --------------------------------
+# Schema & Prediction
+# --------------------------------
+def expected_features(model):
+    names = getattr(model, "feature_names_in_", None)
+    return [str(f) for f in names] if names is not None else None
+
+
+def check_schema(columns, features):
+    """Raise ValueError if any expected feature column is missing."""
+    if features is None:
+        return
+    missing = [f for f in features if f not in columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+
+def predict_frame(model, df, features=None, n_jobs=-1):
+    """Predict a frame, evaluating the forest's trees on `n_jobs` threads.
+
+    sklearn forests built with n_jobs=None (as saved by the training
+    scripts) take their worker count from this joblib config.
+    """
+    X = df[features] if features is not None else df
+    with parallel_config(backend="threading", n_jobs=n_jobs):
+        return model.predict(X)
+
+
+# --------------------------------
+# Streaming Engine
+# --------------------------------
+class _CsvSink:
+    def __init__(self, output, features=None):
+        self.output = output
+        self.header = True
+
+    def write(self, chunk):
+        self.output.write(chunk.to_csv(index=False, header=self.header).encode("utf-8"))
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class _ParquetSink:
+    """Parquet writer with a schema fixed before the first chunk.
+
+    Features and the prediction are always float64, so a feature that is all
+    integers in one chunk and has decimals in a later one still fits the
+    schema. Other columns keep their inferred types; integer columns can hold
+    the NaNs of later chunks as nulls.
+    """
+
+    def __init__(self, output, features=None):
+        self.output = output
+        self.features = set(features or ())
+        self.writer = None
+
+    def _schema(self, chunk):
+        import pyarrow as pa
+
+        inferred = pa.Schema.from_pandas(chunk, preserve_index=False)
+        fields = []
+        for field in inferred:
+            if field.name in self.features or field.name == PREDICTION_COLUMN:
+                field = field.with_type(pa.float64())
+            elif pa.types.is_null(field.type):
+                field = field.with_type(pa.string())
+            fields.append(field)
+        return pa.schema(fields, metadata=inferred.metadata)
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.output, self._schema(chunk))
+        table = pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+SINKS = {"csv": _CsvSink, "parquet": _ParquetSink}
+
+
+def stream_batch_predict(model, source, output, fmt="csv", chunksize=DEFAULT_CHUNKSIZE,
+                         n_jobs=-1, progress_callback=None):
+    """Predict a CSV in fixed-size chunks and stream the results to `output`.
+
+    `source` is a CSV path or file-like object and `output` a path or binary
+    file-like object. Only one chunk of input and output is held in memory at
+    a time. `progress_callback(stats)` is called after each chunk with the
+    running row count, elapsed seconds and rows/sec. Returns the final stats
+    plus a small preview of the first predicted rows.
+    """
+    if fmt not in SINKS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    features = expected_features(model)
+    sink = SINKS[fmt](output, features)
+    stats = {"rows": 0, "chunks": 0, "seconds": 0.0, "rows_per_sec": 0.0, "preview": None}
+    start = time.perf_counter()
+    try:
+        for chunk in pd.read_csv(source, chunksize=chunksize):
+            if stats["chunks"] == 0:
+                # Columns are identical across chunks; validate once
+                check_schema(chunk.columns, features)
+            chunk[PREDICTION_COLUMN] = predict_frame(model, chunk, features, n_jobs)
+            sink.write(chunk)
+            if stats["preview"] is None:
+                stats["preview"] = chunk.head(PREVIEW_ROWS).copy()
+            stats["rows"] += len(chunk)
+            stats["chunks"] += 1
+            stats["seconds"] = time.perf_counter() - start
+            stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+            if progress_callback is not None:
+                progress_callback(stats)
+    finally:
+        sink.close()
+    return stats
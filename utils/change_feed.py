@@ -0,0 +1,182 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+# How often a store-backed feed checks for changes committed by other processes
+FEED_POLL_INTERVAL = float(os.environ.get("FEED_POLL_INTERVAL", 0.5))
+
+
+# --------------------------------
+# In-memory Change Feed
+# --------------------------------
+class ChangeFeed:
+    """Bounded ring buffer of recent company updates with sequence numbers.
+
+    Every published change gets the next sequence number. Consumers ask for
+    changes after the last one they saw and can block (threads) or await
+    (asyncio) until something new arrives. The feed lives in one process:
+    `epoch` changes on every restart, and readers whose epoch differs or
+    whose position fell out of the buffer are told to `reset` (reload
+    everything, then resume from `last_seq`).
+    """
+
+    def __init__(self, maxlen=10_000):
+        self.epoch = uuid.uuid4().hex[:12]
+        self._changes = deque(maxlen=maxlen)
+        self._last_seq = 0
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    @property
+    def last_seq(self):
+        return self._last_seq
+
+    def publish(self, username, company, emission_sources, timestamp=None):
+        with self._cond:
+            self._last_seq += 1
+            self._changes.append({
+                "seq": self._last_seq,
+                "timestamp": timestamp or datetime.utcnow().isoformat(),
+                "username": username,
+                "company": company,
+                "emission_sources": emission_sources
+            })
+            self._cond.notify_all()
+            for loop, event in self._async_waiters:
+                loop.call_soon_threadsafe(event.set)
+            return self._last_seq
+
+    def read(self, since=0, epoch=None, limit=1000):
+        """Changes with seq > since (at most `limit`), or a reset marker."""
+        with self._cond:
+            oldest = self._changes[0]["seq"] if self._changes else self._last_seq + 1
+            reset = (epoch is not None and epoch != self.epoch) or since > self._last_seq or since < oldest - 1
+            changes = []
+            if not reset and since < self._last_seq:
+                start = since - oldest + 1
+                changes = [self._changes[i] for i in range(start, min(start + limit, len(self._changes)))]
+            return {"epoch": self.epoch, "last_seq": self._last_seq, "reset": reset, "changes": changes}
+
+    def wait(self, since, timeout):
+        """Block until a change after `since` exists or `timeout` seconds pass; True if one does."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._last_seq <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    break
+            return self._last_seq > since
+
+    async def wait_async(self, since, timeout):
+        """`wait` for asyncio code, without tying up a thread."""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._cond:
+            if self._last_seq > since:
+                return True
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(waiter)
+        return self._last_seq > since
+
+    def stats(self):
+        with self._cond:
+            return {
+                "epoch": self.epoch,
+                "last_seq": self._last_seq,
+                "buffered": len(self._changes),
+                "maxlen": self._changes.maxlen,
+                "waiters": len(self._async_waiters),
+            }
+
+
+# --------------------------------
+# Store-backed Change Feed
+# --------------------------------
+class StoreChangeFeed:
+    """Change feed read from a store's update log, shared by every server process.
+
+    Sequence numbers are the log's row ids and the epoch is the database's,
+    so a client can be load-balanced across worker processes and still see
+    every change exactly once. `publish` only wakes waiters in this process;
+    changes committed by other processes are noticed by polling every
+    FEED_POLL_INTERVAL seconds.
+    """
+
+    def __init__(self, store, poll_interval=FEED_POLL_INTERVAL):
+        self.store = store
+        self.epoch = store.log_epoch
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+
+    @property
+    def last_seq(self):
+        return self.store.last_log_id()
+
+    def publish(self, username, company, emission_sources, timestamp=None):
+        """Wake local waiters; the store has already logged the change."""
+        with self._cond:
+            self._cond.notify_all()
+            for loop, event in self._async_waiters:
+                loop.call_soon_threadsafe(event.set)
+
+    def read(self, since=0, epoch=None, limit=1000):
+        """Changes with seq > since (at most `limit`), or a reset marker."""
+        last_seq = self.store.last_log_id()
+        reset = (epoch is not None and epoch != self.epoch) or since > last_seq
+        changes = [] if reset or since >= last_seq else self.store.log_after(since, limit)
+        return {"epoch": self.epoch, "last_seq": last_seq, "reset": reset, "changes": changes}
+
+    def wait(self, since, timeout):
+        """Block until a change after `since` exists or `timeout` seconds pass; True if one does."""
+        deadline = time.monotonic() + timeout
+        while self.last_seq <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._cond:
+                self._cond.wait(min(remaining, self.poll_interval))
+        return True
+
+    async def wait_async(self, since, timeout):
+        """`wait` for asyncio code; store reads run in the default executor."""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while await loop.run_in_executor(None, lambda: self.last_seq) <= since:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            event = asyncio.Event()
+            waiter = (loop, event)
+            with self._cond:
+                self._async_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(event.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    self._async_waiters.discard(waiter)
+        return True
+
+    def stats(self):
+        with self._cond:
+            waiters = len(self._async_waiters)
+        return {"epoch": self.epoch, "last_seq": self.last_seq, "source": self.store.backend, "waiters": waiters}
+
+
+def change_feed_for(store):
+    """A store-backed feed when the store keeps a shared log, else an in-memory one."""
+    if hasattr(store, "log_after"):
+        return StoreChangeFeed(store)
+    return ChangeFeed()
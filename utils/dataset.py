@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.storage import _atomic_write_json, _read_json
+
+DATA_FILE = "data/data_cleaned.csv"
+CLEANED_FILE = "cleaned_v2.csv"
+
+# Converted files live next to their CSV unless DATASET_CACHE_DIR is set
+DATASET_CACHE_DIR = os.environ.get("DATASET_CACHE_DIR") or None
+
+# Bump when the conversion rules change so every cached file is rebuilt
+DATASET_FORMAT = 1
+CATEGORY_COLUMNS = ("country",)
+# Rows per Parquet row group; min/max statistics per group make filters skip whole groups
+ROW_GROUP_SIZE = 64_000
+
+# Integer-valued columns above this lose exactness in float32
+_FLOAT32_EXACT_INT = 2 ** 24
+
+_build_lock = threading.Lock()
+
+
+# --------------------------------
+# Conversion
+# --------------------------------
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _float32_safe(values):
+    """False when float32 would overflow a column or round its large whole-number counts."""
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return True
+    if np.abs(finite).max() > np.finfo(np.float32).max:
+        return False
+    if np.abs(finite).max() > _FLOAT32_EXACT_INT and np.all(finite == np.round(finite)):
+        # Counts such as population must stay exact
+        return False
+    return True
+
+
+def optimize_dtypes(df):
+    """Category for identifier columns, small ints for years/labels, float32 for other floats.
+
+    Float columns are rounded to float32 (about 7 significant digits) unless
+    `_float32_safe` rejects them; readers needing full precision use the CSV.
+    """
+    df = df.copy()
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORY_COLUMNS or (series.dtype == object and series.nunique() <= max(1, len(series) // 2)):
+            df[col] = series.astype("category")
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series) and _float32_safe(series.to_numpy(dtype=np.float64)):
+            df[col] = series.astype(np.float32)
+    return df
+
+
+def parquet_path(csv_path, cache_dir=DATASET_CACHE_DIR):
+    directory = cache_dir or os.path.join(os.path.dirname(os.path.abspath(csv_path)), ".parquet")
+    return os.path.join(directory, os.path.splitext(os.path.basename(csv_path))[0] + ".parquet")
+
+
+def _meta_path(path):
+    return path + ".json"
+
+
+def convert_csv(csv_path, path, sha256=None):
+    """Write `csv_path` as typed Parquet sorted by country/year, plus its sidecar."""
+    df = optimize_dtypes(pd.read_csv(csv_path))
+    sort_cols = [c for c in ("country", "year") if c in df.columns]
+    if sort_cols:
+        df = df.sort_values(sort_cols, kind="stable").reset_index(drop=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path,
+                       row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    stat = os.stat(csv_path)
+    meta = {
+        "format": DATASET_FORMAT,
+        "source": os.path.abspath(csv_path),
+        "sha256": sha256 or file_sha256(csv_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "rows": len(df),
+        "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+    }
+    _atomic_write_json(_meta_path(path), meta)
+    return meta
+
+
+def ensure_parquet(csv_path, cache_dir=DATASET_CACHE_DIR):
+    """Path and metadata of the up-to-date Parquet copy of `csv_path`.
+
+    An unchanged CSV (same size and mtime) costs one stat. After a touch the
+    CSV is re-hashed and only rebuilt if its content actually changed.
+    """
+    path = parquet_path(csv_path, cache_dir)
+    with _build_lock:
+        meta = _read_json(_meta_path(path), None)
+        stat = os.stat(csv_path)
+        if meta and meta.get("format") == DATASET_FORMAT and os.path.exists(path):
+            if (meta["mtime_ns"], meta["size"]) == (stat.st_mtime_ns, stat.st_size):
+                return path, meta
+            sha256 = file_sha256(csv_path)
+            if sha256 == meta["sha256"]:
+                meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                _atomic_write_json(_meta_path(path), meta)
+                return path, meta
+            return path, convert_csv(csv_path, path, sha256)
+        return path, convert_csv(csv_path, path)
+
+
+def dataset_version(csv_path, cache_dir=DATASET_CACHE_DIR):
+    """Content hash of the CSV behind a dataset; changes exactly when it is rebuilt."""
+    return ensure_parquet(csv_path, cache_dir)[1]["sha256"]
+
+
+# --------------------------------
+# Loading
+# --------------------------------
+def load_dataset(csv_path=DATA_FILE, columns=None, filters=None, countries=None, years=None,
+                 exclude_countries=None, cache_dir=DATASET_CACHE_DIR):
+    """Load a CSV-backed dataset from its Parquet copy.
+
+    `columns` projects (only those columns are read); `filters` takes
+    pyarrow's [(column, op, value), ...] form and is pushed down to the
+    row-group reader. `countries`, `exclude_countries` and `years`
+    ((first, last), inclusive) are shorthands for the common filters.
+    """
+    path, _ = ensure_parquet(csv_path, cache_dir)
+    filters = list(filters or [])
+    if countries is not None:
+        filters.append(("country", "in", list(countries)))
+    if exclude_countries is not None:
+        filters.append(("country", "not in", list(exclude_countries)))
+    if years is not None:
+        first, last = years
+        filters += [("year", ">=", first), ("year", "<=", last)]
+    table = pq.read_table(path, columns=list(columns) if columns is not None else None, filters=filters or None)
+    df = table.to_pandas()
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    return df
@@ -0,0 +1,195 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset import dataset_version, load_dataset
+from utils.streaming_stats import compute_stats, fits_in_memory, iter_chunks
+
+# Scatter, regression and pair plots draw at most this many rows
+SAMPLE_ROWS = 5_000
+PAIRPLOT_ROWS = 1_500
+# KMeans fits on a stratified sample above this size and then labels every row
+KMEANS_FIT_ROWS = 200_000
+STRATA_COLUMN = "country"
+
+_explorers = OrderedDict()
+_explorers_lock = threading.Lock()
+MAX_EXPLORERS = 4
+
+
+def stratified_sample(df, n, strata=STRATA_COLUMN, seed=42):
+    """About `n` rows with every stratum represented in proportion (at least one row each)."""
+    if len(df) <= n:
+        return df
+    rng = np.random.default_rng(seed)
+    if strata not in df.columns:
+        return df.iloc[np.sort(rng.choice(len(df), n, replace=False))]
+    codes, uniques = pd.factorize(df[strata], use_na_sentinel=False)
+    sizes = np.bincount(codes, minlength=len(uniques))
+    quota = np.maximum(1, np.round(sizes * n / len(df))).astype(np.int64)
+    # Random order inside each stratum; keep the first `quota` rows of each
+    order = np.lexsort((rng.random(len(df)), codes))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    position = np.arange(len(df)) - np.repeat(starts, sizes)
+    keep = order[position < quota[codes[order]]]
+    return df.iloc[np.sort(keep)]
+
+
+# --------------------------------
+# Exploration Engine
+# --------------------------------
+class DatasetExplorer:
+    """Exploration results for one version of a dataset, computed on first use.
+
+    Statistics, correlations, histograms, samples, regression fits and
+    KMeans fits are memoized, so widget interactions only redraw. One
+    explorer per dataset version is shared by every session in the process.
+    """
+
+    def __init__(self, df, version=None):
+        self.df = df
+        self.version = version
+        self.n_rows = len(df)
+        self.columns = list(df.columns)
+        self.numeric_columns = list(df.select_dtypes(include="number").columns)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self._memo:
+                return self._memo[key]
+        value = compute()
+        with self._lock:
+            return self._memo.setdefault(key, value)
+
+    def preview(self, n):
+        return self.df.head(n)
+
+    def describe(self):
+        return self._cached(("describe",), self.df.describe)
+
+    def corr(self):
+        return self._cached(("corr",), lambda: self.df[self.numeric_columns].corr())
+
+    def histogram(self, column, bins=50):
+        """(counts as density, bin edges) over every non-missing value."""
+        def compute():
+            values = self.df[column].to_numpy(dtype=np.float64)
+            return np.histogram(values[np.isfinite(values)], bins=bins, density=True)
+        return self._cached(("histogram", column, bins), compute)
+
+    def sample(self, n=SAMPLE_ROWS, seed=42):
+        return self._cached(("sample", n, seed), lambda: stratified_sample(self.df, n, seed=seed))
+
+    def regression(self, x, y):
+        """Least-squares (slope, intercept, r) of y on x over all complete rows."""
+        def compute():
+            pair = self.df[[x, y]].dropna().to_numpy(dtype=np.float64)
+            if len(pair) < 2:
+                return np.nan, np.nan, np.nan
+            slope, intercept = np.polyfit(pair[:, 0], pair[:, 1], 1)
+            return slope, intercept, np.corrcoef(pair[:, 0], pair[:, 1])[0, 1]
+        return self._cached(("regression", x, y), compute)
+
+    def kmeans(self, k, features, random_state=42):
+        """Cluster labels for every row, memoized per (k, feature set)."""
+        features = tuple(features)
+
+        def compute():
+            from sklearn.cluster import KMeans
+            X = self.df[list(features)].to_numpy(dtype=np.float64)
+            model = KMeans(n_clusters=k, random_state=random_state, n_init=10)
+            if len(X) > KMEANS_FIT_ROWS:
+                fit_rows = stratified_sample(self.df[list(features) + ([STRATA_COLUMN] if STRATA_COLUMN in self.df else [])],
+                                             KMEANS_FIT_ROWS, seed=random_state)
+                model.fit(fit_rows[list(features)].to_numpy(dtype=np.float64))
+                return model.predict(X)
+            return model.fit_predict(X)
+        return self._cached(("kmeans", k, features, random_state), compute)
+
+
+class StreamingExplorer(DatasetExplorer):
+    """Explorer for a file too large to load, built from one streaming pass.
+
+    Statistics, correlations, histograms and regression fits come from
+    `StreamingStats`; samples are drawn from its reservoir, and KMeans fits
+    and labels that sample only. `df` is None.
+    """
+
+    def __init__(self, path, stats, version=None):
+        self.path = path
+        self.stats = stats
+        self.df = None
+        self.version = version
+        self.n_rows = stats.rows
+        self.columns = list(stats.sample.columns)
+        self.numeric_columns = list(stats.columns)
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def preview(self, n):
+        return self._cached(("preview", n), lambda: next(iter_chunks(self.path, chunk_rows=n), pd.DataFrame()))
+
+    def describe(self):
+        return self._cached(("describe",), self.stats.describe)
+
+    def corr(self):
+        return self._cached(("corr",), self.stats.corr)
+
+    def histogram(self, column, bins=50):
+        def compute():
+            counts, edges = self.stats.histogram(column, bins)
+            total = counts.sum()
+            return (counts / (total * np.diff(edges)) if total else counts), edges
+        return self._cached(("histogram", column, bins), compute)
+
+    def sample(self, n=SAMPLE_ROWS, seed=42):
+        return self._cached(("sample", n, seed), lambda: stratified_sample(self.stats.sample, n, seed=seed))
+
+    def regression(self, x, y):
+        return self._cached(("regression", x, y), lambda: self.stats.regression(x, y))
+
+    def kmeans(self, k, features, random_state=42):
+        """Cluster labels for the rows of `sample()`, memoized per (k, feature set)."""
+        features = tuple(features)
+
+        def compute():
+            from sklearn.cluster import KMeans
+            X = self.sample()[list(features)].to_numpy(dtype=np.float64)
+            return KMeans(n_clusters=k, random_state=random_state, n_init=10).fit_predict(X)
+        return self._cached(("kmeans", k, features, random_state), compute)
+
+
+def _build_explorer(csv_path):
+    """(version, explorer factory); files over IN_MEMORY_MAX_BYTES are streamed, not loaded."""
+    if fits_in_memory(csv_path):
+        version = dataset_version(csv_path)
+        return version, lambda: DatasetExplorer(load_dataset(csv_path), version)
+    # Hashing or converting a file larger than memory is what streaming avoids; size and mtime identify it
+    stat = os.stat(csv_path)
+    version = f"{stat.st_size}-{stat.st_mtime_ns}"
+    return version, lambda: StreamingExplorer(csv_path, compute_stats(csv_path, n_jobs=-1, sample_rows=SAMPLE_ROWS), version)
+
+
+def get_explorer(csv_path):
+    """The shared explorer for the current version of `csv_path`."""
+    version, build = _build_explorer(csv_path)
+    key = (csv_path, version)
+    with _explorers_lock:
+        explorer = _explorers.get(key)
+        if explorer is not None:
+            _explorers.move_to_end(key)
+            return explorer
+    explorer = build()
+    with _explorers_lock:
+        explorer = _explorers.setdefault(key, explorer)
+        # Older versions of the same file are never asked for again
+        for old in [k for k in _explorers if k[0] == csv_path and k != key]:
+            del _explorers[old]
+        while len(_explorers) > MAX_EXPLORERS:
+            _explorers.popitem(last=False)
+    return explorer
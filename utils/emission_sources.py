@@ -0,0 +1,141 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from utils.validation import validate_emission_sources
+
+STATE_KEY = "emission_sources"
+VERSION_KEY = "emission_sources_version"
+_MODEL_KEY = "_emission_sources_model"
+_SIGNATURE_KEY = "_emission_sources_signature"
+
+
+def sum_emissions(records):
+    """Total of the `emission` fields of a list of source dicts."""
+    return float(np.fromiter((src.get("emission", 0) or 0 for src in records), dtype=float, count=len(records)).sum())
+
+
+# --------------------------------
+# Emission Sources Model
+# --------------------------------
+class EmissionSources:
+    """Columnar, typed view of a company's emission sources.
+
+    Built once per change of `st.session_state["emission_sources"]`: `type`
+    is categorical and `emission` float64, and totals, per-type aggregates,
+    shares and validation results are computed up front so pages only read
+    them.
+    """
+
+    def __init__(self, records, version=0):
+        self.records = records
+        self.version = version
+        self.n_records = len(records) if isinstance(records, list) else 0
+        self.valid = isinstance(records, list) and bool(records) and all(isinstance(x, dict) for x in records)
+        self.error = validate_emission_sources(records)[1] if self.valid else "Emission sources must be a non-empty list of dicts."
+        frame = pd.DataFrame(records) if self.valid else pd.DataFrame()
+        self.has_emission_type = "emission" in frame.columns and "type" in frame.columns
+        if "emission" in frame.columns:
+            frame["emission"] = pd.to_numeric(frame["emission"], errors="coerce").astype("float64")
+        if "type" in frame.columns:
+            frame["type"] = frame["type"].astype("category")
+        self.frame = frame
+        self.types = frame["type"].to_numpy(dtype=object) if "type" in frame.columns else np.empty(0, dtype=object)
+        self.emissions = frame["emission"].to_numpy() if "emission" in frame.columns else np.empty(0)
+        self.total = float(np.nansum(self.emissions))
+        if self.has_emission_type:
+            self.by_type = frame.groupby("type", observed=True)["emission"].sum().sort_values(ascending=False)
+        else:
+            self.by_type = pd.Series(dtype="float64")
+        self.shares = self.by_type / self.total if self.total else self.by_type * 0.0
+        self.locations = [
+            (src["location"], src.get("type"), src.get("emission"))
+            for src in (records if self.valid else []) if "location" in src
+        ]
+        self.has_location = bool(self.locations)
+        self._csv = None
+        self._anomalies = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    def issues(self, benchmarks, emissions=None):
+        """Benchmark validation messages for the given (default: current) emissions."""
+        values = self.emissions if emissions is None else np.asarray(emissions, dtype=float)
+        limit = 2 * benchmarks["average"]
+        issues = []
+        for kind, value in zip(self.types, values):
+            if value < 0:
+                issues.append(f"Negative value for {kind}.")
+            if value > limit:
+                issues.append(f"Unusually high value for {kind} (>{limit} tons CO₂e).")
+        if np.nansum(values) > limit:
+            issues.append(f"Total emissions are much higher than sector average ({benchmarks['average']} tons CO₂e).")
+        return issues
+
+    def anomalies(self):
+        """Index labels the IsolationForest check flags; fitted once per version."""
+        if self._anomalies is None:
+            from utils.utils import ai_anomaly_detection
+            self._anomalies = ai_anomaly_detection(self.frame)
+        return self._anomalies
+
+    def csv(self):
+        if self._csv is None:
+            self._csv = self.frame.to_csv(index=False).encode("utf-8")
+        return self._csv
+
+
+# --------------------------------
+# Session State Access
+# --------------------------------
+def _signature(records):
+    payload = json.dumps(records, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _session_state(state):
+    if state is None:
+        import streamlit as st
+        state = st.session_state
+    return state
+
+
+def set_emission_sources(records, state=None):
+    """Store `records` as the current sources; bumps the version only if the content changed."""
+    state = _session_state(state)
+    signature = _signature(records)
+    state[STATE_KEY] = records
+    model = state.get(_MODEL_KEY)
+    if state.get(_SIGNATURE_KEY) != signature:
+        state[_SIGNATURE_KEY] = signature
+        state[VERSION_KEY] = state.get(VERSION_KEY, 0) + 1
+    elif model is not None and model.version == state.get(VERSION_KEY, 0):
+        # Same content in a new list object: keep the built model
+        model.records = records
+    return get_emission_sources(state)
+
+
+def get_emission_sources(state=None):
+    """The cached EmissionSources for the session, rebuilt only after a change.
+
+    Writers should go through `set_emission_sources`; a list assigned or
+    grown directly in session state is detected by identity and length.
+    """
+    state = _session_state(state)
+    records = state.get(STATE_KEY, [])
+    model = state.get(_MODEL_KEY)
+    version = state.get(VERSION_KEY, 0)
+    if model is not None and model.version == version and model.records is records \
+            and (not isinstance(records, list) or len(records) == model.n_records):
+        return model
+    if model is not None and model.version == version:
+        # Changed without set_emission_sources
+        version = state[VERSION_KEY] = version + 1
+        state.pop(_SIGNATURE_KEY, None)
+    model = EmissionSources(records, version)
+    state[VERSION_KEY] = version
+    state[_MODEL_KEY] = model
+    return model
@@ -0,0 +1,259 @@
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# Version tag stored inside flattened artifacts
+FLAT_FOREST_FORMAT = "flat_forest/1"
+
+_LEAF = -1
+
+# Up to this many rows x trees, all trees are walked together (low latency);
+# larger inputs walk one tree at a time, which is faster per row
+_ALL_TREES_MAX_CELLS = 1 << 17
+
+
+# --------------------------------
+# Flattening
+# --------------------------------
+def flatten_forest(model, feature_names=None):
+    """Flatten a fitted tree ensemble into a dict of contiguous NumPy arrays.
+
+    All trees are concatenated into one node table; `roots` holds the offset of
+    each tree's root node and child indices are global into the table.
+    """
+    estimators = getattr(model, "estimators_", None)
+    if not estimators:
+        raise ValueError("Model has no fitted estimators_ to flatten.")
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output forests can be flattened.")
+
+    sizes = np.array([est.tree_.node_count for est in estimators], dtype=np.int64)
+    roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+    left, right, feature, threshold, value = [], [], [], [], []
+    for root, est in zip(roots, estimators):
+        tree = est.tree_
+        is_leaf = tree.children_left == _LEAF
+        left.append(np.where(is_leaf, _LEAF, tree.children_left + root))
+        right.append(np.where(is_leaf, _LEAF, tree.children_right + root))
+        # Leaves carry feature -2 in sklearn; 0 keeps gathers in bounds
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        value.append(tree.value[:, 0, 0])
+
+    if feature_names is None and hasattr(model, "feature_names_in_"):
+        feature_names = model.feature_names_in_
+    flat = {
+        "format": FLAT_FOREST_FORMAT,
+        "feature_names": None if feature_names is None else [str(f) for f in feature_names],
+        "n_features": int(model.n_features_in_),
+        "max_depth": int(max(est.tree_.max_depth for est in estimators)),
+        "roots": roots,
+        "children_left": np.concatenate(left).astype(np.int64),
+        "children_right": np.concatenate(right).astype(np.int64),
+        "feature": np.concatenate(feature).astype(np.int64),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64),
+        "feature_importances": np.asarray(model.feature_importances_, dtype=np.float64),
+    }
+    flat.update(pack_forest(flat))
+    return flat
+
+
+def pack_forest(flat):
+    """CompiledForest's layout of a flattened forest: packed children and narrow indices.
+
+    Stored in the artifact so that memory-mapped copies are used as they are
+    instead of every process building its own.
+    """
+    left = np.asarray(flat["children_left"])
+    right = np.asarray(flat["children_right"])
+    is_leaf = left == _LEAF
+    index_type = np.int32 if len(left) < np.iinfo(np.int32).max else np.int64
+    own = np.arange(len(left), dtype=index_type)
+    return {
+        "packed_children": np.ascontiguousarray(
+            np.stack([np.where(is_leaf, own, left), np.where(is_leaf, own, right)], axis=1).astype(index_type)),
+        "packed_feature": np.asarray(flat["feature"], dtype=index_type),
+        "packed_roots": np.asarray(flat["roots"], dtype=index_type),
+    }
+
+
+def is_flat_forest(obj):
+    return isinstance(obj, dict) and obj.get("format") == FLAT_FOREST_FORMAT
+
+
+# --------------------------------
+# Inference
+# --------------------------------
+class FlatForest:
+    """Read-only forest predictor over flattened (optionally memory-mapped) arrays.
+
+    Mirrors the parts of RandomForestRegressor the app uses: `predict`,
+    `feature_names_in_`, `n_features_in_`, `n_estimators` and
+    `feature_importances_`.
+    """
+
+    def __init__(self, arrays):
+        if not is_flat_forest(arrays):
+            raise ValueError("Not a flattened forest artifact.")
+        self.arrays = arrays
+        self.roots = arrays["roots"]
+        self.children_left = arrays["children_left"]
+        self.children_right = arrays["children_right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.value = arrays["value"]
+        self.max_depth = arrays["max_depth"]
+        self.n_features_in_ = arrays["n_features"]
+        self.n_estimators = len(self.roots)
+        self.feature_importances_ = arrays["feature_importances"]
+        names = arrays.get("feature_names")
+        if names is not None:
+            self.feature_names_in_ = np.asarray(names, dtype=object)
+
+    def _validate_X(self, X):
+        if isinstance(X, pd.DataFrame) and hasattr(self, "feature_names_in_"):
+            missing = [f for f in self.feature_names_in_ if f not in X.columns]
+            if missing:
+                raise ValueError(f"Missing required features: {missing}")
+            X = X[list(self.feature_names_in_)]
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[1]} features, but the model expects {self.n_features_in_}.")
+        # sklearn compares float32 inputs against float64 thresholds
+        return X.astype(np.float64)
+
+    def _traverse_all_trees(self, X):
+        node = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        rows = np.arange(X.shape[0])[None, :]
+        for _ in range(self.max_depth):
+            left = self.children_left[node]
+            is_split = left != _LEAF
+            if not is_split.any():
+                break
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(is_split, np.where(go_left, left, self.children_right[node]), node)
+        return node
+
+    def _traverse_per_tree(self, X):
+        rows = np.arange(X.shape[0])
+        nodes = np.empty((self.n_estimators, X.shape[0]), dtype=np.int64)
+        for t, root in enumerate(self.roots):
+            node = np.full(X.shape[0], root)
+            while True:
+                left = self.children_left[node]
+                is_split = left != _LEAF
+                if not is_split.any():
+                    break
+                go_left = X[rows, self.feature[node]] <= self.threshold[node]
+                node = np.where(is_split, np.where(go_left, left, self.children_right[node]), node)
+            nodes[t] = node
+        return nodes
+
+    def _traverse(self, X):
+        """Leaf node index per (tree, row)."""
+        if X.shape[0] * self.n_estimators <= _ALL_TREES_MAX_CELLS:
+            return self._traverse_all_trees(X)
+        return self._traverse_per_tree(X)
+
+    def predict_per_tree(self, X):
+        """(n_estimators, n_samples) predictions, one row per tree."""
+        return self.value[self._traverse(self._validate_X(X))]
+
+    def predict(self, X):
+        return self.predict_per_tree(X).mean(axis=0)
+
+
+# --------------------------------
+# Compiled Inference
+# --------------------------------
+class CompiledForest(FlatForest):
+    """FlatForest re-laid out for low-latency prediction.
+
+    Children are packed into one (nodes, 2) table in which leaves point to
+    themselves, so a traversal step is a single gather with no leaf masking:
+    `node = children[node, x[feature[node]] > threshold[node]]`. Inputs may
+    be feature dicts, skipping DataFrame construction entirely. Results
+    match sklearn's `predict` to float rounding; non-finite inputs are
+    rejected like sklearn rejects them.
+    """
+
+    def __init__(self, arrays):
+        super().__init__(arrays)
+        # Artifacts written by flatten_forest carry the packed layout; older ones are packed here
+        packed = arrays if "packed_children" in arrays else pack_forest(arrays)
+        self.children = packed["packed_children"]
+        self.feature = packed["packed_feature"]
+        self.roots = packed["packed_roots"]
+        self.threshold = np.ascontiguousarray(self.threshold, dtype=np.float64)
+        self.value = np.ascontiguousarray(self.value, dtype=np.float64)
+        self._names = None if not hasattr(self, "feature_names_in_") else [str(f) for f in self.feature_names_in_]
+
+    def _validate_X(self, X):
+        X = super()._validate_X(X)
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity.")
+        return X
+
+    def _traverse_all_trees(self, X):
+        node = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        rows = np.arange(X.shape[0])[None, :]
+        for _ in range(self.max_depth):
+            node = self.children[node, (X[rows, self.feature[node]] > self.threshold[node]).view(np.int8)]
+        return node
+
+    def _rows_matrix(self, rows):
+        names = self._names
+        if names is None:
+            values = [list(row.values()) for row in rows]
+        else:
+            try:
+                values = [[row[f] for f in names] for row in rows]
+            except KeyError:
+                missing = sorted({f for row in rows for f in names if f not in row})
+                raise ValueError(f"Missing required features: {missing}") from None
+        return self._validate_X(np.asarray(values, dtype=np.float32).reshape(len(rows), -1))
+
+    def predict_rows(self, rows):
+        """Predictions for a list of feature dicts."""
+        return self.value[self._traverse(self._rows_matrix(rows))].mean(axis=0)
+
+    def predict_one(self, features):
+        """Prediction for one feature dict, walking all trees of the single row together."""
+        x = self._rows_matrix([features])[0]
+        node = self.roots
+        for _ in range(self.max_depth):
+            node = self.children[node, (x[self.feature[node]] > self.threshold[node]).view(np.int8)]
+        return float(self.value[node].mean())
+
+
+_compiled = weakref.WeakKeyDictionary()
+_compiled_lock = threading.Lock()
+
+
+def can_compile(model):
+    return isinstance(model, FlatForest) or is_flat_forest(model) or bool(getattr(model, "estimators_", None))
+
+
+def compile_forest(model):
+    """CompiledForest for a fitted sklearn forest, a flattened dict or a FlatForest.
+
+    Compiling an object again returns the cached result while the object
+    is alive, so callers can compile on every request.
+    """
+    if isinstance(model, CompiledForest):
+        return model
+    if is_flat_forest(model):
+        return CompiledForest(model)
+    with _compiled_lock:
+        compiled = _compiled.get(model)
+    if compiled is None:
+        arrays = model.arrays if isinstance(model, FlatForest) else flatten_forest(model)
+        compiled = CompiledForest(arrays)
+        with _compiled_lock:
+            _compiled[model] = compiled
+    return compiled
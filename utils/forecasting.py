@@ -0,0 +1,257 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+START_YEAR = 2025
+
+# Feature profile the growth index is computed around; kept well inside the
+# training range so 30 years of growth do not run off the edge of the forest
+DEFAULT_BASE_FEATURES = {"Population": 500.0, "GDP": 5000.0, "Energy Use": 1500.0}
+# Assumed annual growth of each model input
+DEFAULT_GROWTH_RATES = {"Population": 0.01, "GDP": 0.02, "Energy Use": 0.015}
+
+# Base annual emissions used when a country code is passed instead of a total
+COUNTRY_BASE_EMISSIONS = {
+    "USA": 5000,
+    "China": 10000,
+    "India": 2500,
+    "Germany": 800,
+    "UK": 600,
+    "Brazil": 500,
+    "Canada": 700
+}
+
+
+# --------------------------------
+# Feature Projection
+# --------------------------------
+def model_features(model):
+    names = getattr(model, "feature_names_in_", None)
+    if names is None:
+        raise ValueError("Model does not expose feature_names_in_; pass a model fitted on a DataFrame.")
+    return [str(f) for f in names]
+
+
+def _feature_matrix(values, features, n_entities, defaults, label):
+    """Broadcast per-entity feature values to an (N, F) float array.
+
+    `values` may be None (use `defaults`), one dict for all entities, a list
+    of dicts (one per entity) or an array of shape (F,) or (N, F).
+    """
+    if values is None:
+        values = defaults
+    if isinstance(values, dict):
+        values = [values]
+    if isinstance(values, (list, tuple)) and values and isinstance(values[0], dict):
+        missing = sorted({f for row in values for f in features if f not in {**defaults, **row}})
+        if missing:
+            raise ValueError(f"No {label} for model features: {missing}")
+        values = [[row.get(f, defaults.get(f)) for f in features] for row in values]
+    matrix = np.asarray(values, dtype=float)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.shape[1] != len(features):
+        raise ValueError(f"Expected {len(features)} {label} per entity, got {matrix.shape[1]}.")
+    return np.broadcast_to(matrix, (n_entities, len(features)))
+
+
+def project_features(base_features, growth_rates, years):
+    """Compound (N, F) base features at (N, F) growth rates -> (N, H, F)."""
+    steps = np.arange(years, dtype=float)[None, :, None]
+    return base_features[:, None, :] * (1.0 + growth_rates[:, None, :]) ** steps
+
+
+# --------------------------------
+# Forecasting Engine
+# --------------------------------
+def forecast_matrix(model, base_emissions, years, base_features=None, growth_rates=None):
+    """Forecast N entities over H years with a single model.predict call.
+
+    Each entity's inputs are projected year by year, the whole (N*H, F)
+    horizon matrix is predicted at once, and the predictions are turned into
+    a growth index relative to year 0 that scales the entity's current
+    emissions. Returns an (N, H) array whose first column equals
+    `base_emissions`.
+    """
+    if years < 1:
+        raise ValueError("years must be at least 1.")
+    base = np.atleast_1d(np.asarray(base_emissions, dtype=float))
+    features = model_features(model)
+    n = len(base)
+    X0 = _feature_matrix(base_features, features, n, DEFAULT_BASE_FEATURES, "base features")
+    growth_defaults = {f: DEFAULT_GROWTH_RATES.get(f, 0.0) for f in features}
+    growth = _feature_matrix(growth_rates, features, n, growth_defaults, "growth rates")
+    X = project_features(X0, growth, years).reshape(n * years, len(features))
+    predictions = np.asarray(model.predict(pd.DataFrame(X, columns=features)), dtype=float).reshape(n, years)
+    reference = predictions[:, :1]
+    if np.any(reference <= 0):
+        raise ValueError("Model predicts non-positive emissions for the base year; cannot build a growth index.")
+    return base[:, None] * (predictions / reference)
+
+
+def forecast_frame(matrix, start_year=START_YEAR, entities=None):
+    """Long-format frame (Entity, Year, Emission) from an (N, H) forecast matrix."""
+    n, years = matrix.shape
+    if entities is None:
+        entities = np.arange(n)
+    return pd.DataFrame({
+        "Entity": np.repeat(np.asarray(entities, dtype=object), years),
+        "Year": np.tile(np.arange(start_year, start_year + years), n),
+        "Emission": matrix.ravel()
+    })
+
+
+# --------------------------------
+# Portfolio Forecasting
+# --------------------------------
+# Entity-years above which the work is split across a process pool
+POOL_MIN_ROWS = 200_000
+
+_worker_model = None
+
+
+def _init_worker(model_name, model):
+    global _worker_model
+    from utils.model_registry import get_registry
+    # Workers load by name so mmap artifacts are shared, not pickled per process
+    _worker_model = model if model is not None else get_registry().get_model(model_name)
+
+
+def _forecast_chunk(base, years, base_features, growth_rates):
+    return forecast_matrix(_worker_model, base, years, base_features, growth_rates)
+
+
+def _portfolio_inputs(entities):
+    """Split portfolio entries into names, base totals and per-entity overrides.
+
+    Entries are dicts with `entity`, `emissions` and optional `features` /
+    `growth_rates` dicts; a plain {name: total} mapping is also accepted.
+    """
+    if isinstance(entities, dict):
+        entities = [{"entity": name, "emissions": total} for name, total in entities.items()]
+    names = [e.get("entity", i) for i, e in enumerate(entities)]
+    base = np.array([e["emissions"] for e in entities], dtype=float)
+    features = [e.get("features") or {} for e in entities]
+    growth = [e.get("growth_rates") or {} for e in entities]
+    return names, base, (features if any(features) else None), (growth if any(growth) else None)
+
+
+def forecast_portfolio(entities, years, model=None, model_name="emission", start_year=START_YEAR, n_jobs=1):
+    """Forecast N entities x H years and return one long (Entity, Year, Emission) frame.
+
+    The model runs once over the (N*H, F) matrix. When the portfolio exceeds
+    POOL_MIN_ROWS entity-years and n_jobs != 1, entities are split into
+    chunks that are forecast in a process pool (n_jobs=-1 uses every core).
+    """
+    names, base, features, growth = _portfolio_inputs(entities)
+    if len(base) == 0:
+        return forecast_frame(np.empty((0, years)), start_year, [])
+    workers = (os.cpu_count() or 1) if n_jobs in (-1, None) else n_jobs
+    if workers <= 1 or len(base) * years < POOL_MIN_ROWS:
+        if model is None:
+            from utils.model_registry import get_registry
+            model = get_registry().get_model(model_name)
+        matrix = forecast_matrix(model, base, years, features, growth)
+        return forecast_frame(matrix, start_year, names)
+
+    chunks = np.array_split(np.arange(len(base)), workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_name, model)) as pool:
+        futures = [
+            pool.submit(
+                _forecast_chunk, base[idx], years,
+                None if features is None else [features[i] for i in idx],
+                None if growth is None else [growth[i] for i in idx],
+            )
+            for idx in chunks if len(idx)
+        ]
+        matrix = np.vstack([f.result() for f in futures])
+    return forecast_frame(matrix, start_year, names)
+
+
+# --------------------------------
+# Forecast Uncertainty
+# --------------------------------
+# Default spread (standard deviation) of each sampled annual growth rate
+DEFAULT_GROWTH_SD = {"Population": 0.005, "GDP": 0.01, "Energy Use": 0.0075}
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def per_tree_predictions(model, X):
+    """(n_trees, n_rows) predictions of every tree in a forest."""
+    if hasattr(model, "predict_per_tree"):
+        return model.predict_per_tree(X)
+    estimators = getattr(model, "estimators_", None)
+    if not estimators:
+        raise ValueError("Prediction intervals need a tree ensemble with per-tree predictions.")
+    # Same float32 input the forest's own predict passes to its trees
+    X = np.asarray(X, dtype=np.float32)
+    return np.stack([est.predict(X) for est in estimators])
+
+
+def _sample_predictions(model, features, X0, growth, years):
+    """Per-tree predictions for (S, F) sampled growth rates -> (T, S, H)."""
+    X = project_features(np.broadcast_to(X0, growth.shape), growth, years)
+    predictions = per_tree_predictions(model, pd.DataFrame(X.reshape(-1, len(features)), columns=features))
+    return predictions.reshape(-1, len(growth), years)
+
+
+def _interval_chunk(features, X0, growth, years):
+    return _sample_predictions(_worker_model, features, X0, growth, years)
+
+
+def growth_index_bands(model, years, n_samples=200, base_features=None, growth_rates=None, growth_sd=None,
+                       quantiles=DEFAULT_QUANTILES, seed=0, model_name="emission", n_jobs=1):
+    """Quantiles and mean of the growth index (emissions / current emissions) per year.
+
+    Uncertainty comes from two sources at once: the spread of the forest's
+    trees, and `n_samples` Monte Carlo draws of the annual growth rate of
+    each input (normal around `growth_rates` with `growth_sd`). All trees x
+    samples x years are predicted in one call, or split by sample across a
+    process pool when the rows exceed POOL_MIN_ROWS and n_jobs != 1.
+    Returns (quantiles (Q, H), mean (H,), central (H,)), where `central` is
+    the point forecast's index from the mean growth path.
+    """
+    if years < 1:
+        raise ValueError("years must be at least 1.")
+    features = model_features(model)
+    X0 = _feature_matrix(base_features, features, 1, DEFAULT_BASE_FEATURES, "base features")
+    growth_defaults = {f: DEFAULT_GROWTH_RATES.get(f, 0.0) for f in features}
+    mean_growth = _feature_matrix(growth_rates, features, 1, growth_defaults, "growth rates")
+    sd_defaults = {f: DEFAULT_GROWTH_SD.get(f, 0.0) for f in features}
+    sd = _feature_matrix(growth_sd, features, 1, sd_defaults, "growth spreads")
+    rng = np.random.default_rng(seed)
+    # Sample 0 is the mean path, so the point forecast comes out of the same predict call
+    draws = mean_growth + sd * rng.standard_normal((n_samples, len(features)))
+    growth = np.concatenate([mean_growth, draws])
+
+    workers = (os.cpu_count() or 1) if n_jobs in (-1, None) else n_jobs
+    if workers <= 1 or len(growth) * years < POOL_MIN_ROWS:
+        predictions = _sample_predictions(model, features, X0, growth, years)
+    else:
+        chunks = np.array_split(np.arange(len(growth)), workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_name, model)) as pool:
+            futures = [pool.submit(_interval_chunk, features, X0, growth[idx], years) for idx in chunks if len(idx)]
+            predictions = np.concatenate([f.result() for f in futures], axis=1)
+
+    # Year 0 is identical for every sample, so each tree's own base-year prediction is its reference
+    reference = predictions[:, :1, :1]
+    if np.any(reference <= 0):
+        raise ValueError("Model predicts non-positive emissions for the base year; cannot build a growth index.")
+    central = predictions[:, 0, :].mean(axis=0) / reference.mean()
+    samples = (predictions[:, 1:, :] / reference).reshape(-1, years)
+    return np.quantile(samples, quantiles, axis=0), samples.mean(axis=0), central
+
+
+def interval_frame(base_emissions, bands, start_year=START_YEAR, quantiles=DEFAULT_QUANTILES):
+    """Fan-chart frame: Year, Emission (point), Mean and one P<q> column per quantile."""
+    quantile_index, mean_index, central = bands
+    frame = pd.DataFrame({
+        "Year": np.arange(start_year, start_year + len(central)),
+        "Emission": base_emissions * central,
+        "Mean": base_emissions * mean_index,
+    })
+    for q, row in zip(quantiles, quantile_index):
+        frame[f"P{round(q * 100):g}"] = base_emissions * row
+    return frame
@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# --------------------------------
+# Micro-batching
+# --------------------------------
+class MicroBatcher:
+    """Coalesce concurrent single-item calls into one batched call.
+
+    `submit(item)` returns a Future. A background thread takes the first
+    pending item, keeps collecting until `max_batch` items are queued or
+    `max_wait` seconds have passed, then calls `batch_fn(items)` once and
+    resolves every future with its element of the result. If the batch call
+    fails, items are retried one by one so a bad input only fails its own
+    request. A result count that does not match the batch fails every item.
+    """
+
+    def __init__(self, batch_fn, max_batch=256, max_wait=0.005):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.requests = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed.")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        pending = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(pending) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if pending is None:
+                return
+            pending = [(item, future) for item, future in pending if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            items = [item for item, _ in pending]
+            self.requests += len(items)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(items))
+            try:
+                results = self.batch_fn(items)
+            except Exception:
+                results = None
+            if results is not None:
+                results = list(results)
+                if len(results) != len(pending):
+                    # Results cannot be matched to requests; fail them all rather than leave any unresolved
+                    error = RuntimeError(f"batch_fn returned {len(results)} results for {len(pending)} items.")
+                    for _, future in pending:
+                        future.set_exception(error)
+                    continue
+                for (_, future), result in zip(pending, results):
+                    future.set_result(result)
+                continue
+            for item, future in pending:
+                try:
+                    future.set_result(self.batch_fn([item])[0])
+                except Exception as e:
+                    future.set_exception(e)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
@@ -0,0 +1,275 @@
+import hashlib
+import os
+import sys
+import threading
+
+import joblib
+
+from utils.flat_forest import FlatForest, compile_forest, flatten_forest, is_flat_forest
+
+# --------------------------------
+# Known Model Artifacts
+# --------------------------------
+# name -> path of the artifact on disk (relative to the app root)
+MODEL_ARTIFACTS = {
+    "emission": "models/emission_model.pkl",
+    "co2_forecast": "co2_forecast_model.pkl",
+    "selected_features": "model/selected_features.pkl",
+}
+
+_HASH_BLOCK_SIZE = 1 << 20
+
+# Suffix of the memory-mappable companion written next to each pickle
+MMAP_SUFFIX = ".mmap"
+# Key in the companion holding the sha256 of the pickle it was written from
+SOURCE_HASH_KEY = "source_sha256"
+
+# abspath of companion -> (file states, companion matches its pickle)
+_freshness = {}
+
+
+def file_sha256(path):
+    """Content hash of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# --------------------------------
+# Memory-mapped Artifacts
+# --------------------------------
+def mmap_artifact_path(path):
+    root, _ = os.path.splitext(path)
+    return root + MMAP_SUFFIX
+
+
+def _flatten_artifact(artifact):
+    if isinstance(artifact, dict) and "model" in artifact:
+        flat = dict(artifact)
+        flat["model"] = flatten_forest(artifact["model"], artifact.get("selected_features"))
+        return flat
+    return flatten_forest(artifact)
+
+
+def _write_mmap_artifact(artifact, path):
+    """Write the mmap companion of the pickle at `path`, stamped with the pickle's hash."""
+    flat = _flatten_artifact(artifact)
+    flat[SOURCE_HASH_KEY] = file_sha256(path)
+    mmap_path = mmap_artifact_path(path)
+    joblib.dump(flat, mmap_path)
+    return mmap_path
+
+
+def save_model_artifact(artifact, path):
+    """Save a model (or {'model': ..., ...} bundle) as a pickle plus its mmap companion.
+
+    The pickle is what load_model serves. The companion stores the forest as
+    flat NumPy arrays in the compiled layout, uncompressed, so the
+    single-row compiled backend in every worker process shares one
+    read-only copy through the page cache.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    joblib.dump(artifact, path)
+    return _write_mmap_artifact(artifact, path)
+
+
+def load_artifact(path):
+    """Load an artifact with mmap_mode='r', wrapping flattened forests in a FlatForest."""
+    artifact = joblib.load(path, mmap_mode="r")
+    if is_flat_forest(artifact):
+        return FlatForest(artifact)
+    if isinstance(artifact, dict) and is_flat_forest(artifact.get("model")):
+        artifact = dict(artifact)
+        artifact["model"] = FlatForest(artifact["model"])
+    return artifact
+
+
+def _stored_source_hash(mmap_path):
+    artifact = joblib.load(mmap_path, mmap_mode="r")
+    return artifact.get(SOURCE_HASH_KEY) if isinstance(artifact, dict) else None
+
+
+def resolve_artifact_path(path):
+    """The mmap companion if it was written from the pickle's current content, else the pickle.
+
+    Freshness is checked by content hash, not mtime: a checkout or copy can
+    leave the pickle newer than an up-to-date companion. The result is
+    remembered until either file's mtime or size changes.
+    """
+    mmap_path = mmap_artifact_path(path)
+    try:
+        mmap_stat = os.stat(mmap_path)
+    except FileNotFoundError:
+        return path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return mmap_path
+    state = (stat.st_mtime_ns, stat.st_size, mmap_stat.st_mtime_ns, mmap_stat.st_size)
+    key = os.path.abspath(mmap_path)
+    cached = _freshness.get(key)
+    if cached is None or cached[0] != state:
+        cached = (state, _stored_source_hash(mmap_path) == file_sha256(path))
+        _freshness[key] = cached
+    return mmap_path if cached[1] else path
+
+
+class _Entry:
+    """One loaded artifact plus the file state it was loaded from."""
+
+    def __init__(self, path, mtime_ns, size, sha256, artifact):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.sha256 = sha256
+        self.artifact = artifact
+        # CompiledForest for the model, built on first use
+        self.compiled = None
+
+    @property
+    def key(self):
+        return (self.path, self.mtime_ns, self.sha256)
+
+
+# --------------------------------
+# Registry
+# --------------------------------
+class ModelRegistry:
+    """Process-wide cache of model artifacts.
+
+    Each artifact is unpickled once per process and kept keyed by
+    (path, mtime, content hash). A changed mtime or size triggers a re-hash;
+    the artifact is only reloaded when the content hash actually differs.
+    Models are served as pickled (sklearn forests predict in parallel);
+    `get_compiled` adds the single-row CompiledForest, read from the mmap
+    companion when it is current.
+    """
+
+    def __init__(self, artifacts=None):
+        self._paths = dict(MODEL_ARTIFACTS if artifacts is None else artifacts)
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, path):
+        with self._lock:
+            if self._paths.get(name) != path:
+                self._paths[name] = path
+                self._entries.pop(name, None)
+
+    def names(self):
+        return list(self._paths)
+
+    def path(self, name):
+        if name not in self._paths:
+            raise KeyError(f"Unknown model artifact: {name}")
+        return self._paths[name]
+
+    def _name_lock(self, name):
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _entry(self, name):
+        path = os.path.abspath(self.path(name))
+        stat = os.stat(path)
+        entry = self._entries.get(name)
+        if entry is not None and entry.path == path and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            return entry
+        with self._name_lock(name):
+            entry = self._entries.get(name)
+            if entry is not None and entry.path == path and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                return entry
+            sha256 = file_sha256(path)
+            if entry is not None and entry.path == path and entry.sha256 == sha256:
+                # Touched but not modified: keep the loaded object
+                compiled = entry.compiled
+                entry = _Entry(path, stat.st_mtime_ns, stat.st_size, sha256, entry.artifact)
+                entry.compiled = compiled
+            else:
+                entry = _Entry(path, stat.st_mtime_ns, stat.st_size, sha256, load_artifact(path))
+            self._entries[name] = entry
+            return entry
+
+    def get(self, name):
+        """Raw loaded artifact (estimator, dict or list, as pickled)."""
+        return self._entry(name).artifact
+
+    def get_model(self, name):
+        """Estimator stored under `name`, unwrapping {'model': ...} bundles."""
+        artifact = self.get(name)
+        if isinstance(artifact, dict) and "model" in artifact:
+            return artifact["model"]
+        return artifact
+
+    def _compiled(self, name, entry):
+        if entry.compiled is None:
+            with self._name_lock(name):
+                if entry.compiled is None:
+                    path = self.path(name)
+                    source = resolve_artifact_path(path)
+                    model = entry.artifact if source == path else load_artifact(source)
+                    if isinstance(model, dict):
+                        model = model.get("model")
+                    entry.compiled = compile_forest(model)
+        return entry.compiled
+
+    def get_compiled(self, name):
+        """CompiledForest for the model under `name`, memory-mapped from its companion when current."""
+        return self._compiled(name, self._entry(name))
+
+    def compiled_of(self, model):
+        """CompiledForest for the artifact `model` was loaded from; None if it is not from the registry."""
+        for name, entry in list(self._entries.items()):
+            artifact = entry.artifact
+            if artifact is model or (isinstance(artifact, dict) and artifact.get("model") is model):
+                return self._compiled(name, entry)
+        return None
+
+    def get_features(self, name):
+        """Input feature names for the artifact stored under `name`."""
+        artifact = self.get(name)
+        if isinstance(artifact, dict):
+            if "selected_features" in artifact:
+                return list(artifact["selected_features"])
+            artifact = artifact.get("model")
+        if isinstance(artifact, (list, tuple)):
+            return list(artifact)
+        names = getattr(artifact, "feature_names_in_", None)
+        return list(names) if names is not None else None
+
+    def key(self, name):
+        return self._entry(name).key
+
+    def fingerprint(self, name):
+        return self._entry(name).sha256
+
+    def fingerprint_of(self, model):
+        """Content hash of the artifact `model` was loaded from, if any."""
+        for entry in list(self._entries.values()):
+            artifact = entry.artifact
+            if artifact is model or (isinstance(artifact, dict) and artifact.get("model") is model):
+                return entry.sha256
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_registry = ModelRegistry()
+
+
+def get_registry():
+    return _registry
+
+
+# --------------------------------
+# Export existing pickles: python -m utils.model_registry [name ...]
+# --------------------------------
+if __name__ == "__main__":
+    for name in sys.argv[1:] or ["emission"]:
+        source = MODEL_ARTIFACTS.get(name, name)
+        mmap_path = _write_mmap_artifact(joblib.load(source), source)
+        print(f"✅ Wrote memory-mapped artifact: {mmap_path}")
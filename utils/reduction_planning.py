@@ -0,0 +1,94 @@
+import numpy as np
+
+DEFAULT_COST_PER_TON = {"Electricity": 50, "Transport": 100, "Supply Chain": 75, "Other": 60}
+FALLBACK_COST_PER_TON = 60
+
+# Cap on grid points x sources held in memory at once by cost_curve
+_CURVE_CHUNK_CELLS = 4_000_000
+
+
+def _as_arrays(emissions, costs, min_pct, max_pct):
+    """Broadcast inputs to float arrays; missing or negative emissions abate nothing."""
+    emissions = np.nan_to_num(np.asarray(emissions, dtype=float), nan=0.0).clip(min=0.0)
+    shape = emissions.shape
+    costs = np.broadcast_to(np.asarray(costs, dtype=float), shape)
+    lo = np.broadcast_to(np.asarray(min_pct, dtype=float), shape).clip(0.0, 100.0)
+    hi = np.maximum(np.broadcast_to(np.asarray(max_pct, dtype=float), shape).clip(0.0, 100.0), lo)
+    return emissions, costs, lo, hi
+
+
+# --------------------------------
+# Cost vs. Reduction Curve
+# --------------------------------
+def cost_curve(emissions, costs, min_pct=0, max_pct=100, steps=101):
+    """Total cost and tons reduced when every source is cut by the same percentage.
+
+    Sweeps `steps` percentages from 0 to 100; each source's cut is clipped to
+    its own [min_pct, max_pct]. Returns (pcts, total_cost, total_reduced).
+    """
+    emissions, costs, lo, hi = _as_arrays(emissions, costs, min_pct, max_pct)
+    pcts = np.linspace(0.0, 100.0, steps)
+    cost_per_pct = emissions * costs / 100
+    tons_per_pct = emissions / 100
+    total_cost = np.empty(steps)
+    total_reduced = np.empty(steps)
+    chunk = max(1, _CURVE_CHUNK_CELLS // max(1, emissions.size))
+    for start in range(0, steps, chunk):
+        used = np.clip(pcts[start:start + chunk, None], lo, hi)
+        total_cost[start:start + chunk] = used @ cost_per_pct
+        total_reduced[start:start + chunk] = used @ tons_per_pct
+    return pcts, total_cost, total_reduced
+
+
+def abatement_frontier(emissions, costs, min_pct=0, max_pct=100):
+    """Least-cost (cumulative cost, cumulative tons) curve: the marginal abatement cost curve.
+
+    Starts at the mandatory minimum cuts, then adds each source's remaining
+    headroom cheapest-first. Every plan on this piecewise-linear curve is the
+    most tons any spend can buy under the constraints.
+    """
+    emissions, costs, lo, hi = _as_arrays(emissions, costs, min_pct, max_pct)
+    base_tons = emissions * lo / 100
+    headroom = emissions * (hi - lo) / 100
+    order = np.argsort(costs, kind="stable")
+    tons = np.concatenate([[base_tons.sum()], headroom[order]]).cumsum()
+    spend = np.concatenate([[(base_tons * costs).sum()], (headroom * costs)[order]]).cumsum()
+    return spend, tons
+
+
+# --------------------------------
+# Budget Optimization
+# --------------------------------
+def optimize_budget(emissions, costs, budget, min_pct=0, max_pct=100):
+    """Most tons CO₂e reduced for `budget`, honouring per-source min/max cuts.
+
+    The linear program "maximise tons s.t. spend <= budget, min <= cut <=
+    max" is a fractional knapsack, so filling headroom cheapest-first and
+    splitting the last source is exactly optimal. If the minimum cuts alone
+    exceed the budget, the minimum plan is returned with `feasible` False.
+    """
+    emissions, costs, lo, hi = _as_arrays(emissions, costs, min_pct, max_pct)
+    base_tons = emissions * lo / 100
+    base_cost = float((base_tons * costs).sum())
+    headroom = emissions * (hi - lo) / 100
+    extra = np.zeros_like(emissions)
+    remaining = budget - base_cost
+    if remaining > 0 and emissions.size:
+        order = np.argsort(costs, kind="stable")
+        spend = headroom[order] * costs[order]
+        spent_before = np.concatenate([[0.0], spend.cumsum()[:-1]])
+        affordable = np.clip(remaining - spent_before, 0.0, None)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Free sources (cost <= 0) are always taken in full
+            bought = np.where(costs[order] > 0, np.minimum(headroom[order], affordable / costs[order]), headroom[order])
+        extra[order] = bought
+    tons = base_tons + extra
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(emissions > 0, tons / emissions * 100, 0.0)
+    return {
+        "pct": pct,
+        "tons": tons,
+        "total_reduced": float(tons.sum()),
+        "total_cost": float((tons * costs).sum()),
+        "feasible": base_cost <= budget,
+    }
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email.message import EmailMessage
+
+from fpdf import FPDF
+
+from utils.storage import _atomic_write_json, _read_json
+
+# Reports below this count render inline; process start-up costs more than it saves
+POOL_MIN_REPORTS = 8
+
+# Bump when the PDF layout changes so every report is re-rendered and re-sent
+REPORT_TEMPLATE_VERSION = 1
+REPORT_MANIFEST_FILE = "report_manifest.json"
+
+
+# --------------------------------
+# PDF Rendering (in memory)
+# --------------------------------
+def generate_pdf_report(company, emission_sources):
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=14)
+    # Core fonts are latin-1 only, so "CO2" rather than "CO₂"
+    pdf.cell(0, 10, f"CO2 Emission Report: {company}", ln=True, align="C")
+    pdf.ln(5)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 10, "Emission Sources:", ln=True)
+    pdf.set_font("Arial", size=10)
+    for src in emission_sources:
+        pdf.cell(0, 8, f"- {src['type']}: {src['emission']} tons CO2e", ln=True)
+    pdf.ln(5)
+    return pdf
+
+
+def render_pdf_bytes(company, emission_sources):
+    """Render a company report straight to bytes (no temp file)."""
+    out = generate_pdf_report(company, emission_sources).output(dest="S")
+    # fpdf 1.x returns a latin-1 str, fpdf2 a bytearray
+    return out.encode("latin-1") if isinstance(out, str) else bytes(out)
+
+
+def _render_job(job):
+    return render_pdf_bytes(job[0], job[1])
+
+
+def render_reports(items, workers=None):
+    """Render (company, emission_sources) pairs, in a process pool when worthwhile."""
+    items = list(items)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(items) < POOL_MIN_REPORTS:
+        return [_render_job(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render_job, items, chunksize=max(1, len(items) // (workers * 4))))
+
+
+# --------------------------------
+# Pooled SMTP Delivery
+# --------------------------------
+class SMTPPool:
+    """Persistent SMTP connections, one per sending thread.
+
+    Each connection logs in once and is reused for every message that thread
+    sends. Transient failures (dropped connections, 4xx replies) are retried
+    with exponential backoff and jitter on a fresh connection; permanent
+    5xx rejections are not retried.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 retries=3, backoff=0.5, timeout=30, smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.retried = 0
+
+    def _connect(self):
+        server = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        with self._lock:
+            self._connections.append(server)
+            self.connects += 1
+        return server
+
+    def _drop(self, server):
+        with self._lock:
+            if server in self._connections:
+                self._connections.remove(server)
+        try:
+            server.close()
+        except Exception:
+            pass
+        self._local.server = None
+
+    def send(self, msg):
+        for attempt in range(self.retries + 1):
+            server = getattr(self._local, "server", None)
+            try:
+                if server is None:
+                    server = self._local.server = self._connect()
+                server.send_message(msg)
+                return attempt
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code >= 500 or attempt == self.retries:
+                    raise
+                if server is not None:
+                    self._drop(server)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                if server is not None:
+                    self._drop(server)
+                if attempt == self.retries:
+                    raise
+            self.retried += 1
+            time.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for server in connections:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+
+def build_message(sender, to_email, company, pdf_bytes):
+    msg = EmailMessage()
+    msg["Subject"] = f"CO₂ Emission Report for {company}"
+    msg["From"] = sender
+    msg["To"] = to_email
+    msg.set_content(f"Attached is your latest CO₂ emission report for {company}.")
+    msg.add_attachment(pdf_bytes, maintype="application", subtype="pdf", filename=f"report_{company}.pdf")
+    return msg
+
+
+# --------------------------------
+# Change Manifest
+# --------------------------------
+def content_hash(company, emission_sources):
+    """SHA-256 of everything that goes into a company's report."""
+    payload = json.dumps([REPORT_TEMPLATE_VERSION, company, emission_sources], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path=REPORT_MANIFEST_FILE):
+    """{"deliveries": {email: {company: hash last sent}}}; empty when missing."""
+    manifest = _read_json(path, {})
+    manifest.setdefault("deliveries", {})
+    return manifest
+
+
+def save_manifest(manifest, path=REPORT_MANIFEST_FILE):
+    _atomic_write_json(path, manifest)
+
+
+# --------------------------------
+# Report Pipeline
+# --------------------------------
+def build_jobs(users, companies):
+    """(username, email, company, emission_sources) for users whose company has data."""
+    jobs = []
+    for username, info in users.items():
+        emission_sources = companies.get(info["company"], [])
+        if emission_sources:
+            jobs.append((username, info["email"], info["company"], emission_sources))
+    return jobs
+
+
+def run_report_pipeline(users, companies, pool, sender, render_workers=None, connections=4, manifest=None,
+                        force=False, log=print):
+    """Render reports in memory, then send over `connections` pooled SMTP sessions.
+
+    Each company is rendered once however many users share it. With a
+    `manifest`, recipients who were already sent the current content of
+    their company's report are skipped (unless `force`), and successful
+    deliveries are recorded in it; other entries are left as they are.
+    Returns per-stage timings, throughput and failures; a failed delivery is
+    reported and does not stop the rest.
+    """
+    timings = {}
+    start = time.perf_counter()
+    jobs = build_jobs(users, companies)
+    hashes = {company: content_hash(company, sources) for _, _, company, sources in jobs}
+    planned = len(jobs)
+    if manifest is not None and not force:
+        deliveries = manifest["deliveries"]
+        jobs = [job for job in jobs if deliveries.get(job[1], {}).get(job[2]) != hashes[job[2]]]
+    timings["plan"] = time.perf_counter() - start
+
+    # SMTP sessions are closed even when rendering or a send raises
+    try:
+        start = time.perf_counter()
+        unique = {company: sources for _, _, company, sources in jobs}
+        rendered = render_reports(unique.items(), render_workers)
+        pdfs = dict(zip(unique, rendered))
+        timings["render"] = time.perf_counter() - start
+
+        def deliver(job):
+            username, email, company, _ = job
+            pool.send(build_message(sender, email, company, pdfs[company]))
+            log(f"Sent report to {email} for {company}")
+
+        start = time.perf_counter()
+        failures = []
+        with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+            futures = [(job, executor.submit(deliver, job)) for job in jobs]
+            for job, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append({"username": job[0], "email": job[1], "error": str(e)})
+                    log(f"❌ Failed to send report to {job[1]}: {e}")
+                    continue
+                if manifest is not None:
+                    manifest["deliveries"].setdefault(job[1], {})[job[2]] = hashes[job[2]]
+    finally:
+        pool.close()
+    timings["send"] = time.perf_counter() - start
+
+    sent = len(jobs) - len(failures)
+    total = sum(timings.values())
+    return {
+        "reports": len(jobs),
+        "sent": sent,
+        "skipped_unchanged": planned - len(jobs),
+        "renders": len(unique),
+        "failed": failures,
+        "timings": timings,
+        "renders_per_sec": len(unique) / timings["render"] if timings["render"] else 0.0,
+        "emails_per_sec": sent / timings["send"] if timings["send"] else 0.0,
+        "total_seconds": total,
+        "smtp_connections": pool.connects,
+        "smtp_retries": pool.retried,
+    }
@@ -0,0 +1,358 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+from utils.audit_log import AUDIT_LOG_FILE, AuditLog
+
+# Legacy JSON files written by api_server.py
+DATA_FILE = "api_emission_data.json"
+API_LOG_FILE = "api_log.json"
+DB_FILE = "api_emission_data.db"
+
+
+def _log_entry(username, company, emission_sources, timestamp=None):
+    return {
+        "timestamp": timestamp or datetime.utcnow().isoformat(),
+        "username": username,
+        "company": company,
+        "emission_sources": emission_sources
+    }
+
+
+def _atomic_write_json(path, obj):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --------------------------------
+# JSON Backend (legacy files)
+# --------------------------------
+class JSONStore:
+    """Whole-file JSON storage for emission data, as api_server.py always used.
+
+    Data writes are atomic (temp file + rename) and serialized within the
+    process, but every update still rewrites the full data file; use
+    SQLiteStore for concurrent or high-volume deployments. The update log is
+    an append-only, rotated JSON-lines AuditLog; a legacy api_log.json array
+    is imported into it on first use.
+    """
+
+    backend = "json"
+
+    def __init__(self, data_file=DATA_FILE, log_file=AUDIT_LOG_FILE, legacy_log_file=API_LOG_FILE):
+        self.data_file = data_file
+        self.log = AuditLog(log_file)
+        self._lock = threading.Lock()
+        if legacy_log_file and not self.log.segments():
+            for entry in read_legacy_log(legacy_log_file):
+                self.log.append(entry)
+
+    def all_companies(self):
+        return _read_json(self.data_file, {})
+
+    def get_company(self, company):
+        return self.all_companies().get(company)
+
+    def company_version(self, company):
+        """Change token for a company; any write to the data file changes it."""
+        try:
+            stat = os.stat(self.data_file)
+        except FileNotFoundError:
+            return None
+        return f"{stat.st_mtime_ns}.{stat.st_size}.{stat.st_ino}"
+
+    def update(self, username, company, emission_sources):
+        with self._lock:
+            data = self.all_companies()
+            data[company] = emission_sources
+            _atomic_write_json(self.data_file, data)
+            self.log.append(_log_entry(username, company, emission_sources))
+
+    def update_many(self, username, updates):
+        """Apply (company, emission_sources) pairs with one data-file write."""
+        with self._lock:
+            data = self.all_companies()
+            timestamp = datetime.utcnow().isoformat()
+            for company, emission_sources in updates:
+                data[company] = emission_sources
+            _atomic_write_json(self.data_file, data)
+            self.log.extend([_log_entry(username, c, e, timestamp=timestamp) for c, e in updates])
+
+    def query_log(self, username=None, company=None, since=None, until=None, offset=0, limit=None):
+        return self.log.query(username, company, since, until, offset, limit)
+
+    def count_log(self, username=None, company=None, since=None, until=None):
+        return self.log.count(username, company, since, until)
+
+    def log_companies(self):
+        return self.log.companies()
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def read_legacy_log(path):
+    """Entries of a legacy api_log.json array (empty if the file is missing)."""
+    return _read_json(path, [])
+
+
+# --------------------------------
+# SQLite Backend (WAL)
+# --------------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    company TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS emission_sources (
+    company TEXT NOT NULL REFERENCES companies(company) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    type TEXT,
+    emission REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (company, position)
+);
+CREATE TABLE IF NOT EXISTS api_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    username TEXT NOT NULL,
+    company TEXT NOT NULL,
+    emission_sources TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_api_log_username ON api_log(username, id);
+CREATE INDEX IF NOT EXISTS idx_api_log_company ON api_log(company, id);
+CREATE INDEX IF NOT EXISTS idx_api_log_timestamp ON api_log(timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStore:
+    """Embedded SQLite storage in WAL mode.
+
+    Emission sources are stored one row per source, indexed by company; the
+    update log is an append-only table. Each update is one transaction, so
+    concurrent writers (threads or processes) never lose each other's data.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, db_file=DB_FILE):
+        self.db_file = db_file
+        self._local = threading.local()
+        with self._connect(write=True) as conn:
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            # Identifies this database: log ids are only comparable within one epoch
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('log_epoch', ?)", (uuid.uuid4().hex[:12],))
+            self.log_epoch = conn.execute("SELECT value FROM meta WHERE key = 'log_epoch'").fetchone()[0]
+
+    def _connect(self, write=False):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return _Transaction(conn, write)
+
+    def all_companies(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT company, source FROM emission_sources ORDER BY company, position").fetchall()
+            empty = conn.execute(
+                "SELECT company FROM companies WHERE company NOT IN (SELECT DISTINCT company FROM emission_sources)"
+            ).fetchall()
+        data = {company: [] for (company,) in empty}
+        for company, source in rows:
+            data.setdefault(company, []).append(json.loads(source))
+        return data
+
+    def get_company(self, company):
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM companies WHERE company = ?", (company,)).fetchone() is None:
+                return None
+            rows = conn.execute(
+                "SELECT source FROM emission_sources WHERE company = ? ORDER BY position", (company,)
+            ).fetchall()
+        return [json.loads(source) for (source,) in rows]
+
+    def company_version(self, company):
+        """Per-company counter incremented by every update (None if unknown)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM companies WHERE company = ?", (company,)).fetchone()
+        return None if row is None else row[0]
+
+    def _upsert(self, conn, company, emission_sources, timestamp):
+        conn.execute(
+            "INSERT INTO companies (company, version, updated_at) VALUES (?, 1, ?) "
+            "ON CONFLICT(company) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+            (company, timestamp)
+        )
+        conn.execute("DELETE FROM emission_sources WHERE company = ?", (company,))
+        conn.executemany(
+            "INSERT INTO emission_sources (company, position, type, emission, source) VALUES (?, ?, ?, ?, ?)",
+            [(company, i, src.get("type"), src.get("emission"), json.dumps(src)) for i, src in enumerate(emission_sources)]
+        )
+
+    def _insert_log(self, conn, entry):
+        conn.execute(
+            "INSERT INTO api_log (timestamp, username, company, emission_sources) VALUES (?, ?, ?, ?)",
+            (entry["timestamp"], entry["username"], entry["company"], json.dumps(entry["emission_sources"]))
+        )
+
+    def update(self, username, company, emission_sources):
+        entry = _log_entry(username, company, emission_sources)
+        with self._connect(write=True) as conn:
+            self._upsert(conn, company, emission_sources, entry["timestamp"])
+            self._insert_log(conn, entry)
+
+    def update_many(self, username, updates):
+        """Apply (company, emission_sources) pairs in a single transaction."""
+        timestamp = datetime.utcnow().isoformat()
+        with self._connect(write=True) as conn:
+            for company, emission_sources in updates:
+                self._upsert(conn, company, emission_sources, timestamp)
+                self._insert_log(conn, _log_entry(username, company, emission_sources, timestamp=timestamp))
+
+    def _log_filter(self, username, company, since, until):
+        clauses, params = [], []
+        for column, op, value in (("username", "=", username), ("company", "=", company),
+                                  ("timestamp", ">=", since), ("timestamp", "<", until)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def query_log(self, username=None, company=None, since=None, until=None, offset=0, limit=None):
+        where, params = self._log_filter(username, company, since, until)
+        params += [-1 if limit is None else limit, offset]
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT timestamp, username, company, emission_sources FROM api_log {where} ORDER BY id LIMIT ? OFFSET ?",
+                params
+            ).fetchall()
+        return [_log_entry(u, c, json.loads(s), timestamp=t) for t, u, c, s in rows]
+
+    def count_log(self, username=None, company=None, since=None, until=None):
+        where, params = self._log_filter(username, company, since, until)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM api_log {where}", params).fetchone()[0]
+
+    def log_companies(self):
+        with self._connect() as conn:
+            return [c for (c,) in conn.execute("SELECT DISTINCT company FROM api_log ORDER BY company")]
+
+    def last_log_id(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM api_log").fetchone()[0]
+
+    def log_after(self, log_id, limit):
+        """Log entries with id > log_id in commit order, each with its id as `seq`."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, timestamp, username, company, emission_sources FROM api_log WHERE id > ? ORDER BY id LIMIT ?",
+                (log_id, limit)
+            ).fetchall()
+        return [dict(seq=i, **_log_entry(u, c, json.loads(e), timestamp=t)) for i, t, u, c, e in rows]
+
+    def import_json(self, data, logs):
+        """Load legacy JSON content in one transaction (used by the migration tool).
+
+        The transaction also records the import in `meta`, so a second call
+        (a rerun, or another worker starting at the same time) imports nothing
+        and returns False.
+        """
+        with self._connect(write=True) as conn:
+            if not conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                                (datetime.utcnow().isoformat(),)).rowcount:
+                return False
+            now = datetime.utcnow().isoformat()
+            for company, emission_sources in data.items():
+                self._upsert(conn, company, emission_sources, now)
+            for entry in logs:
+                self._insert_log(conn, entry)
+        return True
+
+
+class _Transaction:
+    """`with` block running BEGIN ... COMMIT/ROLLBACK on a connection.
+
+    Writers take the lock up front (BEGIN IMMEDIATE) so two concurrent
+    updates serialize instead of failing on lock upgrade.
+    """
+
+    def __init__(self, conn, write):
+        self.conn = conn
+        self.write = write
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE" if self.write else "BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+# --------------------------------
+# Backend Selection & Migration
+# --------------------------------
+def migrate_json_to_sqlite(data_file=DATA_FILE, log_file=API_LOG_FILE, db_file=DB_FILE):
+    """Import legacy JSON data plus a JSON-array or JSON-lines log into SQLite.
+
+    Returns the (companies, log entries) imported, or None when the database
+    has already been migrated.
+    """
+    data = _read_json(data_file, {})
+    if log_file.endswith(".json"):
+        logs = read_legacy_log(log_file)
+    else:
+        logs = AuditLog(log_file).query()
+    if not SQLiteStore(db_file).import_json(data, logs):
+        return None
+    return len(data), len(logs)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(backend=None):
+    """Process-wide store selected by EMISSION_STORE_BACKEND ('sqlite' or 'json')."""
+    backend = backend or os.environ.get("EMISSION_STORE_BACKEND", "sqlite")
+    with _stores_lock:
+        if backend not in _stores:
+            if backend == "json":
+                _stores[backend] = JSONStore()
+            elif backend == "sqlite":
+                db_file = os.environ.get("EMISSION_DB_FILE", DB_FILE)
+                fresh = not os.path.exists(db_file)
+                _stores[backend] = SQLiteStore(db_file)
+                if fresh and any(os.path.exists(p) for p in (DATA_FILE, API_LOG_FILE, AUDIT_LOG_FILE)):
+                    # First start after upgrading: carry over the JSON history
+                    log_file = API_LOG_FILE if os.path.exists(API_LOG_FILE) else AUDIT_LOG_FILE
+                    migrate_json_to_sqlite(log_file=log_file, db_file=db_file)
+            else:
+                raise ValueError(f"Unknown storage backend: {backend}")
+        return _stores[backend]
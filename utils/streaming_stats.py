@@ -0,0 +1,458 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows read per chunk; a chunk is the only part of the file held in memory
+DEFAULT_CHUNK_ROWS = 200_000
+# Quantile sketch accuracy: rank error is roughly 1.7 / k of the row count
+DEFAULT_SKETCH_K = 400
+# Rows kept in the uniform reservoir sample used for plots
+DEFAULT_SAMPLE_ROWS = 5_000
+# Files above this size are split across a process pool when n_jobs != 1
+POOL_MIN_BYTES = 64 << 20
+# Largest file, in bytes on disk, that is loaded into a DataFrame; larger files
+# are summarised by streaming. File size stands in for "fits in memory": a CSV
+# usually takes 2-5x its size once parsed, so the 1 GB default suits a host
+# with several GB free. Set IN_MEMORY_MAX_BYTES to match the host, or pass
+# max_bytes to fits_in_memory.
+DEFAULT_IN_MEMORY_MAX_BYTES = 1 << 30
+IN_MEMORY_MAX_BYTES = int(os.environ.get("IN_MEMORY_MAX_BYTES", DEFAULT_IN_MEMORY_MAX_BYTES))
+
+_MIN_CAPACITY = 8
+
+
+def fits_in_memory(path, max_bytes=None):
+    """Whether `path` is small enough to load; `max_bytes` defaults to IN_MEMORY_MAX_BYTES."""
+    return os.path.getsize(path) <= (IN_MEMORY_MAX_BYTES if max_bytes is None else max_bytes)
+
+
+def _is_parquet(path):
+    return str(path).lower().endswith((".parquet", ".pq"))
+
+
+# --------------------------------
+# Quantile Sketch
+# --------------------------------
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang & Liberty's KLL).
+
+    Level h holds items of weight 2**h. A level over capacity is sorted and
+    every other item, from a random offset, is promoted to the next level,
+    so the sketch stays O(k) items however many values it has seen. Until
+    the first compaction every value is kept and quantiles are exact.
+    """
+
+    def __init__(self, k=DEFAULT_SKETCH_K, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(_MIN_CAPACITY, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if items.size > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind at its own weight
+                leftover = items.size % 2
+                self.levels[level] = items[items.size - leftover:]
+                promoted = items[self._rng.integers(2):items.size - leftover:2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.levels[0] = np.concatenate([self.levels[0], values])
+            self.n += values.size
+            self._compress()
+        return self
+
+    def merge(self, other):
+        self.levels += [np.empty(0)] * (len(other.levels) - len(self.levels))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def weighted_items(self):
+        """(sorted items, their weights)."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        q = np.asarray(q, dtype=np.float64)
+        if self.n == 0:
+            return np.full(q.shape, np.nan)
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], q)
+        items, weights = self.weighted_items()
+        cumulative = np.cumsum(weights)
+        idx = np.searchsorted(cumulative, q * cumulative[-1], side="left")
+        return items[np.clip(idx, 0, len(items) - 1)]
+
+
+# --------------------------------
+# Mergeable Statistics
+# --------------------------------
+def _chan_merge(n_a, mean_a, n_b, mean_b):
+    """Combined count, mean and the cross-term weight of Chan et al.'s parallel update."""
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.where(n > 0, n_b / n, 0.0)
+    return n, mean_a + delta * fraction, n_a * fraction, delta
+
+
+class StreamingStats:
+    """One-pass, mergeable summary of the numeric columns of a table.
+
+    Feed it DataFrame chunks with `update` and combine partial results from
+    other chunks or processes with `merge`. It tracks count, mean, variance,
+    min/max, KLL quantile sketches, optional fixed-edge histograms, a
+    uniform reservoir sample, pairwise-complete co-moments (for `cov` and
+    `corr`, matching pandas) and co-moments over rows complete in every
+    column (for `vif`). Sums are centred per chunk and combined with Chan's
+    update, so large magnitudes such as GDP do not lose precision.
+    """
+
+    def __init__(self, columns, sketch_k=DEFAULT_SKETCH_K, bins=None, sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+        self.columns = [str(c) for c in columns]
+        k = len(self.columns)
+        self.rows = 0
+        # Pairwise-complete moments: entry [i, j] describes column i over rows where i and j are present
+        self.pair_n = np.zeros((k, k))
+        self.pair_mean = np.zeros((k, k))
+        self.pair_m2 = np.zeros((k, k))
+        self.pair_c = np.zeros((k, k))
+        # Listwise-complete moments
+        self.complete_n = 0.0
+        self.complete_mean = np.zeros(k)
+        self.complete_c = np.zeros((k, k))
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+        rng = np.random.default_rng(seed)
+        self.sketches = [KLLSketch(sketch_k, rng.integers(2 ** 32)) for _ in self.columns]
+        self.bins = {c: np.asarray(e, dtype=np.float64) for c, e in (bins or {}).items()}
+        self.hist_counts = {c: np.zeros(len(e) - 1) for c, e in self.bins.items()}
+        self.sample_rows = sample_rows
+        self._sample = None
+        self._sample_keys = np.empty(0)
+        self._rng = np.random.default_rng(rng.integers(2 ** 32))
+
+    # ---------- Accumulation ----------
+    def _numeric(self, frame):
+        return np.column_stack([
+            pd.to_numeric(frame[c], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan) for c in self.columns
+        ]) if self.columns else np.empty((len(frame), 0))
+
+    def update(self, frame):
+        """Add a chunk of rows (a DataFrame containing at least `columns`)."""
+        if len(frame) == 0:
+            return self
+        X = self._numeric(frame)
+        present = ~np.isnan(X)
+        self._update_moments(X, present)
+        self.min = np.fmin(self.min, np.min(X, axis=0, initial=np.inf, where=present))
+        self.max = np.fmax(self.max, np.max(X, axis=0, initial=-np.inf, where=present))
+        for sketch, values in zip(self.sketches, X.T):
+            sketch.update(values)
+        for col, edges in self.bins.items():
+            values = X[:, self.columns.index(col)]
+            self.hist_counts[col] += np.histogram(values[~np.isnan(values)], bins=edges)[0]
+        self._update_sample(frame)
+        self.rows += len(frame)
+        return self
+
+    def _update_moments(self, X, present):
+        mask = present.astype(np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            shift = np.nan_to_num(np.nanmean(np.where(present, X, np.nan), axis=0))
+        Z = np.where(present, X - shift, 0.0)
+        n = mask.T @ mask
+        S = Z.T @ mask
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, S / n, 0.0)
+            m2 = np.where(n > 0, (Z * Z).T @ mask - S * mean, 0.0)
+            c = np.where(n > 0, Z.T @ Z - S * mean.T, 0.0)
+        self._merge_pairwise(n, mean + shift[:, None], m2, c)
+
+        complete = present.all(axis=1)
+        if complete.any():
+            Xc = X[complete]
+            mean_c = Xc.mean(axis=0)
+            D = Xc - mean_c
+            self._merge_complete(float(complete.sum()), mean_c, D.T @ D)
+
+    def _merge_pairwise(self, n_b, mean_b, m2_b, c_b):
+        n, mean, weight, delta = _chan_merge(self.pair_n, self.pair_mean, n_b, mean_b)
+        self.pair_m2 = self.pair_m2 + m2_b + delta ** 2 * weight
+        self.pair_c = self.pair_c + c_b + delta * delta.T * weight
+        self.pair_n, self.pair_mean = n, mean
+
+    def _merge_complete(self, n_b, mean_b, c_b):
+        n, mean, weight, delta = _chan_merge(self.complete_n, self.complete_mean, n_b, mean_b)
+        self.complete_c = self.complete_c + c_b + np.outer(delta, delta) * weight
+        self.complete_n, self.complete_mean = float(n), mean
+
+    def _update_sample(self, frame):
+        if not self.sample_rows:
+            return
+        keys = self._rng.random(len(frame))
+        self._merge_sample(frame.reset_index(drop=True), keys)
+
+    def _merge_sample(self, frame, keys):
+        # Reservoir as "the rows with the smallest random keys": mergeable across chunks and processes
+        if self._sample is not None:
+            frame = pd.concat([self._sample, frame], ignore_index=True)
+            keys = np.concatenate([self._sample_keys, keys])
+        if len(keys) > self.sample_rows:
+            keep = np.sort(np.argpartition(keys, self.sample_rows)[:self.sample_rows])
+            frame, keys = frame.iloc[keep].reset_index(drop=True), keys[keep]
+        self._sample, self._sample_keys = frame, keys
+
+    def merge(self, other):
+        """Fold in another partial result over the same columns."""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge statistics over different columns.")
+        self._merge_pairwise(other.pair_n, other.pair_mean, other.pair_m2, other.pair_c)
+        if other.complete_n:
+            self._merge_complete(other.complete_n, other.complete_mean, other.complete_c)
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        for sketch, theirs in zip(self.sketches, other.sketches):
+            sketch.merge(theirs)
+        for col, counts in other.hist_counts.items():
+            self.hist_counts[col] = self.hist_counts.get(col, 0) + counts
+        if other._sample is not None and self.sample_rows:
+            self._merge_sample(other._sample, other._sample_keys)
+        self.rows += other.rows
+        return self
+
+    # ---------- Results ----------
+    @property
+    def count(self):
+        return pd.Series(np.diag(self.pair_n), index=self.columns)
+
+    @property
+    def mean(self):
+        return pd.Series(np.where(np.diag(self.pair_n) > 0, np.diag(self.pair_mean), np.nan), index=self.columns)
+
+    def var(self, ddof=1):
+        n = np.diag(self.pair_n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return pd.Series(np.where(n > ddof, np.diag(self.pair_m2) / (n - ddof), np.nan), index=self.columns)
+
+    def std(self, ddof=1):
+        return np.sqrt(self.var(ddof))
+
+    def quantiles(self, q=(0.25, 0.5, 0.75)):
+        """Approximate quantiles as a (len(q), columns) frame."""
+        return pd.DataFrame({c: s.quantile(q) for c, s in zip(self.columns, self.sketches)}, index=list(q))
+
+    def describe(self):
+        """Same layout as `DataFrame.describe()` for numeric columns."""
+        n = np.diag(self.pair_n)
+        q = self.quantiles()
+        q.index = [f"{p:.0%}" for p in q.index]
+        summary = pd.DataFrame({
+            "count": n,
+            "mean": self.mean.to_numpy(),
+            "std": self.std().to_numpy(),
+            "min": np.where(n > 0, self.min, np.nan),
+        }, index=self.columns).T
+        maximum = pd.DataFrame([np.where(n > 0, self.max, np.nan)], index=["max"], columns=self.columns)
+        return pd.concat([summary, q, maximum])
+
+    def cov(self, ddof=1):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = np.where(self.pair_n > ddof, self.pair_c / (self.pair_n - ddof), np.nan)
+        return pd.DataFrame(cov, index=self.columns, columns=self.columns)
+
+    def corr(self):
+        """Pearson correlation over pairwise-complete rows, like `DataFrame.corr()`."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.pair_c / np.sqrt(self.pair_m2 * self.pair_m2.T)
+        corr = np.where(self.pair_n > 1, np.clip(corr, -1.0, 1.0), np.nan)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def histogram(self, column, bins=50):
+        """(counts, edges): exact for columns given fixed `bins` up front, else from the quantile sketch."""
+        if column in self.hist_counts:
+            return self.hist_counts[column], self.bins[column]
+        i = self.columns.index(column)
+        items, weights = self.sketches[i].weighted_items()
+        if not items.size:
+            return np.zeros(bins), np.linspace(0.0, 1.0, bins + 1)
+        return np.histogram(items, bins=bins, range=(self.min[i], self.max[i]), weights=weights)
+
+    def regression(self, x, y):
+        """Least-squares (slope, intercept, r) of y on x over rows where both are present."""
+        i, j = self.columns.index(x), self.columns.index(y)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            slope = self.pair_c[i, j] / self.pair_m2[i, j]
+        return slope, self.pair_mean[j, i] - slope * self.pair_mean[i, j], self.corr().iat[i, j]
+
+    def vif(self, columns=None, centered=True):
+        """Variance inflation factors over rows complete in every tracked column.
+
+        The diagonal of the inverse correlation matrix, which equals the
+        with-intercept VIF that `data_preparation.calculate_vif` gets from
+        statsmodels. `centered=False` regresses without an intercept.
+        """
+        columns = list(columns or self.columns)
+        idx = [self.columns.index(c) for c in columns]
+        gram = self.complete_c[np.ix_(idx, idx)]
+        if not centered:
+            mean = self.complete_mean[idx]
+            gram = gram + self.complete_n * np.outer(mean, mean)
+        # VIF is scale-invariant; normalising first keeps the inverse well conditioned
+        scale = np.sqrt(np.diag(gram))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            normalised = gram / np.outer(scale, scale)
+        try:
+            vif = np.diag(np.linalg.inv(normalised))
+        except np.linalg.LinAlgError:
+            vif = np.full(len(columns), np.inf)
+        return pd.DataFrame({"Feature": columns, "VIF": vif})
+
+    @property
+    def sample(self):
+        """Uniform random sample of up to `sample_rows` rows with every column of the file."""
+        if self._sample is None:
+            return pd.DataFrame(columns=self.columns)
+        return self._sample
+
+
+# --------------------------------
+# Chunked Readers
+# --------------------------------
+class _ByteRange(io.RawIOBase):
+    """Read-only view of bytes [start, end) of a file."""
+
+    def __init__(self, path, start, end):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        remaining = self._end - self._file.tell()
+        if remaining <= 0:
+            return 0
+        view = memoryview(buffer)[:remaining]
+        return self._file.readinto(view)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _csv_ranges(path, parts):
+    """Split a CSV's data rows into up to `parts` byte ranges on line boundaries."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        f.readline()
+        bounds = [f.tell()]
+        for i in range(1, parts):
+            f.seek(max(bounds[0] + (size - bounds[0]) * i // parts, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def iter_chunks(path, unit=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """DataFrame chunks of a CSV or Parquet file.
+
+    `unit` restricts reading to a list of Parquet row groups or a CSV
+    (start, end) byte range from `_csv_ranges`. Byte ranges assume no quoted
+    field spans a line break.
+    """
+    if _is_parquet(path):
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=chunk_rows, row_groups=unit):
+            yield pa.Table.from_batches([batch]).to_pandas()
+        return
+    if unit is None:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+        return
+    names = pd.read_csv(path, nrows=0).columns
+    with io.BufferedReader(_ByteRange(path, *unit)) as f:
+        yield from pd.read_csv(f, header=None, names=names, chunksize=chunk_rows)
+
+
+def numeric_columns(path):
+    """Numeric columns of a file, from the Parquet schema or the first CSV rows."""
+    if _is_parquet(path):
+        schema = pq.read_schema(path)
+        return [f.name for f in schema if pa.types.is_integer(f.type) or pa.types.is_floating(f.type)]
+    return list(pd.read_csv(path, nrows=1_000).select_dtypes(include="number").columns)
+
+
+# --------------------------------
+# One-Pass Statistics
+# --------------------------------
+def _stats_for_unit(path, unit, columns, options, transform, chunk_rows):
+    stats = StreamingStats(columns, **options)
+    for chunk in iter_chunks(path, unit, chunk_rows):
+        stats.update(transform(chunk) if transform else chunk)
+    return stats
+
+
+def _work_units(path, workers):
+    if _is_parquet(path):
+        groups = np.arange(pq.ParquetFile(path).num_row_groups)
+        return [list(g) for g in np.array_split(groups, workers) if len(g)]
+    return _csv_ranges(path, workers)
+
+
+def compute_stats(path, columns=None, transform=None, chunk_rows=DEFAULT_CHUNK_ROWS, n_jobs=1,
+                  sketch_k=DEFAULT_SKETCH_K, bins=None, sample_rows=DEFAULT_SAMPLE_ROWS, seed=0):
+    """StreamingStats for a CSV or Parquet file in one chunked pass.
+
+    Only `chunk_rows` rows per process are in memory at once. `columns`
+    defaults to the file's numeric columns; `transform(chunk)` may add
+    derived columns before they are counted (it must be a module-level
+    function to run in the pool). Files over POOL_MIN_BYTES are split into
+    row groups or byte ranges and summarised in a process pool when
+    n_jobs != 1 (n_jobs=-1 uses every core); partial results are merged.
+    """
+    if columns is None:
+        columns = numeric_columns(path)
+    workers = (os.cpu_count() or 1) if n_jobs in (-1, None) else n_jobs
+    if workers <= 1 or os.path.getsize(path) < POOL_MIN_BYTES:
+        options = dict(sketch_k=sketch_k, bins=bins, sample_rows=sample_rows, seed=seed)
+        return _stats_for_unit(path, None, columns, options, transform, chunk_rows)
+
+    units = _work_units(path, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(units))) as pool:
+        futures = [
+            pool.submit(_stats_for_unit, path, unit, columns,
+                        dict(sketch_k=sketch_k, bins=bins, sample_rows=sample_rows, seed=seed + i),
+                        transform, chunk_rows)
+            for i, unit in enumerate(units)
+        ]
+        parts = [f.result() for f in futures]
+    stats = parts[0]
+    for part in parts[1:]:
+        stats.merge(part)
+    return stats
@@ -9,38 +9,108 @@ from sklearn.ensemble import IsolationForest
 import importlib.util
 import os
 import sys
+from utils.model_registry import MODEL_ARTIFACTS, get_registry
+from utils.forecasting import (
+    COUNTRY_BASE_EMISSIONS, DEFAULT_QUANTILES, START_YEAR, forecast_frame, forecast_matrix, growth_index_bands,
+    interval_frame, per_tree_predictions
+)
+from utils.forecast_cache import ForecastCache, cache_key
+from utils.batch_prediction import PREDICTION_COLUMN, check_schema, expected_features, predict_frame
+from utils.flat_forest import can_compile, compile_forest
 
 # 🔑 Path to the trained model
-MODEL_PATH = "models/emission_model.pkl"
+MODEL_PATH = MODEL_ARTIFACTS["emission"]
+
+# "compiled" serves manual and API predictions from a CompiledForest; "sklearn" calls model.predict
+PREDICT_BACKEND = os.environ.get("PREDICT_BACKEND", "compiled")
 
 # --------------------------------
 # Model Loading
 # --------------------------------
-def load_model():
-    return joblib.load(MODEL_PATH)
+def load_model(name="emission"):
+    # Loaded once per process; reloaded only when the file content changes
+    return get_registry().get_model(name)
+
+def load_model_features(name="emission"):
+    return get_registry().get_features(name)
 
 # --------------------------------
-# Country Forecasting (Placeholder Example)
+# Forecasting
 # --------------------------------
-def forecast_emissions(model, country, years):
-    base_emission = {
-        "USA": 5000,
-        "China": 10000,
-        "India": 2500,
-        "Germany": 800,
-        "UK": 600,
-        "Brazil": 500,
-        "Canada": 700
-    }.get(country, 1000)
-
-    # Simple growth factor (replace with model-based forecasting)
-    forecast_data = pd.DataFrame({
-        "Year": list(range(2025, 2025 + years)),
-        "Emission": [base_emission * (1 + 0.02) ** i for i in range(years)]
-    })
+# Shared by every session in this process; FORECAST_CACHE_DIR adds a disk tier
+forecast_cache = ForecastCache(
+    maxsize=int(os.environ.get("FORECAST_CACHE_SIZE", 512)),
+    ttl=float(os.environ.get("FORECAST_CACHE_TTL", 3600)),
+    disk_dir=os.environ.get("FORECAST_CACHE_DIR") or None
+)
 
+def forecast_emissions(model, base_emissions, years, start_year=START_YEAR, base_features=None, growth_rates=None):
+    """Model-driven emission forecast.
+
+    `base_emissions` is the current annual total (a country code is still
+    accepted for the legacy demo values). A scalar returns a (Year, Emission)
+    frame; a list of totals forecasts every entity in the same predict call
+    and returns a long (Entity, Year, Emission) frame. Results for registry
+    models are cached on the inputs plus the model's content hash.
+    """
+    if isinstance(base_emissions, str):
+        base_emissions = COUNTRY_BASE_EMISSIONS.get(base_emissions, 1000)
+    fingerprint = get_registry().fingerprint_of(model)
+    key = None
+    if fingerprint is not None:
+        key = cache_key(
+            model=fingerprint,
+            base_emissions=np.asarray(base_emissions, dtype=float),
+            years=int(years),
+            start_year=int(start_year),
+            base_features=base_features,
+            growth_rates=growth_rates
+        )
+        cached = forecast_cache.get(key)
+        if cached is not None:
+            return cached.copy()
+    matrix = forecast_matrix(model, base_emissions, years, base_features, growth_rates)
+    forecast_data = forecast_frame(matrix, start_year)
+    if np.ndim(base_emissions) == 0:
+        forecast_data = forecast_data.drop(columns="Entity")
+    if key is not None:
+        forecast_cache.set(key, forecast_data.copy())
     return forecast_data
 
+def forecast_emission_intervals(model, base_emissions, years, n_samples=200, start_year=START_YEAR,
+                                base_features=None, growth_rates=None, growth_sd=None, seed=0, n_jobs=1):
+    """forecast_emissions plus Monte Carlo prediction intervals, as a fan-chart frame.
+
+    Columns are Year, Emission (the point forecast), Mean and P5/P25/P50/P75/P95.
+    The bands are a growth index independent of the emission total, so they
+    are cached per model and growth assumptions and only rescaled when the
+    company's total changes.
+    """
+    if isinstance(base_emissions, str):
+        base_emissions = COUNTRY_BASE_EMISSIONS.get(base_emissions, 1000)
+    fingerprint = get_registry().fingerprint_of(model)
+    key = None
+    if fingerprint is not None:
+        key = cache_key(
+            kind="growth_bands",
+            model=fingerprint,
+            years=int(years),
+            n_samples=int(n_samples),
+            seed=int(seed),
+            base_features=base_features,
+            growth_rates=growth_rates,
+            growth_sd=growth_sd
+        )
+    bands = forecast_cache.get(key) if key is not None else None
+    if bands is None:
+        bands = growth_index_bands(model, years, n_samples, base_features, growth_rates, growth_sd, seed=seed, n_jobs=n_jobs)
+        if key is not None:
+            forecast_cache.set(key, bands)
+    return interval_frame(float(base_emissions), bands, start_year)
+
+def forecast_cache_stats():
+    return forecast_cache.stats()
+
 # --------------------------------
 # Dashboard Data & Visualizations
 # --------------------------------
@@ -65,6 +135,30 @@ def plot_trends(data):
     ax.legend()
     st.pyplot(fig)
 
+# Fan chart bands (lower, upper, label, opacity) drawn from forecast_emission_intervals frames
+FAN_BANDS = (("P5", "P95", "90% interval", 0.2), ("P25", "P75", "50% interval", 0.35))
+
+def plot_fan_chart(ax, bands):
+    for lower, upper, label, alpha in FAN_BANDS:
+        ax.fill_between(bands["Year"], bands[lower], bands[upper], alpha=alpha, color="tab:blue", label=label, linewidth=0)
+
+def add_fan_chart(fig, bands):
+    # Plotly: each band is an invisible lower edge plus an upper edge filled down to it
+    import plotly.graph_objs as go
+    for lower, upper, label, alpha in FAN_BANDS:
+        fig.add_trace(go.Scatter(x=bands["Year"], y=bands[lower], mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=bands["Year"], y=bands[upper], mode="lines", line=dict(width=0), fill="tonexty",
+                                 fillcolor=f"rgba(31, 119, 180, {alpha})", name=label))
+
+def matching_bands(forecast_df):
+    # Session fan-chart bands, if they belong to this forecast
+    bands = st.session_state.get("forecast_bands")
+    if bands is None or forecast_df is None or len(bands) != len(forecast_df):
+        return None
+    if not np.array_equal(bands["Year"].to_numpy(), forecast_df["Year"].to_numpy()):
+        return None
+    return bands
+
 def plot_correlation(data):
     corr = data.drop("Year", axis=1).corr()
     fig, ax = plt.subplots()
@@ -74,17 +168,44 @@ def plot_correlation(data):
 # --------------------------------
 # Manual Input Prediction
 # --------------------------------
-def manual_predict(model, input_features):
+def _compiled(model, backend):
+    # Forests are compiled once per loaded model object; anything else keeps model.predict
+    if (backend or PREDICT_BACKEND) != "compiled" or not can_compile(model):
+        return None
+    # Registry models use the compiled layout memory-mapped from their companion file
+    compiled = get_registry().compiled_of(model)
+    return compiled if compiled is not None else compile_forest(model)
+
+def manual_predict(model, input_features, backend=None):
+    compiled = _compiled(model, backend)
+    if compiled is not None:
+        return compiled.predict_one(input_features)
     df = pd.DataFrame([input_features])
     return model.predict(df)[0]
 
+def manual_predict_interval(model, input_features, quantiles=(0.05, 0.95)):
+    # Point prediction plus the spread of the forest's individual trees
+    per_tree = per_tree_predictions(model, pd.DataFrame([input_features]))[:, 0]
+    lower, upper = np.quantile(per_tree, quantiles)
+    return {"prediction": float(per_tree.mean()), "lower": float(lower), "upper": float(upper), "std": float(per_tree.std())}
+
+def manual_predict_batch(model, rows, backend=None):
+    # Many manual_predict inputs in one predict call (used by the API micro-batcher)
+    compiled = _compiled(model, backend)
+    if compiled is not None:
+        return compiled.predict_rows(list(rows))
+    return model.predict(pd.DataFrame(list(rows)))
+
 # --------------------------------
 # Batch CSV Prediction
 # --------------------------------
-def batch_predict(model, input_df):
-    predictions = model.predict(input_df)
-    input_df['Predicted Emissions'] = predictions
-    return input_df
+def batch_predict(model, input_df, n_jobs=-1):
+    # Returns a new frame; large files should use batch_prediction.stream_batch_predict
+    features = expected_features(model)
+    check_schema(input_df.columns, features)
+    result = input_df.copy()
+    result[PREDICTION_COLUMN] = predict_frame(model, input_df, features, n_jobs)
+    return result
 
 def fetch_external_emission_data(company_name):
     # Simulate fetching from an external API (replace with real API call as needed)
@@ -147,6 +268,768 @@ def test_model_predictions():
     except Exception as e:
         print(f"Error in model predictions: {e}")
 
+def test_model_registry():
+    print("\nTesting model registry caching...")
+    import shutil
+    import tempfile
+    from utils.model_registry import ModelRegistry
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pkl")
+        shutil.copy(MODEL_PATH, path)
+        registry = ModelRegistry({"model": path})
+        first = registry.get_model("model")
+        assert registry.get_model("model") is first, "Model was reloaded without a change!"
+        # Touching the file changes mtime but not content: no reload
+        os.utime(path, None)
+        assert registry.get_model("model") is first, "Model was reloaded after a touch!"
+        # Rewriting the content triggers a reload
+        joblib.dump(["Population", "GDP"], path)
+        assert registry.get_model("model") is not first, "Changed model was not reloaded!"
+        assert registry.get_features("model") == ["Population", "GDP"]
+    print("Model registry caching works.")
+
+def test_mmap_model_artifact():
+    print("\nTesting memory-mapped model artifact...")
+    import tempfile
+    from utils.model_registry import ModelRegistry, mmap_artifact_path, resolve_artifact_path, save_model_artifact
+    model = joblib.load(MODEL_PATH)
+    df = pd.DataFrame([
+        {"Population": 100, "GDP": 500, "Energy Use": 200},
+        {"Population": 900, "GDP": 12000, "Energy Use": 3500}
+    ])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pkl")
+        save_model_artifact(model, path)
+        registry = ModelRegistry({"model": path})
+        loaded = registry.get_model("model")
+        # The sklearn forest is served; its parallel predict is faster for bulk work
+        assert type(loaded) is type(model) and np.allclose(loaded.predict(df), model.predict(df))
+        # The compiled layout is memory-mapped from the companion, not rebuilt per process
+        compiled = registry.compiled_of(loaded)
+        assert compiled is registry.get_compiled("model"), "Compiled forest was not cached!"
+        assert all(isinstance(a, np.memmap) for a in (compiled.children, compiled.feature, compiled.roots))
+        assert np.allclose(compiled.predict(df), model.predict(df)), "mmap predictions differ from sklearn!"
+        # A pickle newer than its companion (e.g. after a fresh clone) but with the same content
+        mmap_mtime = os.stat(mmap_artifact_path(path)).st_mtime_ns
+        os.utime(path, ns=(mmap_mtime + 10**9, mmap_mtime + 10**9))
+        assert isinstance(ModelRegistry({"model": path}).get_compiled("model").children, np.memmap), "Touched pickle bypassed the mmap!"
+        # A pickle whose content changed is compiled from the pickle until the companion is rewritten
+        joblib.dump({"model": model, "selected_features": None}, path)
+        assert resolve_artifact_path(path) == path, "Stale mmap companion was used!"
+        assert not isinstance(ModelRegistry({"model": path}).get_compiled("model").children, np.memmap)
+        del loaded, compiled
+    print("Memory-mapped model matches sklearn predictions.")
+
+def test_compiled_forest():
+    print("\nTesting compiled forest parity...")
+    import utils.flat_forest as flat_forest
+    from sklearn.ensemble import ExtraTreesRegressor, RandomForestRegressor
+    model = joblib.load(MODEL_PATH)
+    compiled = flat_forest.compile_forest(model)
+    assert flat_forest.compile_forest(model) is compiled, "Compiled forest was not cached!"
+    names = list(model.feature_names_in_)
+    rng = np.random.default_rng(7)
+    # Inside and beyond the training range, plus inputs exactly on split thresholds
+    X = rng.uniform([0, 0, 0], [2000, 25000, 6000], (400, 3))
+    roots = compiled.roots
+    X[:len(roots), compiled.feature[roots]] = compiled.threshold[roots]
+    df = pd.DataFrame(X, columns=names)
+    expected = model.predict(df)
+    per_tree = np.stack([est.predict(df.to_numpy(dtype=np.float32)) for est in model.estimators_])
+    assert np.allclose(compiled.predict(df), expected, rtol=1e-12, atol=1e-9)
+    assert np.allclose(compiled.predict_per_tree(df), per_tree, rtol=0, atol=0)
+    assert np.allclose(compiled.predict_rows(df.to_dict("records")), expected, rtol=1e-12, atol=1e-9)
+    assert all(np.isclose(compiled.predict_one(row), value, rtol=1e-12) for row, value in zip(df.to_dict("records")[:50], expected))
+    # The all-trees and per-tree traversals agree on both sides of the size cutoff
+    big = pd.DataFrame(rng.uniform([0, 0, 0], [2000, 25000, 6000], (3000, 3)), columns=names)
+    assert np.allclose(compiled.predict(big), model.predict(big), rtol=1e-12, atol=1e-9)
+    assert np.allclose(flat_forest.FlatForest(compiled.arrays).predict(big.head(20)), model.predict(big.head(20)))
+    # Other ensembles: unnamed features, unbounded depth, extra trees, a single tree
+    Xs = rng.normal(size=(300, 6))
+    ys = Xs[:, 0] * 3 - Xs[:, 1] ** 2 + rng.normal(scale=0.1, size=300)
+    for other in (RandomForestRegressor(n_estimators=25, random_state=0), ExtraTreesRegressor(n_estimators=10, random_state=0),
+                  RandomForestRegressor(n_estimators=1, max_depth=3, random_state=0)):
+        other.fit(Xs, ys)
+        other_compiled = flat_forest.compile_forest(other)
+        probe = rng.normal(scale=2, size=(200, 6))
+        assert np.allclose(other_compiled.predict(probe), other.predict(probe), rtol=1e-12, atol=1e-12)
+        assert np.isclose(other_compiled.predict_one(dict(enumerate(probe[0]))), other.predict(probe[:1])[0], rtol=1e-12)
+    for bad in ({"Population": 100, "GDP": 500}, {"Population": np.nan, "GDP": 500, "Energy Use": 200}):
+        try:
+            compiled.predict_one(bad)
+            assert False, "Invalid input was accepted!"
+        except ValueError:
+            pass
+    # Backends agree
+    row = {"Population": 120.0, "GDP": 800.0, "Energy Use": 300.0}
+    assert np.isclose(manual_predict(model, row, backend="compiled"), manual_predict(model, row, backend="sklearn"), rtol=1e-12)
+    assert np.allclose(manual_predict_batch(model, [row, row], backend="compiled"), manual_predict_batch(model, [row, row], backend="sklearn"))
+    print("Compiled forest matches sklearn predictions.")
+
+def test_stream_batch_predict():
+    print("\nTesting streaming batch prediction...")
+    import io
+    from utils.batch_prediction import stream_batch_predict
+    model = load_model()
+    df = pd.DataFrame({
+        "Facility": [f"F{i}" for i in range(25)],
+        "Population": np.linspace(50, 1500, 25),
+        "GDP": np.linspace(200, 20000, 25),
+        "Energy Use": np.linspace(100, 5000, 25)
+    })
+    source = io.StringIO(df.to_csv(index=False))
+    output = io.BytesIO()
+    stats = stream_batch_predict(model, source, output, chunksize=10)
+    result = pd.read_csv(io.BytesIO(output.getvalue()))
+    assert stats["rows"] == 25 and stats["chunks"] == 3
+    assert list(result.columns) == list(df.columns) + ["Predicted Emissions"]
+    expected = batch_predict(model, df)["Predicted Emissions"].values
+    assert np.allclose(result["Predicted Emissions"].values, expected)
+    assert "Predicted Emissions" not in df.columns, "batch_predict mutated its input!"
+    # n_jobs sets how many threads the forest's trees are split across
+    from joblib import effective_n_jobs
+    from sklearn.ensemble._base import _partition_estimators
+    from utils.batch_prediction import predict_frame
+    class SplitProbe:
+        def predict(self, X):
+            seen.append(_partition_estimators(model.n_estimators, model.n_jobs)[0])
+            return model.predict(X)
+    seen = []
+    for n_jobs in (1, 2, 4):
+        predict_frame(SplitProbe(), df, ["Population", "GDP", "Energy Use"], n_jobs=n_jobs)
+    assert model.n_jobs is None and seen == [1, 2, 4], f"n_jobs did not change the tree split: {seen}"
+    assert np.allclose(predict_frame(model, df, list(model.feature_names_in_), n_jobs=2), expected)
+    assert effective_n_jobs(None) == 1, "predict_frame leaked its joblib config!"
+    # Columns that read as integers in the first chunk and as floats or NaN in a later one
+    mixed = df.assign(Population=pd.Series([100] * 10 + list(np.linspace(50.5, 1500.5, 15)), dtype=object),
+                      Sites=pd.Series([3] * 10 + [None] * 15, dtype=object), Year=range(2000, 2025))
+    output = io.BytesIO()
+    stream_batch_predict(model, io.StringIO(mixed.to_csv(index=False)), output, fmt="parquet", chunksize=10)
+    result = pd.read_parquet(io.BytesIO(output.getvalue()))
+    assert len(result) == 25 and result["Sites"].isna().sum() == 15
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(io.BytesIO(output.getvalue()))
+    assert str(schema.field("Year").type) == "int64" and str(schema.field("Sites").type) == "int64"
+    assert str(schema.field("Population").type) == "double"
+    assert np.allclose(result["Population"].values, mixed["Population"].astype(float).values)
+    print(f"Streamed {stats['rows']} rows in {stats['chunks']} chunks.")
+
+def test_forecast_emissions():
+    print("\nTesting model-driven forecasting...")
+    model = load_model()
+
+    class CountingModel:
+        feature_names_in_ = model.feature_names_in_
+        calls = 0
+
+        def predict(self, X):
+            CountingModel.calls += 1
+            return model.predict(X)
+
+    single = forecast_emissions(model, 3000, 15)
+    assert list(single.columns) == ["Year", "Emission"] and len(single) == 15
+    assert single["Emission"].iloc[0] == 3000 and single["Year"].iloc[0] == 2025
+    portfolio = forecast_emissions(CountingModel(), [3000, 120.5, 0], 15)
+    assert CountingModel.calls == 1, "Forecast should use one batched predict call!"
+    assert len(portfolio) == 45
+    assert np.allclose(portfolio[portfolio["Entity"] == 0]["Emission"].values, single["Emission"].values)
+    assert (portfolio[portfolio["Entity"] == 2]["Emission"] == 0).all()
+    print(f"Forecast sample:\n{single.head()}")
+
+def test_forecast_portfolio():
+    print("\nTesting portfolio forecasting...")
+    import utils.forecasting as forecasting
+    model = load_model()
+    portfolio = [{"entity": f"Company {i}", "emissions": 500 + 10 * i} for i in range(40)]
+    in_process = forecasting.forecast_portfolio(portfolio, 12, model=model)
+    threshold = forecasting.POOL_MIN_ROWS
+    forecasting.POOL_MIN_ROWS = 1
+    try:
+        pooled = forecasting.forecast_portfolio(portfolio, 12, n_jobs=2)
+    finally:
+        forecasting.POOL_MIN_ROWS = threshold
+    assert len(in_process) == 40 * 12
+    assert in_process["Entity"].iloc[-1] == "Company 39"
+    assert np.allclose(in_process["Emission"].values, pooled["Emission"].values)
+    print(f"Forecast {in_process['Entity'].nunique()} companies in one call.")
+
+def test_forecast_cache():
+    print("\nTesting forecast cache...")
+    import tempfile
+    import time
+    model = load_model()
+    before = forecast_cache_stats()
+    first = forecast_emissions(model, 4321.5, 7)
+    first["Emission"] = 0  # callers may mutate their copy
+    second = forecast_emissions(model, 4321.5, 7)
+    after = forecast_cache_stats()
+    assert after["hits"] == before["hits"] + 1 and after["misses"] == before["misses"] + 1
+    assert second["Emission"].iloc[0] == 4321.5, "Cached forecast was mutated by a caller!"
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ForecastCache(maxsize=2, ttl=0.05, disk_dir=tmp)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 3)
+        assert cache.stats()["evictions"] == 1
+        warm = ForecastCache(maxsize=2, ttl=0.05, disk_dir=tmp)
+        assert warm.get("a") == 1 and warm.stats()["disk_hits"] == 1, "Disk tier did not survive a restart!"
+        time.sleep(0.1)
+        assert cache.get("c") is None and warm.get("a") is None, "Expired entries were returned!"
+    print(f"Forecast cache stats: {forecast_cache_stats()}")
+
+def test_storage_backends():
+    print("\nTesting storage backends...")
+    import json
+    import tempfile
+    import threading
+    from utils.storage import JSONStore, SQLiteStore, migrate_json_to_sqlite
+    sources = [{"type": "Electricity", "emission": 1200}, {"type": "Transport", "emission": 800, "location": [20, 78]}]
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "data.json")
+        log_file = os.path.join(tmp, "log.jsonl")
+        db_file = os.path.join(tmp, "data.db")
+        legacy = JSONStore(data_file, log_file)
+        legacy.update("alice", "abc", sources)
+        assert migrate_json_to_sqlite(data_file, log_file, db_file) == (1, 1)
+        # A rerun (or a second worker auto-migrating) must not duplicate the log
+        assert migrate_json_to_sqlite(data_file, log_file, db_file) is None
+        store = SQLiteStore(db_file)
+        assert store.count_log() == 1, "Second migration duplicated the update log!"
+        assert store.get_company("abc") == sources
+        assert store.get_company("missing") is None
+        # Concurrent writers must not lose each other's updates
+        threads = [
+            threading.Thread(target=store.update, args=("bob", f"company_{i}", sources[:1]))
+            for i in range(20)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(store.all_companies()) == 21
+        assert len(store.query_log(username="bob")) == 20
+        assert store.query_log(company="abc")[0]["emission_sources"] == json.loads(json.dumps(sources))
+    print("JSON and SQLite storage backends work.")
+
+def test_audit_log():
+    print("\nTesting rotated JSON-lines audit log...")
+    import tempfile
+    from utils.audit_log import AuditLog
+    with tempfile.TemporaryDirectory() as tmp:
+        log = AuditLog(os.path.join(tmp, "api_log.jsonl"), max_bytes=2000, compress=True)
+        for i in range(60):
+            log.append({
+                "timestamp": f"2025-01-01T00:00:{i:02d}",
+                "username": "alice" if i % 3 else "bob",
+                "company": f"company_{i % 4}",
+                "emission_sources": [{"type": "Electricity", "emission": i}]
+            })
+        segments = log.segments()
+        assert len(segments) > 1 and segments[0].endswith(".gz"), "Log was not rotated and compressed!"
+        assert log.count() == 60 and log.count(username="bob") == 20
+        page = log.query(company="company_1", offset=2, limit=5)
+        assert [e["emission_sources"][0]["emission"] for e in page] == [9, 13, 17, 21, 25]
+        recent = log.query(since="2025-01-01T00:00:55")
+        assert [e["emission_sources"][0]["emission"] for e in recent] == [55, 56, 57, 58, 59]
+        assert log.companies() == ["company_0", "company_1", "company_2", "company_3"]
+    print(f"Audit log rotated into {len(segments)} segments.")
+
+def test_bulk_updates():
+    print("\nTesting bulk validation and updates...")
+    import tempfile
+    from utils.storage import JSONStore, SQLiteStore
+    from utils.validation import validate_emission_batch, validate_emission_sources
+    good = [{"type": "Electricity", "emission": 10}, {"type": "Transport", "emission": 2.5}]
+    batch = [good, "x", [good[0], 5], [good[0], {"type": "Fuel"}], [{"type": "Fuel", "emission": "1"}], [good[1], {"type": "Fuel", "emission": -1}],
+             [good[0], {"type": "Fuel", "emission": 10 ** 400}]]
+    errors = validate_emission_batch(batch)
+    assert errors[0] is None
+    # Same rules and messages as the single-item validator
+    assert errors == [validate_emission_sources(sources)[1] for sources in batch]
+    assert errors[2] == "Emission source at index 1 is not a dict."
+    assert errors[5] == "Negative emission value at index 1."
+    assert errors[6] == "Emission value at index 1 is too large."
+    with tempfile.TemporaryDirectory() as tmp:
+        updates = [(f"company_{i}", good) for i in range(500)]
+        for store in (JSONStore(os.path.join(tmp, "data.json"), os.path.join(tmp, "log.jsonl")),
+                      SQLiteStore(os.path.join(tmp, "data.db"))):
+            store.update_many("alice", updates)
+            assert len(store.all_companies()) == 500 and store.get_company("company_7") == good
+            assert store.count_log(username="alice") == 500
+            assert store.query_log(company="company_499")[0]["emission_sources"] == good
+    print("Bulk validation and single-transaction updates work.")
+
+def test_api_handlers():
+    print("\nTesting framework-neutral API handlers...")
+    import json
+    import tempfile
+    from utils.api_handlers import EmissionAPI, parse_bulk_body
+    from utils.auth import ApiKeyCache, save_api_key
+    from utils.storage import SQLiteStore
+    with tempfile.TemporaryDirectory() as tmp:
+        users_file = os.path.join(tmp, "api_users.json")
+        save_api_key("alice", "k1", users_file)
+        api = EmissionAPI(SQLiteStore(os.path.join(tmp, "data.db")), ApiKeyCache(users_file))
+        sources = [{"type": "Electricity", "emission": 10}]
+        update = {"username": "alice", "api_key": "k1", "company": "abc", "emission_sources": sources}
+        assert api.update_emissions(update)[1] == 200
+        assert api.update_emissions(dict(update, api_key="bad"))[1] == 403
+        assert api.update_emissions(None) == ({"error": "Missing JSON body"}, 400)
+        query = {"username": "alice", "api_key": "k1", "company": "abc"}
+        response, status = api.get_emissions(query)
+        assert status == 200 and json.loads(response.body)["emission_sources"] == sources
+        # Conditional GET: unchanged data -> 304, an update changes the ETag
+        etag = response.headers["ETag"]
+        assert api.get_emissions(query, if_none_match=f'W/"x", {etag}')[1] == 304
+        api.update_emissions(dict(update, emission_sources=[{"type": "Fuel", "emission": 3}]))
+        response, status = api.get_emissions(query, if_none_match=etag)
+        assert status == 200 and response.headers["ETag"] != etag
+        assert json.loads(response.body)["emission_sources"] == [{"type": "Fuel", "emission": 3}]
+        body = '{"company": "x", "emission_sources": [{"type": "Fuel", "emission": 1}]}\n{oops'
+        credentials, updates = parse_bulk_body("application/x-ndjson", body.encode(), {"username": "alice", "api_key": "k1"})
+        payload, status = api.update_emissions_bulk(credentials, updates)
+        assert status == 200 and payload["status"] == "partial" and payload["accepted"] == 1
+        features = {f: 150.0 for f in load_model_features()}
+        payload, status = api.predict({"username": "alice", "api_key": "k1", "features": features})
+        assert status == 200 and np.isclose(payload["prediction"], manual_predict(load_model(), features))
+        assert api.predict({"username": "alice", "api_key": "k1", "features": {}})[1] == 400
+        assert api.metrics({})[1] == 400 and api.metrics({"username": "alice", "api_key": "bad"})[1] == 403
+        assert "micro_batcher" in api.metrics({"username": "alice", "api_key": "k1"})[0]
+        assert api.prediction_error(RuntimeError("boom")) == ({"error": "Prediction failed: internal error"}, 500)
+        payload, status = api.forecast({"username": "alice", "api_key": "k1", "base_emissions": 100, "years": 3})
+        assert status == 200 and [row["Year"] for row in payload["forecast"]] == [2025, 2026, 2027]
+        request = {"username": "alice", "api_key": "k1", "base_emissions": 100, "years": 3}
+        for bad in ({"start_year": "2020"}, {"years": True}, {"base_emissions": [1.0] * 1_001}):
+            assert api.forecast(dict(request, **bad))[1] == 400, f"{bad} was not rejected by forecast!"
+        portfolio = {"username": "alice", "api_key": "k1", "entities": [{"emissions": 100}, {"company": "abc"}], "years": 3}
+        payload, status = api.forecast_portfolio(portfolio)
+        assert status == 200 and len(payload["forecast"]) == 6
+        for bad in ({"start_year": "2020"}, {"start_year": None}, {"years": "3"}, {"years": True}):
+            assert api.forecast_portfolio(dict(portfolio, **bad))[1] == 400, f"{bad} was not rejected!"
+        too_many = dict(portfolio, entities=[{"emissions": 1}] * 1_001)
+        assert api.forecast_portfolio(too_many)[1] == 413
+        api.batcher.close()
+    print("API handlers return the expected payloads and status codes.")
+
+def test_micro_batcher():
+    print("\nTesting prediction micro-batcher...")
+    import threading
+    from utils.micro_batch import MicroBatcher
+    model = load_model()
+    features = load_model_features()
+    calls = []
+    def batch_fn(rows):
+        calls.append(len(rows))
+        if any(row.get(features[0]) is None for row in rows):
+            raise ValueError("missing value")
+        return manual_predict_batch(model, rows)
+    batcher = MicroBatcher(batch_fn, max_batch=64, max_wait=0.05)
+    rows = [{f: float(100 + i + j) for j, f in enumerate(features)} for i in range(32)]
+    results = [None] * len(rows)
+    def worker(i):
+        results[i] = batcher.submit(rows[i]).result()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(rows))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    expected = [manual_predict(model, row) for row in rows]
+    assert np.allclose(results, expected), "Batched predictions differ from manual_predict!"
+    assert len(calls) < len(rows), "Concurrent requests were not coalesced!"
+    # A bad row fails alone; the rest of its batch still succeeds
+    good, bad = batcher.submit(rows[0]), batcher.submit({features[0]: None})
+    assert np.isclose(good.result(), expected[0])
+    assert isinstance(bad.exception(), ValueError)
+    batcher.close()
+    # A batch function that drops results fails its callers instead of leaving them waiting
+    short = MicroBatcher(lambda items: items[:-1], max_batch=8, max_wait=0.05)
+    futures = [short.submit(i) for i in range(4)]
+    assert all(isinstance(f.exception(timeout=5), RuntimeError) for f in futures)
+    short.close()
+    print(f"Micro-batcher stats: {batcher.stats()}")
+
+def test_change_feed():
+    print("\nTesting change feed...")
+    import threading
+    from utils.change_feed import ChangeFeed
+    feed = ChangeFeed(maxlen=5)
+    for i in range(3):
+        feed.publish("alice", f"company_{i}", [{"type": "Electricity", "emission": i}])
+    result = feed.read(since=1)
+    assert [c["seq"] for c in result["changes"]] == [2, 3] and not result["reset"]
+    assert feed.read(since=3)["changes"] == []
+    assert feed.read(since=0, epoch="old-epoch")["reset"], "Restarted feed did not ask for a reset!"
+    for i in range(5):
+        feed.publish("alice", "abc", [])
+    assert feed.read(since=1)["reset"], "Position outside the ring buffer did not ask for a reset!"
+    assert [c["seq"] for c in feed.read(since=6, limit=1)["changes"]] == [7]
+    # Long-poll wakes up as soon as something is published
+    threading.Timer(0.05, feed.publish, args=("bob", "xyz", [])).start()
+    feed.wait(since=8, timeout=5)
+    assert feed.read(since=8)["changes"][0]["company"] == "xyz"
+    # Store-backed feeds in two processes' worth of stores agree on epoch and sequence
+    import tempfile
+    from utils.change_feed import StoreChangeFeed
+    from utils.storage import SQLiteStore
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.db")
+        writer, reader = SQLiteStore(path), SQLiteStore(path)
+        feed_a, feed_b = StoreChangeFeed(writer, poll_interval=0.02), StoreChangeFeed(reader, poll_interval=0.02)
+        assert feed_a.epoch == feed_b.epoch and feed_b.read()["last_seq"] == 0
+        writer.update("alice", "abc", [{"type": "Fuel", "emission": 1}])
+        writer.update_many("alice", [("def", []), ("ghi", [])])
+        result = feed_b.read(since=1, epoch=feed_a.epoch)
+        assert not result["reset"] and [c["company"] for c in result["changes"]] == ["def", "ghi"]
+        assert [c["seq"] for c in result["changes"]] == [2, 3]
+        assert feed_b.read(since=0, epoch="old-epoch")["reset"]
+        # A change committed through the other store wakes a waiter by polling
+        threading.Timer(0.05, writer.update, args=("bob", "xyz", [])).start()
+        assert feed_b.wait(since=3, timeout=5) and feed_b.read(since=3)["changes"][0]["company"] == "xyz"
+        assert not feed_b.wait(since=4, timeout=0.05)
+    print(f"Change feed stats: {feed.stats()}")
+
+def test_report_pipeline():
+    print("\nTesting report pipeline...")
+    import smtplib
+    import threading
+    import utils.report_pipeline as report_pipeline
+    from utils.report_pipeline import SMTPPool, render_pdf_bytes, run_report_pipeline
+    pdf = render_pdf_bytes("abc", [{"type": "Electricity", "emission": 1200}])
+    assert pdf.startswith(b"%PDF"), "Report did not render to PDF bytes!"
+    sent, lock = [], threading.Lock()
+    class FakeSMTP:
+        drops = 1
+        def __init__(self, host, port, timeout=None):
+            self.logins = 0
+        def starttls(self):
+            pass
+        def login(self, user, password):
+            self.logins += 1
+        def send_message(self, msg):
+            with lock:
+                if FakeSMTP.drops:
+                    FakeSMTP.drops -= 1
+                    raise smtplib.SMTPServerDisconnected("dropped")
+                sent.append(msg["To"])
+        def close(self):
+            pass
+        def quit(self):
+            pass
+    users = {f"user{i}": {"email": f"user{i}@example.com", "company": f"company_{i % 3}"} for i in range(12)}
+    companies = {"company_0": [{"type": "Electricity", "emission": 10}], "company_1": [{"type": "Fuel", "emission": 5}]}
+    pool = SMTPPool("localhost", 1025, "me", "pw", backoff=0, smtp_factory=FakeSMTP)
+    stats = run_report_pipeline(users, companies, pool, "me@example.com", render_workers=2, connections=3, log=lambda _: None)
+    # company_2 has no data, so 8 of 12 users get a report
+    assert stats["sent"] == 8 and sorted(sent) == sorted(u["email"] for u in users.values() if u["company"] != "company_2")
+    assert stats["smtp_retries"] == 1 and stats["smtp_connections"] <= 4, "Connections were not reused!"
+    # Manifest: unchanged companies are skipped, shared companies render once
+    manifest = {"deliveries": {}}
+    run = lambda: run_report_pipeline(users, companies, SMTPPool("localhost", 1025, smtp_factory=FakeSMTP),
+                                      "me@example.com", manifest=manifest, log=lambda _: None)
+    stats = run()
+    assert stats["sent"] == 8 and stats["renders"] == 2
+    assert run()["sent"] == 0, "Unchanged reports were sent again!"
+    companies["company_1"] = [{"type": "Fuel", "emission": 6}]
+    users["new_user"] = {"email": "new@example.com", "company": "company_0"}
+    stats = run()
+    assert stats["sent"] == 5 and stats["renders"] == 2 and stats["skipped_unchanged"] == 4
+    # Forced resends keep the manifest entries of recipients outside this run
+    manifest["deliveries"]["former@example.com"] = {"company_9": "old-hash"}
+    stats = run_report_pipeline(users, companies, SMTPPool("localhost", 1025, smtp_factory=FakeSMTP),
+                                "me@example.com", manifest=manifest, force=True, log=lambda _: None)
+    assert stats["sent"] == 9 and stats["skipped_unchanged"] == 0
+    assert manifest["deliveries"]["former@example.com"] == {"company_9": "old-hash"}
+    # A render failure still closes the SMTP pool
+    closing = SMTPPool("localhost", 1025, smtp_factory=FakeSMTP)
+    closed = []
+    closing.close = lambda: closed.append(True)
+    def failing_render(items, workers=None):
+        raise RuntimeError("render failed")
+    original_render, report_pipeline.render_reports = report_pipeline.render_reports, failing_render
+    try:
+        run_report_pipeline(users, companies, closing, "me@example.com", log=lambda _: None)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("Render failure did not propagate!")
+    finally:
+        report_pipeline.render_reports = original_render
+    assert closed, "SMTP pool was left open after a failure!"
+    print(f"Report pipeline: {stats['sent']} sent, timings {stats['timings']}")
+
+def test_api_key_cache():
+    print("\nTesting API key cache...")
+    import tempfile
+    from utils.auth import ApiKeyCache, save_api_key
+    with tempfile.TemporaryDirectory() as tmp:
+        users_file = os.path.join(tmp, "api_users.json")
+        cache = ApiKeyCache(users_file)
+        assert not cache.verify("alice", "k1"), "Missing users file accepted a key!"
+        save_api_key("alice", "k1", users_file)
+        assert cache.verify("alice", "k1") and not cache.verify("alice", "k2")
+        assert not cache.verify("mallory", "k1")
+        # Only strings are keys: a JSON number must not match its digits
+        save_api_key("bob", "12345", users_file)
+        assert cache.verify("bob", "12345") and not cache.verify("bob", 12345), "Numeric key accepted!"
+        reloads = cache.metrics()["reloads"]
+        # Another process rotating the key replaces the file; no explicit invalidate
+        save_api_key("alice", "k2", users_file)
+        assert cache.verify("alice", "k2") and not cache.verify("alice", "k1"), "Stale key after file change!"
+        assert cache.metrics()["reloads"] == reloads + 1
+        assert "k2" not in repr(cache.__dict__), "Plaintext key kept in memory!"
+    print(f"API key cache metrics: {cache.metrics()}")
+
+def test_emission_sources_model():
+    print("\nTesting emission sources model...")
+    from utils.emission_sources import get_emission_sources, set_emission_sources
+    state = {}
+    assert not get_emission_sources(state).valid
+    records = [{"type": "Electricity", "emission": 700.0}, {"type": "Transport", "emission": 200.0},
+               {"type": "Electricity", "emission": 100.0}]
+    sources = set_emission_sources(records, state)
+    version = state["emission_sources_version"]
+    assert sources.valid and sources.error is None and sources.total == 1000.0
+    assert sources.by_type.to_dict() == {"Electricity": 800.0, "Transport": 200.0}
+    assert abs(sources.shares["Electricity"] - 0.8) < 1e-12
+    assert str(sources.frame["type"].dtype) == "category" and sources.frame["emission"].dtype == "float64"
+    # Unchanged content keeps the version and the cached model
+    assert set_emission_sources(list(records), state).version == version
+    assert get_emission_sources(state) is get_emission_sources(state)
+    # A list grown in place (no setter) is still picked up
+    state["emission_sources"].append({"type": "Other", "emission": -5.0})
+    sources = get_emission_sources(state)
+    assert sources.version == version + 1 and sources.total == 995.0
+    assert sources.error == "Negative emission value at index 3."
+    assert sources.issues({"average": 300}) == [
+        "Unusually high value for Electricity (>600 tons CO₂e).", "Negative value for Other.",
+        "Total emissions are much higher than sector average (300 tons CO₂e)."
+    ]
+    print(f"Emission sources model: version {sources.version}, by type {sources.by_type.to_dict()}")
+
+def test_reduction_planning():
+    print("\nTesting reduction planning engine...")
+    from scipy.optimize import linprog
+    from utils.reduction_planning import abatement_frontier, cost_curve, optimize_budget
+    rng = np.random.default_rng(7)
+    n = 300
+    emissions = rng.uniform(0, 1000, n)
+    costs = rng.uniform(5, 150, n)
+    lo = rng.integers(0, 20, n)
+    hi = lo + rng.integers(0, 80, n)
+    # Broadcast sweep matches the per-source loop
+    pcts, curve_cost, curve_reduced = cost_curve(emissions, costs, lo, hi, steps=21)
+    for k in (0, 7, 20):
+        used = np.clip(pcts[k], lo, hi)
+        assert np.isclose(curve_reduced[k], (emissions * used / 100).sum())
+        assert np.isclose(curve_cost[k], (emissions * used / 100 * costs).sum())
+    # Fractional knapsack matches the LP optimum and respects the bounds
+    base_cost = (emissions * lo / 100 * costs).sum()
+    for budget in (base_cost + 1e4, base_cost + 5e5, base_cost + 5e7):
+        plan = optimize_budget(emissions, costs, budget, lo, hi)
+        bounds = list(zip(emissions * lo / 100, emissions * hi / 100))
+        lp = linprog(-np.ones(n), A_ub=[costs], b_ub=[budget], bounds=bounds)
+        assert plan["feasible"] and np.isclose(plan["total_reduced"], -lp.fun, rtol=1e-9), (plan["total_reduced"], -lp.fun)
+        assert plan["total_cost"] <= budget * (1 + 1e-9)
+        assert np.all(plan["pct"] >= lo - 1e-9) and np.all(plan["pct"] <= hi + 1e-9)
+    assert not optimize_budget(emissions, costs, 0.0, lo, hi)["feasible"]
+    spend, tons = abatement_frontier(emissions, costs, lo, hi)
+    assert np.isclose(tons[-1], (emissions * hi / 100).sum()) and np.all(np.diff(spend) >= 0)
+    print(f"Budget plan for ${base_cost + 5e5:,.0f}: {optimize_budget(emissions, costs, base_cost + 5e5, lo, hi)['total_reduced']:.1f} tons")
+
+def test_action_plan():
+    print("\nTesting action plan engine...")
+    from scipy.optimize import linprog
+    from utils.action_plan import (
+        cheapest_plan, load_scenario_targets, parse_action_plan, plan_summary, target_pathway
+    )
+    targets = load_scenario_targets("scenario_sample.csv")
+    assert targets["Aggressive Reduction"] == (30.0, 2030) and targets["Business as Usual"] == (0.0, None)
+    plan = parse_action_plan(pd.read_csv("action_plan_sample.csv"), ["Electricity", "Transport"], 6)
+    assert plan.tolist()[0] == [5.0, 15.0, 23.0, 27.0, 27.0, 27.0]
+    summary = plan_summary([1000.0, 500.0], plan, [50.0, 100.0])
+    assert np.isclose(summary["Emission"].iloc[1], 1500 * 0.85)
+    assert np.isclose(summary["Cumulative Cost"].iloc[1], 1000 * 0.20 * 50 + 500 * 0.20 * 100)
+    required = target_pathway(30, 2030, 10)
+    assert np.isclose(required[5], 30) and np.isclose(required[-1], 30) and np.all(np.diff(required) >= 0)
+    rng = np.random.default_rng(3)
+    base, costs = rng.uniform(10, 500, 40), rng.uniform(5, 150, 40)
+    lo, hi = rng.integers(0, 10, 40), rng.integers(20, 100, 40)
+    matrix, feasible = cheapest_plan(base, costs, required, lo, hi)
+    assert feasible.all() and np.all(matrix >= lo[:, None] - 1e-9) and np.all(matrix <= hi[:, None] + 1e-9)
+    tons = base[:, None] * matrix / 100
+    assert np.allclose(tons.sum(axis=0), np.maximum(base.sum() * required / 100, (base * lo / 100).sum()))
+    lp = linprog(costs, A_ub=[-np.ones(40)], b_ub=[-base.sum() * 0.30],
+                 bounds=list(zip(base * lo / 100, base * hi / 100)))
+    assert np.isclose((tons[:, -1] * costs).sum(), lp.fun), "Plan is not least-cost!"
+    assert not cheapest_plan(base, costs, [99.0], lo, hi)[1].all()
+    print(f"Cheapest 30% plan costs ${lp.fun:,.0f} per year at target")
+
+def test_forecast_intervals():
+    print("\nTesting forecast prediction intervals...")
+    from utils.flat_forest import FlatForest, flatten_forest
+    from utils.forecasting import growth_index_bands
+    model = joblib.load(MODEL_PATH)
+    flat = FlatForest(flatten_forest(model))
+    df = pd.DataFrame([{"Population": 100, "GDP": 500, "Energy Use": 200}, {"Population": 900, "GDP": 12000, "Energy Use": 3500}])
+    for m in (model, flat):
+        per_tree = per_tree_predictions(m, df)
+        assert per_tree.shape == (100, 2) and np.allclose(per_tree.mean(axis=0), model.predict(df))
+    bands = forecast_emission_intervals(flat, 2000, 15, n_samples=100)
+    point = forecast_emissions(flat, 2000, 15)
+    assert np.allclose(bands["Emission"], point["Emission"]), "Interval frame point forecast differs!"
+    assert np.allclose(bands.iloc[0, 1:], 2000), "Year 0 should carry no uncertainty!"
+    assert np.all(bands["P5"] <= bands["P50"]) and np.all(bands["P50"] <= bands["P95"])
+    assert (bands["P95"] - bands["P5"]).iloc[-1] > 0
+    # Same seed, same bands; a new total only rescales them
+    rescaled = forecast_emission_intervals(flat, 500, 15, n_samples=100)
+    assert np.allclose(rescaled["P95"] * 4, bands["P95"])
+    quantiles, _, _ = growth_index_bands(model, 15, n_samples=100)
+    assert np.allclose(quantiles[-1] * 2000, bands["P95"]), "sklearn and flattened forests disagree!"
+    interval = manual_predict_interval(flat, {"Population": 500, "GDP": 5000, "Energy Use": 1500})
+    assert interval["lower"] <= interval["prediction"] <= interval["upper"]
+    print(f"Final-year 90% interval: {bands['P5'].iloc[-1]:.0f} - {bands['P95'].iloc[-1]:.0f}")
+
+def test_dataset_layer():
+    print("\nTesting Parquet dataset layer...")
+    import tempfile
+    import time
+    from utils.dataset import DATA_FILE, dataset_version, ensure_parquet, load_dataset, optimize_dtypes
+    source = pd.read_csv(DATA_FILE)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "panel.csv")
+        source.to_csv(csv_path, index=False)
+        df = load_dataset(csv_path)
+        assert df.shape == source.shape and str(df["country"].dtype) == "category"
+        assert df["co2_per_cap"].dtype == np.float32 and df["year"].dtype == np.int16
+        counts = optimize_dtypes(pd.DataFrame({"share": [0.123456789], "pop": [float(2 ** 24 + 1)]}))
+        assert counts["share"].dtype == np.float32 and counts["pop"].dtype == np.float64
+        subset = load_dataset(csv_path, columns=["country", "year", "co2_per_cap"], countries=["IND", "USA"], years=(2000, 2005))
+        expected = source[source["country"].isin(["IND", "USA"]) & source["year"].between(2000, 2005)]
+        assert list(subset.columns) == ["country", "year", "co2_per_cap"] and len(subset) == len(expected)
+        assert list(subset["country"].cat.categories) == ["IND", "USA"]
+        assert np.allclose(subset["co2_per_cap"], expected.sort_values(["country", "year"])["co2_per_cap"], rtol=1e-6)
+        version = dataset_version(csv_path)
+        path = ensure_parquet(csv_path)[0]
+        built = os.stat(path).st_mtime_ns
+        # Touching the CSV re-hashes it but does not rebuild
+        time.sleep(0.01)
+        os.utime(csv_path)
+        assert dataset_version(csv_path) == version and os.stat(path).st_mtime_ns == built
+        source[source["country"] != "ARE"].to_csv(csv_path, index=False)
+        assert dataset_version(csv_path) != version, "Changed CSV was not rebuilt!"
+        assert "ARE" not in load_dataset(csv_path, columns=["country"])["country"].cat.categories
+    print(f"Parquet dataset: {df.memory_usage(deep=True).sum()} bytes vs CSV frame {source.memory_usage(deep=True).sum()}")
+
+def test_eda_engine():
+    print("\nTesting exploration engine...")
+    import tempfile
+    from utils.dataset import DATA_FILE
+    from utils.eda import DatasetExplorer, get_explorer, stratified_sample
+    source = pd.read_csv(DATA_FILE)
+    sample = stratified_sample(source, 200)
+    counts = source["country"].value_counts()
+    assert abs(len(sample) - 200) <= counts.size and set(sample["country"]) == set(counts.index)
+    assert sample.index.is_monotonic_increasing and stratified_sample(source, len(source)) is source
+    explorer = DatasetExplorer(source, "v1")
+    assert explorer.describe() is explorer.describe() and explorer.corr().equals(source.corr(numeric_only=True))
+    density, edges = explorer.histogram("gdp")
+    assert np.isclose((density * np.diff(edges)).sum(), 1.0)
+    slope, intercept, _ = explorer.regression("pop", "urb_pop")
+    assert np.allclose([slope, intercept], np.polyfit(source["pop"], source["urb_pop"], 1))
+    features = ["gdp", "pop", "en_per_cap"]
+    labels = explorer.kmeans(3, features)
+    assert explorer.kmeans(3, features) is labels and explorer.kmeans(4, features) is not labels
+    assert len(labels) == len(source) and set(labels) == {0, 1, 2}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "panel.csv")
+        source.to_csv(csv_path, index=False)
+        shared = get_explorer(csv_path)
+        assert get_explorer(csv_path) is shared
+        source.head(100).to_csv(csv_path, index=False)
+        assert len(get_explorer(csv_path).df) == 100, "Changed CSV kept the old explorer!"
+    print(f"Stratified sample: {len(sample)} rows covering {sample['country'].nunique()} countries")
+
+def test_streaming_stats():
+    print("\nTesting streaming statistics...")
+    import tempfile
+    import utils.streaming_stats as streaming
+    from statsmodels.stats.outliers_influence import variance_inflation_factor
+    from utils.dataset import DATA_FILE
+    source = pd.read_csv(DATA_FILE)
+    assert streaming.fits_in_memory(DATA_FILE) and not streaming.fits_in_memory(DATA_FILE, max_bytes=1)
+    cols = list(source.select_dtypes(include="number").columns)
+    holes = source.copy()
+    rng = np.random.default_rng(0)
+    for col in cols[:4]:
+        holes.loc[rng.random(len(holes)) < 0.1, col] = np.nan
+    # Partial states over chunks, merged, equal the in-memory results
+    parts = [streaming.StreamingStats(cols, seed=i).update(holes.iloc[idx])
+             for i, idx in enumerate(np.array_split(np.arange(len(holes)), 5))]
+    stats = parts[0]
+    for part in parts[1:]:
+        stats.merge(part)
+    expected = holes[cols].describe()
+    exact = ["count", "mean", "std", "min", "max"]
+    assert np.allclose(stats.describe().loc[exact], expected.loc[exact], rtol=1e-9)
+    assert np.allclose(stats.corr(), holes[cols].corr(), atol=1e-10)
+    assert np.allclose(stats.cov(), holes[cols].cov(), rtol=1e-8)
+    assert len(stats.sample) == min(len(holes), streaming.DEFAULT_SAMPLE_ROWS)
+    features = ["cereal_yield", "gni_per_cap", "en_per_cap", "co2_per_cap", "gdp"]
+    complete = holes[cols].dropna()[features].values
+    vif = [variance_inflation_factor(complete, i) for i in range(len(features))]
+    assert np.allclose(stats.vif(features)["VIF"], vif, rtol=1e-6)
+    # Sketch quantiles stay within a small rank error
+    values = rng.standard_normal(300_000)
+    sketch = streaming.KLLSketch()
+    for chunk in np.array_split(values, 6):
+        sketch.merge(streaming.KLLSketch(seed=len(chunk)).update(chunk))
+    q = np.linspace(0.01, 0.99, 99)
+    rank_error = np.abs(np.searchsorted(np.sort(values), sketch.quantile(q)) / values.size - q).max()
+    assert rank_error < 0.01 and sum(map(len, sketch.levels)) < 3_000
+    # A pooled pass over CSV byte ranges matches the single pass
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "panel.csv")
+        source.to_csv(csv_path, index=False)
+        single = streaming.compute_stats(csv_path, chunk_rows=300)
+        pool_min = streaming.POOL_MIN_BYTES
+        streaming.POOL_MIN_BYTES = 0
+        try:
+            pooled = streaming.compute_stats(csv_path, chunk_rows=300, n_jobs=3)
+        finally:
+            streaming.POOL_MIN_BYTES = pool_min
+    assert pooled.rows == single.rows == len(source)
+    assert np.allclose(pooled.corr(), single.corr(), atol=1e-12) and np.allclose(pooled.mean, source[cols].mean())
+    print(f"Sketch rank error {rank_error:.4f} with {sum(map(len, sketch.levels))} retained items")
+
+def test_model_building():
+    print("\nTesting model training pipeline...")
+    import tempfile
+    import model_building
+    X, y = model_building.load_training_data()
+    grown = model_building.WarmStartForestRegressor(n_estimators=8, random_state=1).fit(X, y)
+    grown = model_building.WarmStartForestRegressor(n_estimators=20, random_state=1).fit(X, y)
+    fresh = model_building.RandomForestRegressor(n_estimators=20, random_state=1).fit(X, y)
+    model_building.clear_warm_start_cache()
+    assert np.array_equal(grown.predict(X), fresh.predict(X)), "Warm-started forest differs from a fresh fit!"
+    # Eliminated candidates' forests are evicted; only the last round's candidate is cached
+    search = model_building.WarmStartHalvingSearchCV(
+        model_building.WarmStartForestRegressor(random_state=1, n_jobs=1), model_building.PARAM_DISTRIBUTIONS,
+        n_candidates='exhaust', resource='n_estimators', min_resources=4, max_resources=12, cv=3,
+        random_state=1, refit=False).fit(X[:300], y[:300])
+    assert list(search.n_candidates_) == [3, 1]
+    assert len({params for params, _ in model_building._warm_forests}) == 1, "Eliminated forests were kept!"
+    model_building.clear_warm_start_cache()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings = dict(output=os.path.join(tmp, "co2.pkl"), cache_dir=os.path.join(tmp, "cache"),
+                        min_trees=4, max_trees=12, selection_trees=5, verbose=False)
+        first = model_building.build_model(**settings)
+        second = model_building.build_model(**settings)
+        assert not any(first["cache_hits"].values()) and all(second["cache_hits"].values())
+        assert first["best_params"] == second["best_params"] and first["test_r2"] == second["test_r2"]
+        assert list(first["n_candidates"]) == [3, 1] and first["best_params"]["n_estimators"] == 12
+        assert set(first["timings"]) == {"load", "split", "feature_selection", "search", "refit", "save", "evaluate"}
+    print(f"Pipeline: R2 {first['test_r2']:.3f}, stages {', '.join(f'{k} {v:.2f}s' for k, v in first['timings'].items())}")
+
 def test_dashboard_data():
     print("\nTesting dashboard data...")
     try:
@@ -197,6 +1080,29 @@ def smoke_test_all_pages():
 def run_all_automated_tests():
     test_all_sectors()
     test_model_predictions()
+    test_model_registry()
+    test_mmap_model_artifact()
+    test_compiled_forest()
+    test_stream_batch_predict()
+    test_forecast_emissions()
+    test_forecast_portfolio()
+    test_forecast_cache()
+    test_forecast_intervals()
+    test_storage_backends()
+    test_audit_log()
+    test_bulk_updates()
+    test_api_key_cache()
+    test_api_handlers()
+    test_micro_batcher()
+    test_change_feed()
+    test_report_pipeline()
+    test_emission_sources_model()
+    test_reduction_planning()
+    test_action_plan()
+    test_dataset_layer()
+    test_eda_engine()
+    test_streaming_stats()
+    test_model_building()
     test_dashboard_data()
     test_anomaly_detection()
     print("\nAll automated feature tests completed.")
@@ -0,0 +1,53 @@
+import numpy as np
+
+# Per-source checks in the order they are reported; the first failing
+# source of a list determines its error message
+_SOURCE_ERRORS = {
+    1: "Emission source at index {idx} is not a dict.",
+    2: "Missing required fields in emission source at index {idx}.",
+    3: "Emission value at index {idx} is not a number.",
+    4: "Negative emission value at index {idx}.",
+    5: "Emission value at index {idx} is too large.",
+}
+
+
+def _source_code(src):
+    if not isinstance(src, dict):
+        return 1
+    if "type" not in src or "emission" not in src:
+        return 2
+    if not isinstance(src["emission"], (int, float)):
+        return 3
+    if isinstance(src["emission"], int):
+        # JSON integers are unbounded; anything past the float range cannot be stored as a number
+        try:
+            float(src["emission"])
+        except OverflowError:
+            return 5
+    return 0
+
+
+def validate_emission_batch(source_lists):
+    """Validate many emission_sources lists at once; returns one error (or None) per list."""
+    errors = [None if isinstance(sources, list) else "emission_sources must be a list." for sources in source_lists]
+    lists = [sources if err is None else [] for sources, err in zip(source_lists, errors)]
+    lengths = np.fromiter((len(sources) for sources in lists), dtype=np.int64, count=len(lists))
+    flat = [src for sources in lists for src in sources]
+    if not flat:
+        return errors
+    codes = np.fromiter((_source_code(src) for src in flat), dtype=np.int8, count=len(flat))
+    emissions = np.array([src["emission"] if code == 0 else 0.0 for src, code in zip(flat, codes)], dtype=float)
+    codes[(codes == 0) & (emissions < 0)] = 4
+    owners = np.repeat(np.arange(len(lists)), lengths)
+    positions = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    bad = np.flatnonzero(codes)
+    # Sources are grouped by list in order, so the first bad row per owner wins
+    owners_bad, first = np.unique(owners[bad], return_index=True)
+    for owner, row in zip(owners_bad, bad[first]):
+        errors[owner] = _SOURCE_ERRORS[codes[row]].format(idx=int(positions[row]))
+    return errors
+
+
+def validate_emission_sources(emission_sources):
+    err = validate_emission_batch([emission_sources])[0]
+    return err is None, err